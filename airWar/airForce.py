@@ -92,10 +92,11 @@ class AirCampaign:
         
 
        
-# TEST ENGAGEMENT #
+if __name__ == "__main__":
+    # TEST ENGAGEMENT #
 
-blue = AirForce('Blue', 120, 0.2, 0, 2)
-red = AirForce('Red', 120, 0.2, 0.3, 2)
+    blue = AirForce('Blue', 120, 0.2, 0, 2)
+    red = AirForce('Red', 120, 0.2, 0.3, 2)
 
-campaign = AirCampaign(blue, red, 30)
-campaign.resolve()
\ No newline at end of file
+    campaign = AirCampaign(blue, red, 30)
+    campaign.resolve()
@@ -8,15 +8,31 @@
 # Data – Naval Postgraduate School (1990).
 # ===============================================
 
+import bisect
+import heapq
+import math
+
+import numpy as np
+
+# Kinds of battle events, in the order they take place within a minute
+OPEN, CLOSE, LAUNCH, IMPACT = range(4)
+
+# Changes of a group the sides it is part of are notified of
+STAYING, FIRE = range(2)
+
 class Group:
     """ A group of ships.
     Parameters:
     - name (string) - the name of the group, for output labelling purposes.
     - continuousFire (float) - the continuous fire value of the group, in TPBE
     - staying (float) – the staying power of the group.
-    Additional attribute:
+    Additional attributes:
     - pulse (list) - a list of pulse weapons (torpedoes, bombs) added by the
     "add_pulse_weapon()" method.
+    - pulseFire (float) - the total theoretical pulse fire of the group (full salvos
+    from all platforms), kept up to date by "add_pulse_weapon()".
+    - sides (list) - the (side, index) of every side the group is part of, notified
+    whenever its staying power changes.
     """
     
     def __init__(self, name, continuousFire, staying):
@@ -24,6 +40,9 @@ class Group:
         self.continuousFire = continuousFire
         self.originalStaying = self.previousStaying = self.staying = staying
         self.pulse = [] # An empty list, to store pulse weapons later.
+        self.pulseFire = 0
+        self.sides = []
+        self.damaged = False # Whether the group was damaged since the last refresh.
         
     def add_pulse_weapon(self, power, number):
         """ Adds a pulse weapon platform to the group.
@@ -35,6 +54,8 @@ class Group:
         
         pp = (power, number)
         self.pulse.append(pp)
+        self.pulseFire += power * number
+        self._notify(FIRE)
         
     def get_status(self):
         """ Returns the status of the group in the current minute."""
@@ -64,8 +85,7 @@ class Group:
         
         if type == 'all':
             # Return the total theoretical pulse power of the group
-            salvo = sum(weapon[0] * weapon[1] for weapon in self.pulse)
-            return salvo * self.previous_status()
+            return self.pulseFire * self.previous_status()
         else:
             # Return the total theoretical pulse power for a specific type of weapon
             if salvoSize == 'all':
@@ -89,13 +109,24 @@ class Group:
             self.staying *= 0
         if ratio <= 1:
             self.staying *= ratio
+            self.damaged = True
+            self._notify(STAYING)
             
     def refresh(self):
         """ Refreshes the group by advancing time one minute. The current staying power
         becomes the previous one.
         """ 
         
-        self.previousStaying = self.staying
+        if self.damaged:
+            self.previousStaying = self.staying
+            self.damaged = False
+            self._notify(FIRE)
+            
+    def _notify(self, change):
+        """ Notifies the sides the group is part of that its staying power (STAYING) or
+        its fire values (FIRE) have changed."""
+        for side, index in self.sides:
+            side.group_changed(index, change)
         
     def __str__(self):
         """ String override"""
@@ -110,11 +141,23 @@ class Side:
     Parameters:
     - name (string): the name of the side, for output labelling purposes.
     - groups (list): a list of the Group objects included in the side.
+    Additional attributes:
+    - views (dict): the aggregated values of the group selections already asked for,
+    by (value, groupSelection, ...). A view is dropped when the staying power or the fire
+    values of one of its groups change, and summed again the next time it is asked for,
+    so that asking for it again in the same minute costs nothing.
+    - stayingViews, fireViews (list): for each group, the keys of the views of its
+    staying power and fire values that include it.
     """
     
     def __init__(self, name, groups):
         self.name = name
         self.groups = groups
+        self.views = {}
+        self.stayingViews = [set() for _ in groups]
+        self.fireViews = [set() for _ in groups]
+        for index, group in enumerate(groups):
+            group.sides.append((self, index))
         self.originalStaying = sum(_.staying for _ in self.groups)
         self.originalContinuous = sum(group.continuousFire for group in self.groups)
         self.originalPulse = sum(group.pulse_fire() for group in self.groups)
@@ -134,7 +177,8 @@ class Side:
         
         if groupSelection == 'all':
         # Return the total staying power of all groups in the side
-            return sum(group.staying for group in self.groups)
+            return self._view(('staying', 'all'), STAYING, range(len(self.groups)),
+                              lambda: sum(group.staying for group in self.groups))
             
         elif isinstance(groupSelection, int):
         # Return the staying power for the specified group
@@ -142,7 +186,8 @@ class Side:
             
         elif isinstance(groupSelection, tuple):
         # Return the aggregated staying power of the selected groups only
-            return sum(self.groups[group].staying for group in groupSelection)
+            return self._view(('staying', groupSelection), STAYING, groupSelection,
+                              lambda: sum(self.groups[group].staying for group in groupSelection))
             
     def get_status(self):
         """ Returns the status (fraction) of the side."""
@@ -178,7 +223,8 @@ class Side:
         
         if groupSelection == 'all':
         # Return the total continuous fire value of all groups in the side
-            return sum(group.continuous_fire() for group in self.groups)
+            return self._view(('continuous', 'all'), FIRE, range(len(self.groups)),
+                              lambda: sum(group.continuous_fire() for group in self.groups))
             
         elif isinstance(groupSelection, int):
         # Return the aggregated continuous fire value for the selected group only
@@ -186,7 +232,8 @@ class Side:
             
         elif isinstance(groupSelection, tuple):
         # Return the aggregated continuous fire value of the selected groups only
-            return sum(self.groups[group].continuous_fire() for group in groupSelection)
+            return self._view(('continuous', groupSelection), FIRE, groupSelection,
+                              lambda: sum(self.groups[group].continuous_fire() for group in groupSelection))
             
     def pulse_fire(self, groupSelection = 'all', type = 'all', size = 'all'):
         """ Returns the pulse fire value of the side.
@@ -203,7 +250,8 @@ class Side:
         
         if groupSelection == type == size == 'all':
             # Return the total maximum pulse fire of all groups and weapon types
-            return sum(group.pulse_fire() for group in self.groups)
+            return self._view(('pulse', 'all'), FIRE, range(len(self.groups)),
+                              lambda: sum(group.pulse_fire() for group in self.groups))
             
         elif all(isinstance(arg, int) for arg in (groupSelection, type, size)):
             # Return the pulse fire value of the specified group, weapon type, and salvo size
@@ -211,12 +259,32 @@ class Side:
             
         elif all(isinstance(arg, tuple) for arg in (groupSelection, size)) and isinstance(type, int):
             # Return the total pulse fire of weapon type [type] for selected groups and salvo sizes
-            pf = sum(self.groups[group].pulse_fire(type, size[index])for index, group in enumerate(groupSelection))
+            pf = self._view(('pulse', groupSelection, type, size), FIRE, groupSelection,
+                            lambda: sum(self.groups[group].pulse_fire(type, size[index])for index, group in enumerate(groupSelection)))
             return pf
               
         else:
             raise ValueError('Invalid input for pulse fire')
             
+    def _view(self, key, change, groups, value):
+        """ Returns the view with the given key, summing it with value() if it is not up
+        to date. The view depends on the staying power (STAYING) or the fire values
+        (FIRE) of the given groups."""
+        if key not in self.views:
+            self.views[key] = value()
+            views = self.stayingViews if change == STAYING else self.fireViews
+            for group in groups:
+                views[group].add(key)
+        return self.views[key]
+        
+    def group_changed(self, index, change):
+        """ Drops the views including the group at [index], whose staying power (STAYING)
+        or fire values (FIRE) have changed."""
+        views = self.stayingViews[index] if change == STAYING else self.fireViews[index]
+        for key in views:
+            self.views.pop(key, None)
+        views.clear()
+        
     def damage(self, ratio, groupSelection = 'all'):
         """ Damages the groups in the side.
         
@@ -264,6 +332,147 @@ class Side:
         sideString = "{:<10s} – SP: {:<6} | CF: {:<6} | PF: {:<6}".format(self.name, sp, cf, pf)
         return sideString
         
+class Recorder:
+    """ Records a battle as it is resolved. This one records nothing (mode 'none'), and
+    is the base of the other recorders.
+    Attributes:
+    - everyMinute (bool): whether the recorder needs every minute of the battle. If no
+    recorder does, the battle jumps between the minutes in which events take place.
+    """
+    everyMinute = False
+    
+    def start(self, battle):
+        """ Called before the first minute of the battle is resolved."""
+        pass
+        
+    def record(self, battle):
+        """ Called after each minute of the battle is resolved, before the time pulse
+        advances."""
+        pass
+        
+    def finish(self, battle):
+        """ Called when the battle is over."""
+        pass
+        
+class SummaryRecorder(Recorder):
+    """ Records the minutes the battle lasted and the losses of both sides (mode 'summary').
+    Attributes:
+    - minutes (int): the minutes the battle lasted.
+    - losses (tuple): the losses (% lost) of both sides, as returned by Battle.losses().
+    """
+    
+    def __init__(self):
+        self.minutes = 0
+        self.losses = None
+        
+    def finish(self, battle):
+        self.minutes = battle.timePulse
+        self.losses = battle.losses()
+        
+class TraceRecorder(SummaryRecorder):
+    """ Records the staying power, continuous fire and pulse fire of every group in every
+    minute of the battle (mode 'full'), in arrays allocated when the battle starts.
+    Parameters:
+    - path (string): if given, the trace is saved to this file when the battle is over.
+    Other attributes:
+    - staying, continuous, pulse (tuple): for side A and side B, an array with one row
+    per minute and one column per group. Row 0 holds the values before the battle, and
+    row t + 1 the values after minute t.
+    """
+    everyMinute = True
+    
+    def __init__(self, path = None):
+        super().__init__()
+        self.path = path
+        self.staying = self.continuous = self.pulse = ()
+        
+    def start(self, battle):
+        rows = battle.duration - battle.timePulse + 1
+        self.first = battle.timePulse
+        self.staying = tuple(np.zeros((rows, len(side.groups))) for side in battle.sides)
+        self.continuous = tuple(np.zeros((rows, len(side.groups))) for side in battle.sides)
+        self.pulse = tuple(np.zeros((rows, len(side.groups))) for side in battle.sides)
+        self._store(battle, 0)
+        
+    def _store(self, battle, row):
+        """ Stores the values of every group in a row of the trace."""
+        for sideIndex, side in enumerate(battle.sides):
+            for index, group in enumerate(side.groups):
+                self.staying[sideIndex][row, index] = group.staying
+                self.continuous[sideIndex][row, index] = group.continuous_fire()
+                self.pulse[sideIndex][row, index] = group.pulse_fire()
+                
+    def record(self, battle):
+        self._store(battle, battle.timePulse - self.first + 1)
+        
+    def finish(self, battle):
+        super().finish(battle)
+        # Drop the rows of the minutes the battle did not last
+        rows = battle.timePulse - self.first + 1
+        self.staying = tuple(values[:rows] for values in self.staying)
+        self.continuous = tuple(values[:rows] for values in self.continuous)
+        self.pulse = tuple(values[:rows] for values in self.pulse)
+        if self.path is not None:
+            self.save(self.path)
+            
+    def save(self, path):
+        """ Saves the trace to a NumPy .npz file (binary, not compressed), with the arrays
+        stayingA, continuousA, pulseA, stayingB, continuousB and pulseB, and the losses."""
+        arrays = {"losses": np.array(self.losses, dtype=np.float64), "minutes": self.minutes}
+        for sideIndex, label in enumerate("AB"):
+            arrays["staying" + label] = self.staying[sideIndex]
+            arrays["continuous" + label] = self.continuous[sideIndex]
+            arrays["pulse" + label] = self.pulse[sideIndex]
+        np.savez(path, **arrays)
+        
+class PrintRecorder(Recorder):
+    """ Prints the battle to the console, as the original program did: both sides before
+    the battle, their status every minute, and the summary of losses."""
+    everyMinute = True
+    
+    def start(self, battle):
+        print("{:^55}".format(battle.name.upper()))
+        print("\n{}".format(battle.sideA.name.upper()))
+        for group in battle.sideA.groups:
+            print(group)
+        
+        print("\n{}".format(battle.sideB.name.upper()))
+        for group in battle.sideB.groups:
+            print(group)
+        print("\n")
+        battleInit = "{:<3} - {:<6} | {:<6} | {:<6} | {:<6} | {:<6} | {:<6}".format(
+        "TP","SPA","CFA","PFA","SPB","CFB","PFB")
+        print(battleInit)
+        
+    def record(self, battle):
+        print(battle)
+        
+    def finish(self, battle):
+        print("\nSUMMARY OF LOSSES (% LOST)")
+        header = "{:<5} | {:<5} | {:<5} | {:<5} | {:<5} | {:<5}".format(
+        "SA", "FCA", "FPA", "SB", "FCB", "FPB")
+        lossesString = "{:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f}".format(
+        *battle.losses())
+        print(header)
+        print(lossesString)
+        
+# Recorders by mode
+RECORDERS = {'none': Recorder, 'summary': SummaryRecorder, 'full': TraceRecorder}
+
+def get_recorder(record):
+    """ Returns a recorder, given as a Recorder object or by its mode ('none', 'summary'
+    or 'full')."""
+    if isinstance(record, Recorder):
+        return record
+    if record not in RECORDERS:
+        raise ValueError('Unknown recording mode: {}'.format(record))
+    return RECORDERS[record]()
+    
+def load_trace(path):
+    """ Loads a trace saved by TraceRecorder.save(), as a dict of arrays."""
+    with np.load(path) as trace:
+        return {name: trace[name] for name in trace.files}
+        
 class Battle:
     """ A battle between two opposing sides.
     Parameters:
@@ -271,170 +480,241 @@ class Battle:
     - sideA (Side object): the first of the opposing sides.
     - sideB (Side object): the second opposing side.
     Other attributes:
-    - Timelines for both sides continuous and pulse fire events (lists of tuples
-    specifying firer, target, time of fire, etc).
-    - Lists to hold the status of each side every minute, for plotting purposes.
+    - duration (int): the number of minutes the battle can last, up to the latest event.
+    - queue (list): a priority queue (heap) of the battle events, ordered by minute. The
+    continuous fire events of both sides are queued as the opening and closing of a fire
+    window, and the pulse fire events as a launch, which queues the impact when it happens.
+    - active (tuple): for each side, the indices of its continuous fire events whose fire
+    window is open.
+    - recorders (list): the recorders of the battle (see Recorder). By default, the
+    battle is printed to the console.
     - timePulse (int): the current minute of the battle. Starts at 0.
     """
     def __init__(self, name, sideA, sideB):
         self.name = name
         self.sideA = sideA
         self.sideB = sideB
-        # Timelines of A and B's continuous fire events
-        self.sideAtimeline = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        self.sideBtimeline = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        # Timelines of A and B's pulse fire events
-        self.sideApulseEvents = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        self.sideBpulseEvents = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        # Minutes in which A and B will receive pulsed fire damage
-        self.sideApulseDamage = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        self.sideBpulseDamage = [[] for _ in range(max(self.sideA.latestEvent, self.sideB.latestEvent))]
-        # Status record for every minute of the battle
-        self.aPlot = [(sideA.staying_power(), sideA.continuous_fire(), sideA.pulse_fire())]
-        self.bPlot = [(sideB.staying_power(), sideB.continuous_fire(), sideB.pulse_fire())]
+        self.sides = (sideA, sideB)
+        self.duration = max(self.sideA.latestEvent, self.sideB.latestEvent)
+        self.recorders = [PrintRecorder()]
         # Time pulse of the battle, starting at 0
         self.timePulse = 0
         
-        # Build the timelines for the battle from the event lists of both sides 
-        
-        # Side A continuous fire events
-        if len(self.sideA.continuousEvents) > 0:
-            for event in self.sideA.continuousEvents:
-                for minute in range(event[3], event[4]):
-                    self.sideAtimeline[minute].append((event[0], event[1], event[2]))
-                    
-        # Side B continuous fire events
-        if len(self.sideB.continuousEvents) > 0:
-            for event in self.sideB.continuousEvents:
-                for i in range(event[3], event[4]):
-                    self.sideBtimeline[i].append((event[0], event[1], event[2]))
-                    
-        # Side A pulse fire events
-        if len(self.sideA.pulseEvents) > 0:
-            for event in self.sideA.pulseEvents:
-            # Append the event to the corresponding minute
-                pf = (event[0], event[1], event[2], event[3], event[4], event[6])
-                self.sideApulseEvents[event[5]].append(pf)
-                
-        # Side B pulse fire events
-        if len(self.sideB.pulseEvents) > 0:
-            for event in self.sideB.pulseEvents:
-            # Append the event to the corresponding minute
-                pf = (event[0], event[1], event[2], event[3], event[4], event[6])
-                self.sideBpulseEvents[event[5]].append(pf)
-                
-    def advance_pulse(self):
-        """ Advance the battle by one time pulse (one minute)"""
-        # Check whether any A continuous fire events are taking place this minute
-        if len(self.sideAtimeline[self.timePulse]) > 0:
-        # Apply damage to B accordingly for each event
-            for event in self.sideAtimeline[self.timePulse]:
-                continuousDamage = self.sideA.continuous_fire(event[0]) * event[2]
-                targetStaying = self.sideB.staying_power(event[1])
-                if targetStaying == 0:
-                    ratio = 0
-                else:
-                    ratio = max((max((targetStaying - continuousDamage), 0)/ targetStaying), 0)
-                    
-                self.sideB.damage(ratio, event[1])
+        # Build the event queue of the battle from the event lists of both sides. Every
+        # entry is (minute, kind, side, order, payload): within a minute, windows open and
+        # close first, then pulse weapons are launched and then they hit, side A first. The
+        # order keeps the events of a kind in the order they were added (or launched).
+        self.queue = []
+        self.active = ([], [])
+        self.sequence = 0
+        for sideIndex, side in enumerate(self.sides):
+            for index, event in enumerate(side.continuousEvents):
+                self.queue.append((event[3], OPEN, sideIndex, index, None))
+                self.queue.append((event[4], CLOSE, sideIndex, index, None))
+            for index, event in enumerate(side.pulseEvents):
+                self.queue.append((event[5], LAUNCH, sideIndex, index, event))
+        heapq.heapify(self.queue)
+        
+    def _next_event(self, kind):
+        """ Pops and returns the next queued event of the given kind in the current
+        minute, or None if there is none left."""
+        if self.queue and self.queue[0][0] == self.timePulse and self.queue[0][1] == kind:
+            return heapq.heappop(self.queue)
+        return None
+        
+    def _apply(self, side, selection, damage):
+        """ Applies an amount of damage to the selected groups of a side."""
+        targetStaying = side.staying_power(selection)
+        if targetStaying == 0:
+            ratio = 0
+        else:
+            ratio = max((max((targetStaying - damage), 0)/ targetStaying), 0)
+            
+        side.damage(ratio, selection)
+        
+    def _process_minute(self):
+        """ Applies the events of the current minute, and refreshes all groups."""
+        # Open and close the continuous fire windows
+        while self.queue and self.queue[0][0] == self.timePulse and self.queue[0][1] <= CLOSE:
+            minute, kind, sideIndex, index, payload = heapq.heappop(self.queue)
+            if kind == OPEN:
+                bisect.insort(self.active[sideIndex], index)
+            else:
+                self.active[sideIndex].remove(index)
                 
-        # Check whether any B continuous fire events are taking place this minute
-        if len(self.sideBtimeline[self.timePulse]) > 0:
-        # Apply damage to A accordingly for each event
-            for event in self.sideBtimeline[self.timePulse]:
-                continuousDamage = self.sideB.continuous_fire(event[0]) * event[2]
-                targetStaying = self.sideA.staying_power(event[1])
-                if targetStaying == 0:
-                    ratio = 0
-                else:
-                    ratio = max((max((targetStaying - continuousDamage), 0)/ targetStaying), 0)
-                    
-                self.sideA.damage(ratio, event[1])
+        # Continuous fire of A on B, then of B on A
+        for sideIndex, side in enumerate(self.sides):
+            enemy = self.sides[1 - sideIndex]
+            for index in self.active[sideIndex]:
+                event = side.continuousEvents[index]
+                self._apply(enemy, event[1], side.continuous_fire(event[0]) * event[2])
                 
-        # Check whether any A pulse fire events are taking place this minute
-        
+        # Pulse weapons launched this minute: queue the damage for the minute of impact
         # (firer, target, type, size, efficiency, start, start + tui)
-        
-        if len(self.sideApulseEvents[self.timePulse]) > 0:
-        # Append the damage and target group to B's pulse damage timeline
-            for event in self.sideApulseEvents[self.timePulse]:
-                pulseDamage = self.sideA.pulse_fire(event[0], event[2], event[3]) * event[4]
-                self.sideBpulseDamage[event[5]].append((event[1], pulseDamage))
-                
-        # Check whether any B pulse fire events are taking place this minute
-        if len(self.sideBpulseEvents[self.timePulse]) > 0:
-        # Append the damage and target group to B's pulse damage timeline
-            for event in self.sideBpulseEvents[self.timePulse]:
-                pulseDamage = self.sideB.pulse_fire(event[0], event[2], event[3]) * event[4]
-                self.sideApulseDamage[event[5]].append((event[1], pulseDamage))
-
-                
-        # Check whether A is receiving any pulse damage this minute
-        if len(self.sideApulseDamage[self.timePulse]) > 0:
-        # Apply damage to the corresponding groups of A
-            for damage in self.sideApulseDamage[self.timePulse]:
-                targetStaying = self.sideA.staying_power(damage[0])
-                pulseDamage = damage[1]
-                if targetStaying == 0:
-                    ratio = 0
-                else:
-                    ratio = max((max((targetStaying - pulseDamage), 0)/ targetStaying), 0)
-                    
-                self.sideA.damage(ratio, damage[0])
-                
-        # Check wheter B is receiving any pulse damage this minute
-        if len(self.sideBpulseDamage[self.timePulse]) > 0:
-        # Apply damage to the corresponding groups of B
-            for damage in self.sideBpulseDamage[self.timePulse]:
-                targetStaying = self.sideB.staying_power(damage[0])
-                pulseDamage = damage[1]
-                if targetStaying == 0:
-                    ratio = 0
-                else:
-                    ratio = max((max((targetStaying - pulseDamage), 0)/ targetStaying), 0)
-                    
-                self.sideB.damage(ratio, damage[0])
-                
+        entry = self._next_event(LAUNCH)
+        while entry is not None:
+            event = entry[4]
+            side = self.sides[entry[2]]
+            pulseDamage = side.pulse_fire(event[0], event[2], event[3]) * event[4]
+            heapq.heappush(self.queue, (event[6], IMPACT, 1 - entry[2], self.sequence, (event[1], pulseDamage)))
+            self.sequence += 1
+            entry = self._next_event(LAUNCH)
+            
+        # Pulse weapons hitting this minute, A first
+        entry = self._next_event(IMPACT)
+        while entry is not None:
+            target, pulseDamage = entry[4]
+            self._apply(self.sides[entry[2]], target, pulseDamage)
+            entry = self._next_event(IMPACT)
+            
         # Refresh all groups on both sides
         for group in self.sideA.groups:
             group.refresh()
         for group in self.sideB.groups:
             group.refresh()
-        # Print both sides
-        print(self)
+            
+    def _selection(self, side, selection):
+        """ Returns a group selection of a side as a tuple of group indices."""
+        if selection == 'all':
+            return tuple(range(len(side.groups)))
+        elif isinstance(selection, int):
+            return (selection,)
+        return tuple(selection)
+        
+    def _integrate(self, minutes):
+        """ Resolves up to a number of minutes in which only continuous fire takes place,
+        in closed form, and returns the number of minutes resolved.
+        
+        While no group is wiped out, every minute of continuous fire damages each target
+        selection by a linear function of the staying powers, and all groups in a selection
+        keep their proportions: the staying powers after k minutes are the k-th power of
+        that linear map applied to the current ones. The minutes are only resolved this way
+        while none of the target selections can be wiped out (returning 0 otherwise), and if
+        the target selections never overlap partially.
+        """
+        # The target selections of each side, as blocks of groups
+        blocks, blockOf = [], {}
+        for sideIndex, side in enumerate(self.sides):
+            enemyIndex = 1 - sideIndex
+            enemy = self.sides[enemyIndex]
+            for index in self.active[sideIndex]:
+                event = side.continuousEvents[index]
+                if event[2] < 0:
+                    return 0
+                block = self._selection(enemy, event[1])
+                if len(set(block)) != len(block):
+                    return 0
+                key = (enemyIndex, frozenset(block))
+                if key in blockOf:
+                    continue
+                if any((enemyIndex, group) in blockOf for group in block):
+                    return 0
+                blockOf[key] = len(blocks)
+                for group in block:
+                    blockOf[(enemyIndex, group)] = len(blocks)
+                blocks.append((enemyIndex, block))
+                
+        # The staying power of each block, and the constant term (last column)
+        n = len(blocks)
+        start = np.array([sum(self.sides[s].groups[g].staying for g in block) for s, block in blocks] + [1.0])
+        if np.any(start[:-1] <= 0):
+            return 0
+        coefficients = np.zeros((n + 1, n + 1))
+        for sideIndex, side in enumerate(self.sides):
+            for index in self.active[sideIndex]:
+                event = side.continuousEvents[index]
+                target = blockOf[(1 - sideIndex, frozenset(self._selection(self.sides[1 - sideIndex], event[1])))]
+                for firer in self._selection(side, event[0]):
+                    group = side.groups[firer]
+                    if group.continuousFire < 0:
+                        return 0
+                    # The damage of the firer at its current staying power, per unit
+                    damage = event[2] * group.continuousFire * group.staying / group.originalStaying
+                    if (sideIndex, firer) in blockOf:
+                        block = blockOf[(sideIndex, firer)]
+                        coefficients[target, block] += damage / start[block]
+                    else:
+                        coefficients[target, n] += damage
+                        
+        # No block can be wiped out while its damage in the first minute, which never
+        # grows, fits in its staying power
+        firstDamage = coefficients @ start
+        steps = minutes
+        for block in range(n):
+            if firstDamage[block] > 0:
+                steps = min(steps, math.ceil(start[block] / firstDamage[block]) - 1)
+        if steps <= 0:
+            return 0
+        staying = np.linalg.matrix_power(np.eye(n + 1) - coefficients, steps) @ start
+        for block, (sideIndex, groups) in enumerate(blocks):
+            ratio = staying[block] / start[block]
+            for group in groups:
+                group = self.sides[sideIndex].groups[group]
+                group.damage(ratio)
+                group.refresh()
+        self.timePulse += steps
+        return steps
+        
+    def advance_pulse(self):
+        """ Advance the battle by one time pulse (one minute)"""
+        self._process_minute()
+        # Record both sides
+        for recorder in self.recorders:
+            recorder.record(self)
         # Advance the time pulse by one unit
         self.timePulse += 1
         
-    def resolve(self):
-        """ Resolve the battle until its conclusion."""
-        print("{:^55}".format(self.name.upper()))
-        print("\n{}".format(self.sideA.name.upper()))
-        for group in self.sideA.groups:
-            print(group)
-        
-        print("\n{}".format(self.sideB.name.upper()))
-        for group in self.sideB.groups:
-            print(group)
-        print("\n")
-        battleInit = "{:<3} - {:<6} | {:<6} | {:<6} | {:<6} | {:<6} | {:<6}".format(
-        "TP","SPA","CFA","PFA","SPB","CFB","PFB")
-        print(battleInit)
-        while self.timePulse < (len(self.sideAtimeline)) and self.sideA.staying_power() > 0 and self.sideB.staying_power() > 0:
-            self.advance_pulse()
-            
-        print("\nSUMMARY OF LOSSES (% LOST)")
-        header = "{:<5} | {:<5} | {:<5} | {:<5} | {:<5} | {:<5}".format(
-        "SA", "FCA", "FPA", "SB", "FCB", "FPB")
+    def advance(self):
+        """ Advance the battle to the next minute in which an event takes place, or to the
+        end of the battle, without recording the minutes in between. Minutes without events are skipped, and
+        continuous fire over them is resolved in closed form."""
+        self._process_minute()
+        self.timePulse += 1
+        if self.sideA.staying_power() <= 0 or self.sideB.staying_power() <= 0:
+            return
+        nextEvent = min(self.queue[0][0], self.duration) if self.queue else self.duration
+        while self.timePulse < nextEvent:
+            if not self.active[0] and not self.active[1]:
+                self.timePulse = nextEvent
+            elif self._integrate(nextEvent - self.timePulse) == 0:
+                return
+                
+    def losses(self):
+        """ Returns the losses of both sides (% lost), as a tuple of the staying power,
+        continuous fire and pulse fire losses of A, then of B."""
         sa = round((1- self.sideA.get_status())*100, 2)
         sb = round((1- self.sideB.get_status())*100, 2)
         fca = self.sideA.continuous_fire_loss()
         fcb = self.sideB.continuous_fire_loss()
         fpa = self.sideA.pulse_fire_loss()
         fpb = self.sideB.pulse_fire_loss()
-        lossesString = "{:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f} | {:<5.2f}".format(
-        sa, fca, fpa, sb, fcb, fpb)
-        print(header)
-        print(lossesString)
+        return sa, fca, fpa, sb, fcb, fpb
+        
+    def resolve(self, verbose = True, record = 'none'):
+        """ Resolve the battle until its conclusion, and return the recorder.
+        
+        verbose (bool) = print the status of both sides every minute, and the summary of
+        losses.
+        record = a Recorder, or a recording mode: 'none', 'summary' (the minutes and losses)
+        or 'full' (a trace of every group in every minute, see TraceRecorder).
+        
+        If no recorder needs every minute, the battle jumps between the minutes in which
+        events take place.
+        """
+        recorder = get_recorder(record)
+        self.recorders = [PrintRecorder(), recorder] if verbose else [recorder]
+        everyMinute = any(recorder.everyMinute for recorder in self.recorders)
+        for each in self.recorders:
+            each.start(self)
+        while self.timePulse < self.duration and self.sideA.staying_power() > 0 and self.sideB.staying_power() > 0:
+            if everyMinute:
+                self.advance_pulse()
+            else:
+                self.advance()
+                
+        for each in self.recorders:
+            each.finish(self)
+        return recorder
         
     def __str__(self):
         """String override."""
@@ -448,94 +728,22 @@ class Battle:
         self.timePulse,sideAsp,sideAcf,sideApf,sideBsp,sideBcf,sideBpf)
         return battleString
 
-# CORONEL 1914 (comment out the block below if you wish to play a different battle)
-britishOne = Group("Good Hope, Monmouth", 7.27, 3.21)
-britishTwo = Group("Glasgow", 0.42, 1.23)
-
-germanOne = Group("Scharnhorst, Gneisenau", 4.32, 3.30)
-germanTwo = Group("Leipzig, Dresden", 4.33, 2.23)
-
-british = Side("British", [britishOne, britishTwo])
-german = Side("German", [germanOne, germanTwo])
-
-german.continuous_fire_event(0,0,0.028,1,28)
-british.continuous_fire_event(1,0,0.028,6,15)
-german.continuous_fire_event(1,1,0.012, 19, 2)
-
-battle = Battle("Coronel 1914", british, german)
-
-battle.resolve()
-
-
-# MIDWAY 1942 (uncomment the commented block below and run the file to play the battle)
+if __name__ == "__main__":
+    # CORONEL 1914. This and the other historical battles (Midway, Coral Sea) are also
+    # described in the scenarios directory, and resolved by beallScenarios.py.
+    britishOne = Group("Good Hope, Monmouth", 7.27, 3.21)
+    britishTwo = Group("Glasgow", 0.42, 1.23)
 
-# usOne = Group("Yorktown", 0, 2.07)
-# usTwo = Group("Enterprise, Hornet", 0, 4.14)
-# 
-# usOne.add_pulse_weapon(0.4657, 19)
-# usTwo.add_pulse_weapon(0.4657, 37)
-# 
-# usOne.add_pulse_weapon(1, 18)
-# usTwo.add_pulse_weapon(1, 38)
-# 
-# usOne.add_pulse_weapon(0.758333333333333, 13)
-# usTwo.add_pulse_weapon(0.758333333333333, 29)
-# 
-# japanOne = Group("Haga, Akagi, Soryu", 0, 6.33)
-# japanTwo = Group("Hiryu", 0, 1.52)
-# 
-# japanOne.add_pulse_weapon(0.216212121212121, 54)
-# japanTwo.add_pulse_weapon(0.216212121212121, 18)
-# 
-# japanOne.add_pulse_weapon(0.931041666666667, 68)
-# japanTwo.add_pulse_weapon(0.931041666666667, 18)
-# 
-# us = Side("US Carrier Group", [usOne, usTwo])
-# japan = Side("Japanese Carrier Group", [japanOne, japanTwo])
-# 
-# us.pulse_fire_event(1, 0, 1, 17, 0.162, 1, 145)
-# us.pulse_fire_event(0, 1, 1, 16, 0.162, 1, 145)
-# us.pulse_fire_event(0, 0, 1, 17, 0.162, 65, 81)
-# us.pulse_fire_event(1, 1, 1, 24, 0.162, 470, 91)
-# 
-# japan.pulse_fire_event(1, 0, 0, 18, 0, 179, 61)
-# japan.pulse_fire_event(1, 0, 1, 10, 0.2, 259, 91)
-# 
-# battle = Battle("Midway", us, japan)
-# battle.resolve()
+    germanOne = Group("Scharnhorst, Gneisenau", 4.32, 3.30)
+    germanTwo = Group("Leipzig, Dresden", 4.33, 2.23)
 
+    british = Side("British", [britishOne, britishTwo])
+    german = Side("German", [germanOne, germanTwo])
 
-# CORAL SEA REVISED (uncomment the commented block below and run the file to play the battle)
+    german.continuous_fire_event(0,0,0.028,1,28)
+    british.continuous_fire_event(1,0,0.028,6,15)
+    german.continuous_fire_event(1,1,0.012, 19, 2)
 
-# usOne = Group("Lexington", 0, 2.42)
-# usTwo = Group("Yorktown", 0, 2.07)
-# 
-# usOne.add_pulse_weapon(1, 17)
-# usTwo.add_pulse_weapon(1, 17)
-# usOne.add_pulse_weapon(0.58, 15)
-# usTwo.add_pulse_weapon(0.58, 15)
-# usOne.add_pulse_weapon(0.758, 10)
-# usTwo.add_pulse_weapon(0.758, 9)
-# 
-# japanOne = Group("Shokaku", 0, 2.42)
-# japanTwo = Group("Zuikaku", 0, 2.24)
-# 
-# japanOne.add_pulse_weapon(0.2162, 17)
-# japanTwo.add_pulse_weapon(0.2162, 16)
-# japanOne.add_pulse_weapon(0.931, 13)
-# japanTwo.add_pulse_weapon(0.931, 12)
-# 
-# us = Side("US", [usOne, usTwo])
-# japan = Side("Japan", [japanOne, japanTwo])
-# 
-# # firer, target, type, size, efficiency, start, tui
-# us.pulse_fire_event((0,1), 0, 0, (17, 17), 0.065, 47, 111)
-# us.pulse_fire_event((0,1), 0, 0, (6, 6), 0.065, 47, 154)
-# 
-# japan.pulse_fire_event((0,1), (0,1), 0, (17, 16), 0.091, 55, 125)
-# japan.pulse_fire_event((0,1), 0, 1, (9, 9), 0.111, 55, 125)
-# 
-# battle = Battle("Coral Sea", us, japan)
-# 
-# battle.resolve()
+    battle = Battle("Coronel 1914", british, german)
 
+    battle.resolve()
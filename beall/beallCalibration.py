@@ -0,0 +1,414 @@
+"""
+Historical calibration of the fire event efficiencies of Thomas Reagan Beall's Naval
+Combat Model (1990).
+
+The efficiencies of the fire events of a set of scenarios (see beallScenarios.py) are
+fitted to the staying power losses recorded historically, the SA and SB columns of the
+summary of losses, by least squares. The fit is a Levenberg-Marquardt search within the
+bounds of the efficiencies (0 to 1 by default): every candidate resolves each battle once
+with dual numbers (see beallSensitivity.py), which gives its losses and their derivatives
+with respect to the efficiencies at the same time. The battles of a candidate are resolved
+in a pool of worker processes if asked to, and every evaluation is cached by battle and
+efficiencies, so a battle whose efficiencies did not change is not resolved again.
+
+The historical losses are far fewer than the efficiencies, so by default only those they
+can identify are fitted: no more than there are losses, each with derivatives that those
+of the others do not explain, at the starting values. The others keep the values of
+their scenarios. Fitting every efficiency reproduces the losses exactly, in many ways,
+and says nothing about any of them.
+
+The derivatives of the losses are zero where a group is wiped out, so an efficiency that
+only matters through such a group (the fire that wipes it out, or the fire of a group
+wiped out before it shoots) gives Levenberg-Marquardt nothing to follow. When the search
+stops, those efficiencies are searched directly, one at a time and together by scenario,
+over multiples of their values and fractions of their range. The search then resumes from
+the best candidate, if it lowers the error. The result says why the fit stopped, and
+whether it improved on the start at all.
+
+The uncertainty of the fitted efficiencies is taken from the covariance of the fit,
+sigma^2 (J^T J)^-1, where J holds the derivatives of the losses at the fitted values and
+sigma is the uncertainty of the historical losses (in % lost), given or estimated from
+the residuals (unless the fit is exact or leaves no degrees of freedom, in which case it
+must be given). Efficiencies fitted to a bound, or within a small share of the range of
+one, are left out, and reported as at bound, as the fit is not free to move them both
+ways. An efficiency the historical losses say nothing about (a bomb that always hits a
+group already wiped out, or a fit with fewer losses than efficiencies in some direction)
+has an infinite uncertainty.
+
+Usage:
+    python beallCalibration.py [key ...] [--workers 4] [--sigma 5] [--output directory]
+
+"""
+
+import copy
+import json
+import math
+import os
+
+import numpy as np
+
+from beallScenarios import registry, load_scenario
+from beallSensitivity import parameters, sensitivities, _get, _set
+
+# The historical losses fitted, as named in LOSSES
+FITTED = ("sa", "sb")
+
+# Smallest share of the largest derivatives an efficiency must add to those already chosen
+# to be identifiable by the historical losses
+IDENTIFIED = 1e-6
+
+# Distance to a bound, as a share of the range, within which an efficiency is at the bound
+AT_BOUND = 1e-4
+
+# RMS error (in % lost) below which a fit reproduces the historical losses exactly, and
+# its residuals cannot estimate their uncertainty
+EXACT = 1e-6
+
+# Factors applied to the efficiencies with no derivative when searching them directly
+SEARCH_FACTORS = (0, 1 / 16, 1 / 4, 1 / 2, 3 / 4, 3 / 2, 2, 4, 16)
+
+
+def _evaluate(task):
+    """ Resolves a battle with the given efficiencies, and returns its residuals (model
+    minus historical losses) and their derivatives with respect to the efficiencies."""
+    scenario, names, values = task
+    scenario = copy.deepcopy(scenario)
+    paths = dict(parameters(scenario))
+    for name, value in zip(names, values):
+        _set(scenario, paths[name], value)
+    result = sensitivities(scenario, names)
+    losses = [loss for loss in FITTED if loss in scenario.get("historical", {})]
+    residuals = np.array([result.losses[loss] - scenario["historical"][loss] for loss in losses])
+    jacobian = np.array([result.gradients[loss] for loss in losses]).reshape(len(losses), len(names))
+    return residuals, jacobian
+
+
+class Calibration:
+    """ A calibration of fire event efficiencies against historical losses.
+    Parameters:
+    - keys (list): the scenarios to fit (keys, paths or dicts, see beallScenarios). Defaults
+    to the whole registry.
+    - names (list): the efficiencies to fit, as "<scenario key>:<parameter name>", for
+    instance "coronel:B.continuousEvents[0].efficiency". Defaults to the event efficiencies
+    the historical losses can identify at the start (see identifiable()), the others
+    keeping the values of their scenarios.
+    - bounds (tuple): the lowest and highest efficiency.
+    - workers (int): the number of worker processes. 1 resolves in this process.
+    Other attributes:
+    - scenarios (dict): the scenarios, by key.
+    - parameters (list): the (key, name) of every efficiency fitted.
+    - start (array): the efficiencies of the scenarios, where the fit starts.
+    - cache (dict): the evaluations of every battle, by (key, efficiencies).
+    - evaluations (int): the number of battles actually resolved.
+    """
+
+    def __init__(self, keys = None, names = None, bounds = (0, 1), workers = 1):
+        if keys is None:
+            keys = list(registry())
+        self.scenarios = {}
+        for key in keys:
+            scenario = load_scenario(key)
+            self.scenarios[key if isinstance(key, str) else scenario["name"]] = scenario
+        if names is None:
+            self.parameters = [(key, name) for key, scenario in self.scenarios.items()
+                               for name, path in parameters(scenario) if name.endswith(".efficiency")]
+            self.bounds = bounds
+            self.start = self._values()
+            self.cache = {}
+            self.evaluations = 0
+            self.parameters = [self.parameters[index] for index in self.identifiable()]
+        else:
+            self.parameters = [tuple(name.split(":", 1)) for name in names]
+        for key, name in self.parameters:
+            if key not in self.scenarios or name not in dict(parameters(self.scenarios[key])):
+                raise ValueError("Unknown parameter: {}:{}".format(key, name))
+        self.bounds = bounds
+        self.workers = workers
+        self.start = self._values()
+        # Evaluations made with other parameters (see identifiable()) have other derivatives
+        self.cache = {}
+        self.evaluations = 0
+
+    def _values(self):
+        """ Returns the efficiencies of the scenarios, for the parameters fitted."""
+        return np.array([_get(self.scenarios[key], dict(parameters(self.scenarios[key]))[name])
+                         for key, name in self.parameters], dtype=np.float64)
+
+    def identifiable(self, values = None):
+        """ Returns the indices of the efficiencies the historical losses can identify at
+        the given efficiencies (the start by default): one at a time, the efficiency whose
+        derivatives are the least explained by those of the efficiencies already chosen,
+        for as long as it adds something (and no more than there are losses). Efficiencies
+        with no derivatives, and those whose effect on the losses is the same as others',
+        are left out."""
+        residuals, jacobian = self.evaluate(self.start if values is None else values)
+        remaining = jacobian.copy()
+        scale = np.linalg.norm(jacobian, axis=0).max(initial=0)
+        chosen = []
+        while len(chosen) < len(residuals):
+            norms = np.linalg.norm(remaining, axis=0)
+            index = int(np.argmax(norms))
+            if norms[index] <= IDENTIFIED * scale:
+                break
+            chosen.append(index)
+            # Take the direction of the efficiency chosen out of the others
+            direction = remaining[:, index] / norms[index]
+            remaining -= np.outer(direction, direction @ remaining)
+        return sorted(chosen)
+
+    def _columns(self, key):
+        """ Returns the indices of the efficiencies of a scenario."""
+        return [index for index, parameter in enumerate(self.parameters) if parameter[0] == key]
+
+    def resolve(self, candidates, pool = None):
+        """ Resolves the battles of a list of candidate efficiencies that are not in the
+        cache yet, all at once."""
+        tasks = {}
+        for values in candidates:
+            for key, scenario in self.scenarios.items():
+                indices = self._columns(key)
+                cacheKey = (key, tuple(values[indices]))
+                if cacheKey not in self.cache and cacheKey not in tasks:
+                    names = [self.parameters[index][1] for index in indices]
+                    tasks[cacheKey] = (scenario, names, [float(value) for value in values[indices]])
+        if pool is not None:
+            evaluated = list(pool.map(_evaluate, tasks.values()))
+        else:
+            evaluated = [_evaluate(task) for task in tasks.values()]
+        for cacheKey, result in zip(tasks, evaluated):
+            self.cache[cacheKey] = result
+        self.evaluations += len(tasks)
+
+    def evaluate(self, values, pool = None):
+        """ Returns the residuals of all battles (model minus historical losses) for the
+        given efficiencies, and their derivatives (one row per residual, one column per
+        efficiency)."""
+        self.resolve([values], pool)
+        residuals, rows = [], []
+        for key in self.scenarios:
+            indices = self._columns(key)
+            cacheKey = (key, tuple(values[indices]))
+            battleResiduals, battleJacobian = self.cache[cacheKey]
+            residuals.append(battleResiduals)
+            row = np.zeros((len(battleResiduals), len(self.parameters)))
+            row[:, indices] = battleJacobian
+            rows.append(row)
+        return np.concatenate(residuals), np.vstack(rows)
+
+    def fit(self, start = None, sigma = None, iterations = 100, tolerance = 1e-10):
+        """ Fits the efficiencies to the historical losses.
+
+        start (array) = the efficiencies the fit starts from. Defaults to those of the
+        scenarios.
+        sigma (float) = the uncertainty of the historical losses, in % lost. If None, it is
+        estimated from the residuals of the fit (if there are more losses than efficiencies
+        the losses say something about).
+        iterations (int) = the largest number of Levenberg-Marquardt steps.
+        tolerance (float) = the fit stops when a step reduces the sum of squared residuals
+        by less than this fraction.
+
+        Returns a CalibrationResult.
+        """
+        values = np.clip(self.start if start is None else np.asarray(start, dtype=np.float64), *self.bounds)
+        if self.workers > 1:
+            # Only imported when needed, as it is slow to import
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                return self._fit(values, sigma, iterations, tolerance, pool)
+        return self._fit(values, sigma, iterations, tolerance, None)
+
+    def _fit(self, values, sigma, iterations, tolerance, pool):
+        start = values
+        residuals, jacobian = self.evaluate(values, pool)
+        initial = cost = residuals @ residuals
+        steps = 0
+        while True:
+            values, residuals, jacobian, cost, taken, status = self._descend(
+                values, residuals, jacobian, cost, iterations - steps, tolerance, pool)
+            steps += taken
+            if steps >= iterations or cost == 0:
+                break
+            # The derivatives vanish where a group is wiped out, so Levenberg-Marquardt
+            # cannot move the efficiencies that only matter through it: search them directly
+            found = self._search(values, jacobian, cost, tolerance, pool)
+            if found is None:
+                break
+            values, residuals, jacobian, cost = found
+            steps += 1
+        if cost <= tolerance * initial:
+            # Nothing left to gain but rounding errors
+            status = "converged"
+        return CalibrationResult(self, start, values, residuals, jacobian, math.sqrt(initial / len(residuals)),
+                                 sigma, steps, status)
+
+    def _descend(self, values, residuals, jacobian, cost, iterations, tolerance, pool):
+        """ Takes Levenberg-Marquardt steps from the given efficiencies, and returns the
+        efficiencies reached with their residuals, derivatives and cost, the number of
+        steps taken, and why it stopped: "converged" (a step gained less than the
+        tolerance), "stalled" (no step lowered the cost) or "iteration limit"."""
+        damping = 1e-3
+        steps = 0
+        status = "iteration limit"
+        while steps < iterations and cost > 0:
+            steps += 1
+            normal = jacobian.T @ jacobian
+            gradient = jacobian.T @ residuals
+            scale = np.maximum(np.diag(normal), 1e-12)
+            improved = False
+            while damping < 1e12:
+                step = np.linalg.solve(normal + damping * np.diag(scale), -gradient)
+                candidate = np.clip(values + step, *self.bounds)
+                candidateResiduals, candidateJacobian = self.evaluate(candidate, pool)
+                candidateCost = candidateResiduals @ candidateResiduals
+                if candidateCost < cost:
+                    improved = True
+                    break
+                damping *= 10
+            if not improved:
+                status = "stalled"
+                break
+            decrease = (cost - candidateCost) / cost
+            values, residuals, jacobian, cost = candidate, candidateResiduals, candidateJacobian, candidateCost
+            damping = max(damping / 10, 1e-12)
+            if decrease < tolerance:
+                status = "converged"
+                break
+        if cost == 0:
+            status = "converged"
+        return values, residuals, jacobian, cost, steps, status
+
+    def _trials(self, value):
+        """ Returns the values tried for an efficiency with no derivative: multiples of its
+        value, and fractions of its range, within the bounds."""
+        low, high = self.bounds
+        trials = [value * factor for factor in SEARCH_FACTORS]
+        trials += [low + (high - low) * factor for factor in SEARCH_FACTORS if factor <= 1]
+        return sorted(set(float(np.clip(trial, low, high)) for trial in trials) - {float(value)})
+
+    def _search(self, values, jacobian, cost, tolerance, pool):
+        """ Searches the efficiencies whose derivatives are all zero, one at a time and
+        together by scenario, for the candidate with the lowest cost. Returns its
+        efficiencies, residuals, derivatives and cost, or None if none lowers the cost by
+        more than the tolerance."""
+        flat = np.flatnonzero(~jacobian.any(axis=0))
+        candidates = []
+        for index in flat:
+            for trial in self._trials(values[index]):
+                candidate = values.copy()
+                candidate[index] = trial
+                candidates.append(candidate)
+        for key in self.scenarios:
+            indices = [index for index in self._columns(key) if index in flat]
+            if len(indices) > 1:
+                for factor in SEARCH_FACTORS:
+                    candidate = values.copy()
+                    candidate[indices] = np.clip(values[indices] * factor, *self.bounds)
+                    candidates.append(candidate)
+        self.resolve(candidates, pool)
+        best = None
+        for candidate in candidates:
+            candidateResiduals, candidateJacobian = self.evaluate(candidate)
+            candidateCost = candidateResiduals @ candidateResiduals
+            if best is None or candidateCost < best[3]:
+                best = (candidate, candidateResiduals, candidateJacobian, candidateCost)
+        if best is None or best[3] >= cost * (1 - tolerance):
+            return None
+        return best
+
+    def calibrated_scenarios(self, result):
+        """ Returns the scenarios (by key) with the fitted efficiencies of a result."""
+        scenarios = copy.deepcopy(self.scenarios)
+        for (key, name), value in zip(self.parameters, result.values):
+            _set(scenarios[key], dict(parameters(scenarios[key]))[name], float(value))
+        return scenarios
+
+
+class CalibrationResult:
+    """ The result of a calibration.
+    Attributes:
+    - names (list): the efficiencies fitted, as "<scenario key>:<parameter name>".
+    - start, values (array): the efficiencies the fit started from, and the fitted ones.
+    - std (array): the standard uncertainty of every fitted efficiency (inf if the
+    historical losses say nothing about it, nan if it is at a bound or sigma is unknown).
+    - atBound (array): whether every fitted efficiency is at one of the bounds (within
+    AT_BOUND of the range). Those are left out of the covariance, as the fit is not free
+    to move them both ways.
+    - covariance (array): the covariance matrix of the fitted efficiencies (nan in the
+    rows and columns of those at a bound).
+    - residuals (array): the residuals of the fit (model minus historical, in % lost).
+    - rmse, initialRmse (float): the root mean square of the residuals, at the end and at
+    the start of the fit.
+    - sigma (float): the uncertainty of the historical losses used. If not given, it is
+    estimated from the residuals, unless the fit is exact or leaves no degrees of freedom,
+    in which case the residuals say nothing about it and it is nan.
+    - iterations (int): the Levenberg-Marquardt steps and direct searches taken.
+    - status (str): why the fit stopped: "converged", "stalled" (no step or search could
+    lower the cost) or "iteration limit".
+    - improved (bool): whether the fit lowered the RMS error at all.
+    - degrees (int): the degrees of freedom left by the fit (losses minus the rank of
+    their derivatives with respect to the efficiencies not at a bound).
+    - exact (bool): whether the fit reproduces the historical losses (within EXACT).
+    - evaluations (int): the battles resolved (not taken from the cache) so far.
+    """
+
+    def __init__(self, calibration, start, values, residuals, jacobian, initialRmse, sigma, iterations, status):
+        self.names = ["{}:{}".format(key, name) for key, name in calibration.parameters]
+        self.start = start
+        self.values = values
+        self.residuals = residuals
+        self.rmse = math.sqrt(residuals @ residuals / len(residuals))
+        self.initialRmse = initialRmse
+        self.iterations = iterations
+        self.status = status
+        self.improved = self.rmse < initialRmse
+        self.evaluations = calibration.evaluations
+        low, high = calibration.bounds
+        self.atBound = (values - low <= AT_BOUND * (high - low)) | (high - values <= AT_BOUND * (high - low))
+        free = ~self.atBound
+        jacobian = jacobian[:, free]
+        self.degrees = len(residuals) - np.linalg.matrix_rank(jacobian)
+        self.exact = self.rmse <= EXACT
+        if sigma is None:
+            sigma = math.sqrt(residuals @ residuals / self.degrees) if self.degrees > 0 and not self.exact else float("nan")
+        self.sigma = sigma
+        self.covariance = np.full((len(values), len(values)), np.nan)
+        self.covariance[np.ix_(free, free)] = sigma ** 2 * np.linalg.pinv(jacobian.T @ jacobian)
+        # Efficiencies outside the row space of the derivatives are not identified
+        projection = np.linalg.pinv(jacobian) @ jacobian
+        identified = np.abs(np.diag(projection) - 1) < 1e-8
+        self.std = np.full(len(values), np.nan)
+        self.std[free] = np.where(identified, np.sqrt(np.maximum(np.diag(self.covariance)[free], 0)), np.inf)
+
+    def __str__(self):
+        """ String override."""
+        lines = ["{:<48} | {:>8} | {:>8} | {:>8}".format("EFFICIENCY", "START", "FITTED", "STD")]
+        for name, start, value, std, atBound in zip(self.names, self.start, self.values, self.std, self.atBound):
+            std = "{:>8}".format("at bound") if atBound else "{:>8.4f}".format(std)
+            lines.append("{:<48} | {:>8.4f} | {:>8.4f} | {}".format(name, start, value, std))
+        lines.append("\nRMS error of the staying power losses: {:.2f} (fitted), {:.2f} (start)".format(
+            self.rmse, self.initialRmse))
+        lines.append("{} iterations ({}), {} battles resolved".format(self.iterations, self.status, self.evaluations))
+        if not self.improved:
+            lines.append("The fit did not improve on the starting efficiencies")
+        if math.isnan(self.sigma):
+            reason = "the fit is exact" if self.exact else "no degrees of freedom are left"
+            lines.append("No uncertainties: {}, so the uncertainty of the historical losses must be given (--sigma)".format(reason))
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Beall model efficiency calibration")
+    parser.add_argument("keys", nargs="*", help="scenarios to fit (default: all registered)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--sigma", type=float, help="uncertainty of the historical losses (%% lost)")
+    parser.add_argument("--output", help="directory to write the calibrated scenarios to")
+    options = parser.parse_args()
+    calibration = Calibration(options.keys or None, workers=options.workers)
+    result = calibration.fit(sigma=options.sigma)
+    print(result)
+    if options.output:
+        os.makedirs(options.output, exist_ok=True)
+        for key, scenario in calibration.calibrated_scenarios(result).items():
+            with open(os.path.join(options.output, "{}.json".format(key)), "w") as file:
+                json.dump(scenario, file, indent=2)
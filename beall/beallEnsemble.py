@@ -0,0 +1,220 @@
+"""
+A vectorised ensemble engine for Thomas Reagan Beall's Naval Combat Model (1990).
+
+The efficiencies of the fire events and the staying powers of the groups are uncertain
+historical estimates. Instead of building and resolving one Battle per parameter set,
+every member of an ensemble of parameter sets is resolved at once: the staying power of
+each group is held in a NumPy array of shape (members,), and the damage ratios of every
+event are computed for all members together, at roughly the cost of a single battle.
+
+The ensemble is built from a Battle (its sides, groups and fire events), which it does
+not modify. For any single member the results are the same as those of Battle.resolve
+with that member's parameters: the events are applied in the same order within a minute
+(continuous fire of A, then of B, pulse launches, then impacts, A first), with the same
+arithmetic as Battle and Group, and a member stops fighting as soon as either of its
+sides is wiped out. Minutes without events are skipped.
+
+"""
+
+import numpy as np
+
+# Structure of the result array returned by Ensemble.resolve(): the minutes the battle
+# lasted and the losses (% lost) of both sides, as in Battle.losses() (not rounded)
+RESULT_DTYPE = np.dtype([("minutes", np.int32),
+                         ("sa", np.float64), ("fca", np.float64), ("fpa", np.float64),
+                         ("sb", np.float64), ("fcb", np.float64), ("fpb", np.float64)])
+
+
+class Ensemble:
+    """ A battle resolved for an ensemble of parameter sets.
+    Parameters:
+    - battle (Battle object): the battle, with the fire events of both sides.
+    - members (int): the number of parameter sets in the ensemble.
+    - continuousEfficiency (tuple): for side A and side B, a list with the efficiency of
+    each continuous fire event of the side, in the order the events were added. Each
+    efficiency is a scalar or an array with one value per member, or None to keep the
+    efficiency of the event. If the tuple is None (default), all events keep theirs.
+    - pulseEfficiency (tuple): the same, for the pulse fire events.
+    - staying (tuple): for side A and side B, a list with the staying power of each group
+    of the side (scalar, array or None to keep the group's original staying power).
+    Other attributes:
+    - staying, previousStaying, originalStaying (tuple): for each side, a list of arrays
+    with the staying power of each group for every member.
+    - duration (int): the number of minutes the battle can last, up to the latest event.
+    """
+
+    def __init__(self, battle, members, continuousEfficiency = None, pulseEfficiency = None, staying = None):
+        self.battle = battle
+        self.members = members
+        self.sides = (battle.sideA, battle.sideB)
+        self.duration = battle.duration
+        self.originalStaying = tuple(
+            [self._expand(group.originalStaying if value is None else value)
+             for group, value in zip(side.groups, self._values(staying, sideIndex, len(side.groups)))]
+            for sideIndex, side in enumerate(self.sides))
+        self.staying = tuple([value.copy() for value in side] for side in self.originalStaying)
+        self.previousStaying = tuple([value.copy() for value in side] for side in self.originalStaying)
+        # Continuous events (firer, target, efficiency, start, end) and pulse events
+        # (firer, target, type, size, efficiency, start, impact), with the ensemble efficiencies
+        self.continuousEvents = tuple(
+            [event[:2] + (self._expand(event[2] if value is None else value),) + event[3:]
+             for event, value in zip(side.continuousEvents,
+                                     self._values(continuousEfficiency, sideIndex, len(side.continuousEvents)))]
+            for sideIndex, side in enumerate(self.sides))
+        self.pulseEvents = tuple(
+            [event[:4] + (self._expand(event[4] if value is None else value),) + event[5:]
+             for event, value in zip(side.pulseEvents,
+                                     self._values(pulseEfficiency, sideIndex, len(side.pulseEvents)))]
+            for sideIndex, side in enumerate(self.sides))
+
+    def _expand(self, value):
+        """ Broadcasts a scalar or per-member value to an array of length 'members'."""
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (self.members,)).copy()
+
+    def _values(self, values, sideIndex, length):
+        """ Returns the list of values given for a side, or a list of None."""
+        if values is None or values[sideIndex] is None:
+            return [None] * length
+        if len(values[sideIndex]) != length:
+            raise ValueError('Expected {} values for side {}'.format(length, self.sides[sideIndex].name))
+        return values[sideIndex]
+
+    def _groups(self, side, groupSelection):
+        """ Returns the indices of the groups in a selection, as Side does."""
+        if groupSelection == 'all':
+            return range(len(side.groups))
+        elif isinstance(groupSelection, int):
+            return (groupSelection,)
+        return groupSelection
+
+    def staying_power(self, sideIndex, groupSelection = 'all'):
+        """ Returns the staying power of the selected groups of a side, for every member."""
+        staying = self.staying[sideIndex]
+        groups = self._groups(self.sides[sideIndex], groupSelection)
+        if isinstance(groupSelection, int):
+            return staying[groupSelection]
+        return sum(staying[group] for group in groups)
+
+    def continuous_fire(self, sideIndex, groupSelection = 'all'):
+        """ Returns the continuous fire value of the selected groups of a side, for every
+        member."""
+        side = self.sides[sideIndex]
+        fire = [side.groups[group].continuousFire * (self.previousStaying[sideIndex][group] / self.originalStaying[sideIndex][group])
+                for group in self._groups(side, groupSelection)]
+        if isinstance(groupSelection, int):
+            return fire[0]
+        return sum(fire)
+
+    def pulse_fire(self, sideIndex, groupSelection, type, size):
+        """ Returns the pulse fire value of a pulse fire event, for every member, as
+        Side.pulse_fire does."""
+        side = self.sides[sideIndex]
+        if groupSelection == type == size == 'all':
+            weapons = [(group, 'all', 'all') for group in range(len(side.groups))]
+        elif isinstance(groupSelection, int):
+            weapons = [(groupSelection, type, size)]
+        else:
+            weapons = [(group, type, size[index]) for index, group in enumerate(groupSelection)]
+        fire = []
+        for group, type, size in weapons:
+            pulse = side.groups[group].pulse
+            if type == 'all':
+                salvo = sum(weapon[0] * weapon[1] for weapon in pulse)
+            elif size == 'all':
+                salvo = pulse[type][0] * pulse[type][1]
+            else:
+                salvo = pulse[type][0] * min(size, pulse[type][1])
+            fire.append(salvo * (self.previousStaying[sideIndex][group] / self.originalStaying[sideIndex][group]))
+        if isinstance(groupSelection, int):
+            return fire[0]
+        return sum(fire)
+
+    def _apply(self, sideIndex, groupSelection, damage, fighting):
+        """ Applies an amount of damage to the selected groups of a side, in the members
+        still fighting."""
+        targetStaying = self.staying_power(sideIndex, groupSelection)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.maximum(np.maximum(targetStaying - damage, 0) / targetStaying, 0)
+        ratio = np.where(targetStaying == 0, 0, ratio)
+        # As in Group.damage, ratios above 1 (negative damage) are ignored
+        ratio = np.where(fighting & (ratio <= 1), ratio, 1)
+        staying = self.staying[sideIndex]
+        for group in self._groups(self.sides[sideIndex], groupSelection):
+            staying[group] = staying[group] * ratio
+
+    def _fighting(self):
+        """ Returns the members in which both sides still have some staying power."""
+        return (self.staying_power(0) > 0) & (self.staying_power(1) > 0)
+
+    def resolve(self):
+        """ Resolves the battle for every member, and returns a structured array
+        (RESULT_DTYPE) with one entry per member: the minutes the battle lasted and the
+        losses of both sides.
+        """
+        # Minutes in which continuous fire windows open and close, pulse weapons are
+        # launched, and pulse weapons hit (in launch order)
+        opening, closing, launches, impacts = {}, {}, {}, {}
+        for sideIndex in range(2):
+            for index, event in enumerate(self.continuousEvents[sideIndex]):
+                opening.setdefault(event[3], []).append((sideIndex, index))
+                closing.setdefault(event[4], []).append((sideIndex, index))
+            for index, event in enumerate(self.pulseEvents[sideIndex]):
+                launches.setdefault(event[5], []).append((sideIndex, index))
+        active = (set(), set())
+
+        minutes = np.full(self.members, self.duration, dtype=np.int32)
+        fighting = self._fighting()
+        minutes[~fighting] = 0
+        timePulse = 0
+        while timePulse < self.duration and fighting.any():
+            for sideIndex, index in opening.get(timePulse, []):
+                active[sideIndex].add(index)
+            for sideIndex, index in closing.get(timePulse, []):
+                active[sideIndex].discard(index)
+
+            # Continuous fire of A on B, then of B on A
+            for sideIndex in range(2):
+                for index in sorted(active[sideIndex]):
+                    event = self.continuousEvents[sideIndex][index]
+                    self._apply(1 - sideIndex, event[1], self.continuous_fire(sideIndex, event[0]) * event[2], fighting)
+
+            # Pulse weapons launched this minute, then pulse weapons hitting, A first
+            for sideIndex, index in launches.get(timePulse, []):
+                event = self.pulseEvents[sideIndex][index]
+                pulseDamage = self.pulse_fire(sideIndex, event[0], event[2], event[3]) * event[4]
+                impacts.setdefault(event[6], []).append((1 - sideIndex, event[1], pulseDamage))
+            hits = impacts.pop(timePulse, [])
+            for targetIndex in range(2):
+                for sideIndex, target, pulseDamage in hits:
+                    if sideIndex == targetIndex:
+                        self._apply(sideIndex, target, pulseDamage, fighting)
+
+            for sideIndex in range(2):
+                for group, staying in enumerate(self.staying[sideIndex]):
+                    self.previousStaying[sideIndex][group] = staying.copy()
+            timePulse += 1
+            stopped = fighting & ~self._fighting()
+            minutes[stopped] = timePulse
+            fighting &= ~stopped
+
+            # Skip the minutes in which nothing happens
+            if not active[0] and not active[1]:
+                upcoming = [minute for schedule in (opening, launches, impacts) for minute in schedule if minute >= timePulse]
+                timePulse = min(upcoming + [self.duration])
+
+        return self.losses(minutes)
+
+    def losses(self, minutes = None):
+        """ Returns the losses of both sides (% lost), as Battle.losses() does but not
+        rounded, in a structured array (RESULT_DTYPE) with one entry per member."""
+        results = np.zeros(self.members, dtype=RESULT_DTYPE)
+        if minutes is not None:
+            results["minutes"] = minutes
+        for sideIndex, fields in enumerate((("sa", "fca", "fpa"), ("sb", "fcb", "fpb"))):
+            side = self.sides[sideIndex]
+            status = self.staying_power(sideIndex) / sum(self.originalStaying[sideIndex])
+            results[fields[0]] = (1 - status) * 100
+            for field, original in ((fields[1], side.originalContinuous), (fields[2], side.originalPulse)):
+                if original != 0:
+                    results[field] = (1 - original * status / original) * 100
+        return results
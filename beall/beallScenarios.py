@@ -0,0 +1,167 @@
+"""
+A scenario registry and historical validation harness for Thomas Reagan Beall's Naval
+Combat Model (1990).
+
+Battles are described declaratively in JSON files: the groups of both sides, with their
+pulse weapons, the fire events of each side, and the losses recorded historically. The
+registry holds every scenario file of the scenarios directory, by file name (without
+extension), and others can be registered. The harness resolves the whole catalogue, in
+a pool of worker processes if asked to, and reports the fit of the model's staying power
+losses to the historical ones.
+
+Usage:
+    python beallScenarios.py [key ...] [--workers 4] [--play]
+
+Scenario format (lists of group indices stand for tuple selections):
+    {"name": "Coronel 1914",
+     "sides": [{"name": "British",
+                "groups": [{"name": ..., "continuousFire": 7.27, "staying": 3.21,
+                            "pulse": [[power, number], ...]}, ...],
+                "continuousEvents": [{"firer": 1, "target": 0, "efficiency": 0.028,
+                                      "start": 6, "duration": 15}, ...],
+                "pulseEvents": [{"firer": [0, 1], "target": 0, "type": 0, "size": [17, 17],
+                                 "efficiency": 0.065, "start": 47, "tui": 111}, ...]},
+               {...}],
+     "historical": {"sa": 72.30, "sb": 0.0, "note": ...}}
+
+"""
+
+import json
+import math
+import os
+
+from beall import Group, Side, Battle
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+
+# Registered scenarios, by key -> path. Filled with the scenario directory on first use.
+REGISTRY = {}
+
+# Losses reported by Battle.losses(), by position
+LOSSES = ("sa", "fca", "fpa", "sb", "fcb", "fpb")
+
+
+def registry():
+    """ Returns the registered scenarios (key -> path), registering the files of the
+    scenario directory first if needed."""
+    if not REGISTRY and os.path.isdir(SCENARIO_DIR):
+        for file in sorted(os.listdir(SCENARIO_DIR)):
+            key, extension = os.path.splitext(file)
+            if extension == ".json":
+                REGISTRY.setdefault(key, os.path.join(SCENARIO_DIR, file))
+    return REGISTRY
+
+
+def register_scenario(key, path):
+    """ Registers a scenario file under a key, replacing any scenario with that key."""
+    registry()[key] = path
+
+
+def load_scenario(scenario):
+    """ Returns a scenario as a dict, given its key in the registry, the path of its
+    file, or the dict itself."""
+    if isinstance(scenario, dict):
+        return scenario
+    path = registry().get(scenario, scenario)
+    with open(path) as file:
+        return json.load(file)
+
+
+def _selection(value):
+    """ Returns a group selection (or salvo sizes) of a scenario as beall expects them:
+    lists become tuples."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def build_battle(scenario):
+    """ Builds the Battle of a scenario (a key, path or dict)."""
+    scenario = load_scenario(scenario)
+    sides = []
+    for sideData in scenario["sides"]:
+        groups = []
+        for groupData in sideData["groups"]:
+            group = Group(groupData["name"], groupData["continuousFire"], groupData["staying"])
+            for power, number in groupData.get("pulse", []):
+                group.add_pulse_weapon(power, number)
+            groups.append(group)
+        side = Side(sideData["name"], groups)
+        for event in sideData.get("continuousEvents", []):
+            side.continuous_fire_event(_selection(event["firer"]), _selection(event["target"]),
+                                       event["efficiency"], event["start"], event["duration"])
+        for event in sideData.get("pulseEvents", []):
+            side.pulse_fire_event(_selection(event["firer"]), _selection(event["target"]), event["type"],
+                                  _selection(event["size"]), event["efficiency"], event["start"], event["tui"])
+        sides.append(side)
+    return Battle(scenario["name"], sides[0], sides[1])
+
+
+def resolve_scenario(scenario):
+    """ Resolves a scenario (a key, path or dict) without printing, and returns a dict
+    with its name, the minutes it lasted, its losses (as in LOSSES) and its historical
+    losses (an empty dict if not recorded)."""
+    scenario = load_scenario(scenario)
+    summary = build_battle(scenario).resolve(False, 'summary')
+    return {"name": scenario["name"], "minutes": summary.minutes,
+            "losses": dict(zip(LOSSES, summary.losses)),
+            "historical": scenario.get("historical", {})}
+
+
+def validate(keys = None, workers = 1):
+    """ Resolves scenarios and compares their losses with the historical ones.
+
+    keys (list) = the scenarios to resolve (keys, paths or dicts). Defaults to the whole
+    registry.
+    workers (int) = the number of worker processes. 1 resolves in this process.
+
+    Returns the results of resolve_scenario() for every scenario, with the error (model
+    minus historical, in % lost) of every historical loss added as "errors", and the root
+    mean square of all the errors.
+    """
+    if keys is None:
+        keys = list(registry())
+    scenarios = [load_scenario(key) for key in keys]
+    if workers > 1:
+        # Only imported when needed, as it is slow to import
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(resolve_scenario, scenarios))
+    else:
+        results = [resolve_scenario(scenario) for scenario in scenarios]
+    errors = []
+    for result in results:
+        result["errors"] = {loss: result["losses"][loss] - value
+                            for loss, value in result["historical"].items() if loss in LOSSES}
+        errors.extend(result["errors"].values())
+    rmse = math.sqrt(sum(error ** 2 for error in errors) / len(errors)) if errors else 0
+    return results, rmse
+
+
+def report(results, rmse):
+    """ Prints the results of validate()."""
+    print("{:<20} | {:>7} | {:>7} | {:>7} | {:>7} | {:>7} | {:>7}".format(
+        "BATTLE", "SA", "SA HIST", "ERROR", "SB", "SB HIST", "ERROR"))
+    for result in results:
+        row = [result["name"][:20]]
+        for loss in ("sa", "sb"):
+            row.append("{:7.2f}".format(result["losses"][loss]))
+            if loss in result["historical"]:
+                row += ["{:7.2f}".format(result["historical"][loss]), "{:7.2f}".format(result["errors"][loss])]
+            else:
+                row += ["{:>7}".format("-")] * 2
+        print("{:<20} | {} | {} | {} | {} | {} | {}".format(*row))
+    print("\nRMS error of the staying power losses: {:.2f}".format(rmse))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Beall model historical validation")
+    parser.add_argument("keys", nargs="*", help="scenarios to resolve (default: all registered)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--play", action="store_true", help="print the scenarios minute by minute")
+    options = parser.parse_args()
+    if options.play:
+        for key in options.keys or list(registry()):
+            build_battle(key).resolve()
+            print()
+    else:
+        report(*validate(options.keys or None, options.workers))
@@ -0,0 +1,206 @@
+"""
+Forward-mode sensitivities for Thomas Reagan Beall's Naval Combat Model (1990).
+
+Every parameter of a scenario (the staying power, continuous fire and pulse weapon power
+of every group, in TPBE, and the efficiency of every fire event) is replaced by a dual
+number: its value, along with its derivative with respect to every parameter (a unit
+vector to begin with). The battle is then resolved as usual, minute by minute, and every
+operation of the model carries the derivatives along with the values, so that a single
+resolve returns the losses of both sides and their derivatives with respect to every
+parameter.
+
+The derivatives are those of the unrounded losses. Where the model takes a maximum (a
+group wiped out by the damage it takes), the derivative is that of the branch taken;
+a wiped-out group has zero staying power and a zero derivative.
+
+Scenarios are given in the format of beallScenarios.py.
+
+"""
+
+import copy
+
+import numpy as np
+
+from beall import Recorder
+from beallScenarios import load_scenario, build_battle, LOSSES
+
+
+class Dual:
+    """ A dual number: a value and its derivatives (gradient) with respect to the
+    parameters.
+    Parameters:
+    - value (float): the value.
+    - gradient (array): the derivatives of the value with respect to every parameter.
+    Comparisons only compare the values.
+    """
+    __slots__ = ("value", "gradient")
+    __hash__ = None
+
+    def __init__(self, value, gradient):
+        self.value = value
+        self.gradient = gradient
+
+    @staticmethod
+    def _parts(other):
+        """ Returns the value and gradient of a number, which has no gradient (0) unless
+        it is a Dual."""
+        if isinstance(other, Dual):
+            return other.value, other.gradient
+        return other, 0
+
+    def __add__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(self.value + value, self.gradient + gradient)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(self.value - value, self.gradient - gradient)
+
+    def __rsub__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(value - self.value, gradient - self.gradient)
+
+    def __mul__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(self.value * value, self.gradient * value + self.value * gradient)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(self.value / value, (self.gradient * value - self.value * gradient) / (value * value))
+
+    def __rtruediv__(self, other):
+        value, gradient = self._parts(other)
+        return Dual(value / self.value, (gradient * self.value - value * self.gradient) / (self.value * self.value))
+
+    def __neg__(self):
+        return Dual(-self.value, -self.gradient)
+
+    def __eq__(self, other):
+        return self.value == self._parts(other)[0]
+
+    def __ne__(self, other):
+        return self.value != self._parts(other)[0]
+
+    def __lt__(self, other):
+        return self.value < self._parts(other)[0]
+
+    def __le__(self, other):
+        return self.value <= self._parts(other)[0]
+
+    def __gt__(self, other):
+        return self.value > self._parts(other)[0]
+
+    def __ge__(self, other):
+        return self.value >= self._parts(other)[0]
+
+    def __float__(self):
+        return float(self.value)
+
+    def __round__(self, digits = None):
+        return round(self.value, digits)
+
+    def __repr__(self):
+        return "Dual({!r}, {!r})".format(self.value, self.gradient)
+
+
+def parameters(scenario):
+    """ Returns the parameters of a scenario, as a list of (name, path), where path is
+    the sequence of keys and indices leading to the value in the scenario dict. Names
+    take the form "<side>.<item>[<index>].<parameter>", for instance A.groups[0].staying,
+    B.groups[1].pulse[0] (the power of a pulse weapon) or A.continuousEvents[0].efficiency.
+    """
+    scenario = load_scenario(scenario)
+    names = []
+    for sideIndex, side in enumerate(scenario["sides"]):
+        label = "AB"[sideIndex]
+        for index, group in enumerate(side["groups"]):
+            for parameter in ("staying", "continuousFire"):
+                names.append(("{}.groups[{}].{}".format(label, index, parameter),
+                              ("sides", sideIndex, "groups", index, parameter)))
+            for weapon in range(len(group.get("pulse", []))):
+                names.append(("{}.groups[{}].pulse[{}]".format(label, index, weapon),
+                              ("sides", sideIndex, "groups", index, "pulse", weapon, 0)))
+        for events in ("continuousEvents", "pulseEvents"):
+            for index in range(len(side.get(events, []))):
+                names.append(("{}.{}[{}].efficiency".format(label, events, index),
+                              ("sides", sideIndex, events, index, "efficiency")))
+    return names
+
+
+def _get(scenario, path):
+    """ Returns the value at a path of a scenario dict."""
+    for key in path:
+        scenario = scenario[key]
+    return scenario
+
+
+def _set(scenario, path, value):
+    """ Sets the value at a path of a scenario dict."""
+    _get(scenario, path[:-1])[path[-1]] = value
+
+
+class SensitivityRecorder(Recorder):
+    """ Resolves the battle minute by minute, and records the unrounded losses of both
+    sides when it is over, with their derivatives.
+    Parameters:
+    - names (list): the names of the parameters the derivatives are taken with respect to.
+    Other attributes:
+    - losses (dict): the losses (% lost), by name (as in LOSSES).
+    - gradients (dict): the derivatives of every loss, as an array with one value per
+    parameter, by name.
+    """
+    everyMinute = True
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.losses = {}
+        self.gradients = {}
+
+    def finish(self, battle):
+        for sideIndex, side in enumerate(battle.sides):
+            names = LOSSES[3 * sideIndex:3 * sideIndex + 3]
+            losses = ((1 - side.get_status()) * 100, side.continuous_fire_loss(), side.pulse_fire_loss())
+            for name, loss in zip(names, losses):
+                value, gradient = Dual._parts(loss)
+                self.losses[name] = float(value)
+                self.gradients[name] = np.broadcast_to(np.asarray(gradient, dtype=np.float64), (len(self.names),)).copy()
+
+
+def sensitivities(scenario, names = None):
+    """ Resolves a scenario (a key, path or dict) once, and returns its losses and their
+    derivatives with respect to the parameters.
+
+    names (list) = the names of the parameters (see parameters()) to differentiate with
+    respect to. Defaults to all of them.
+
+    Returns the SensitivityRecorder of the battle.
+    """
+    scenario = load_scenario(scenario)
+    available = parameters(scenario)
+    if names is None:
+        names = [name for name, path in available]
+    paths = dict(available)
+    unknown = [name for name in names if name not in paths]
+    if unknown:
+        raise ValueError("Unknown parameters: {}".format(", ".join(unknown)))
+
+    # Seed every parameter with a unit vector
+    seeded = copy.deepcopy(scenario)
+    identity = np.eye(len(names))
+    for index, name in enumerate(names):
+        _set(seeded, paths[name], Dual(_get(seeded, paths[name]), identity[index]))
+    recorder = SensitivityRecorder(names)
+    build_battle(seeded).resolve(False, recorder)
+    return recorder
+
+
+if __name__ == "__main__":
+    # The sensitivities of the Coronel losses to every parameter
+    result = sensitivities("coronel")
+    print("{:<32} | {:>10} | {:>10}".format("PARAMETER", "dSA", "dSB"))
+    for index, name in enumerate(result.names):
+        print("{:<32} | {:>10.4f} | {:>10.4f}".format(name, result.gradients["sa"][index], result.gradients["sb"][index]))
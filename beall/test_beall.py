@@ -0,0 +1,253 @@
+import copy
+import json
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from beall import Group, Side, Battle, TraceRecorder, load_trace
+from beallCalibration import Calibration
+from beallEnsemble import Ensemble
+from beallScenarios import (build_battle, load_scenario, register_scenario, registry, resolve_scenario,
+                            validate, LOSSES)
+from beallSensitivity import parameters, sensitivities, _get, _set
+
+
+def random_scenario(rng):
+    ''' Returns a random scenario, in the format of beallScenarios.py.'''
+    sides = []
+    for label in "AB":
+        groups = []
+        for index in range(rng.randint(1, 3)):
+            groups.append({"name": "{}{}".format(label, index),
+                           "continuousFire": rng.uniform(0, 8), "staying": rng.uniform(0.5, 4),
+                           "pulse": [[rng.uniform(0.1, 1), rng.randint(1, 20)] for _ in range(rng.randint(1, 2))]})
+        sides.append({"name": label, "groups": groups})
+    for sideIndex, side in enumerate(sides):
+        firers, targets = len(side["groups"]), len(sides[1 - sideIndex]["groups"])
+
+        def selection(count):
+            choice = rng.random()
+            if choice < 0.2:
+                return "all"
+            elif choice < 0.6:
+                return rng.randrange(count)
+            return sorted(rng.sample(range(count), rng.randint(1, count)))
+
+        side["continuousEvents"] = [{"firer": selection(firers), "target": selection(targets),
+                                     "efficiency": rng.uniform(0.005, 0.05), "start": rng.randint(0, 30),
+                                     "duration": rng.randint(1, 25)} for _ in range(rng.randint(0, 3))]
+        side["pulseEvents"] = []
+        for _ in range(rng.randint(0, 2)):
+            firer = rng.randrange(firers)
+            if rng.random() < 0.5:
+                firer, size = [firer], [rng.randint(1, 20)]
+            else:
+                size = rng.randint(1, 20)
+            side["pulseEvents"].append({"firer": firer, "target": selection(targets), "type": 0, "size": size,
+                                        "efficiency": rng.uniform(0.05, 0.5), "start": rng.randint(0, 30),
+                                        "tui": rng.randint(1, 10)})
+    return {"name": "Random", "sides": sides}
+
+
+def scenarios(count, seed):
+    ''' Returns the registered scenarios, then 'count' random ones.'''
+    rng = random.Random(seed)
+    return list(registry()) + [random_scenario(rng) for _ in range(count)]
+
+
+def staying(battle):
+    ''' Returns the staying power of every group of a battle.'''
+    return [group.staying for side in battle.sides for group in side.groups]
+
+
+def test_event_jumps_match_every_minute():
+    # Skipping the minutes without events, and integrating continuous fire in closed form,
+    # ends the battle as resolving every minute does
+    for scenario in scenarios(300, 1):
+        jumping, stepping = build_battle(scenario), build_battle(scenario)
+        summary = jumping.resolve(False, 'summary')
+        trace = stepping.resolve(False, 'full')
+        assert summary.minutes == trace.minutes
+        assert all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+                   for a, b in zip(staying(jumping), staying(stepping)))
+        assert all(math.isclose(a, b, abs_tol=0.011) for a, b in zip(summary.losses, trace.losses))
+
+
+def test_ensemble_members_match_their_battles():
+    # Every member of an ensemble ends as a Battle with that member's parameters
+    rng = random.Random(2)
+    members = 20
+    for scenario in scenarios(60, 3):
+        scenario = load_scenario(scenario)
+        continuous = [[[rng.uniform(0.002, 0.06) for _ in range(members)] for _ in side.get("continuousEvents", [])]
+                      for side in scenario["sides"]]
+        pulse = [[[rng.uniform(0.02, 0.6) for _ in range(members)] for _ in side.get("pulseEvents", [])]
+                 for side in scenario["sides"]]
+        stayingPower = [[[rng.uniform(0.5, 4) for _ in range(members)] for _ in side["groups"]]
+                        for side in scenario["sides"]]
+        results = Ensemble(build_battle(scenario), members, continuous, pulse, stayingPower).resolve()
+        for member in range(members):
+            memberScenario = copy.deepcopy(scenario)
+            for sideIndex, side in enumerate(memberScenario["sides"]):
+                for events, values in (("continuousEvents", continuous), ("pulseEvents", pulse)):
+                    for event, value in zip(side.get(events, []), values[sideIndex]):
+                        event["efficiency"] = value[member]
+                for group, value in zip(side["groups"], stayingPower[sideIndex]):
+                    group["staying"] = value[member]
+            battle = build_battle(memberScenario)
+            battle.resolve(False)
+            assert results["minutes"][member] == battle.timePulse
+            losses = ((1 - battle.sideA.get_status()) * 100, battle.sideA.continuous_fire_loss(),
+                      battle.sideA.pulse_fire_loss(), (1 - battle.sideB.get_status()) * 100,
+                      battle.sideB.continuous_fire_loss(), battle.sideB.pulse_fire_loss())
+            for name, loss in zip(LOSSES, losses):
+                assert math.isclose(results[name][member], loss, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_side_views_follow_the_groups():
+    # The cached aggregates of a side always equal the sums of its groups, whatever
+    # selections were asked for before the groups changed
+    rng = random.Random(4)
+    for trial in range(200):
+        groups = [Group("G{}".format(index), rng.uniform(0, 8), rng.uniform(0.5, 4)) for index in range(4)]
+        for group in groups:
+            group.add_pulse_weapon(rng.uniform(0.1, 1), rng.randint(1, 20))
+        side = Side("A", groups)
+        selections = ['all', 0, 2, (0, 1), (1, 2, 3), (3,)]
+        for step in range(30):
+            action = rng.random()
+            if action < 0.4:
+                side.damage(rng.uniform(0.5, 1.2), rng.choice(selections))
+            elif action < 0.7:
+                rng.choice(groups).refresh()
+            elif action < 0.8:
+                rng.choice(groups).add_pulse_weapon(rng.uniform(0.1, 1), rng.randint(1, 20))
+            for selection in selections:
+                members = range(4) if selection == 'all' else ((selection,) if isinstance(selection, int) else selection)
+                assert math.isclose(side.staying_power(selection), sum(groups[i].staying for i in members))
+                assert math.isclose(side.continuous_fire(selection), sum(groups[i].continuous_fire() for i in members))
+            assert math.isclose(side.pulse_fire(), sum(group.pulse_fire() for group in groups))
+            assert math.isclose(side.pulse_fire((1, 2), 0, (5, 30)),
+                                groups[1].pulse_fire(0, 5) + groups[2].pulse_fire(0, 30))
+
+
+def test_recorders(tmp_path, capsys):
+    battle = build_battle("coronel")
+    path = str(tmp_path / "coronel.npz")
+    trace = battle.resolve(True, TraceRecorder(path))
+    printed = capsys.readouterr().out.splitlines()
+    # One printed line and one trace row per minute, after the values before the battle
+    assert trace.minutes == battle.timePulse
+    assert sum(line.split(" - ")[0].strip().isdigit() for line in printed) == trace.minutes
+    for sideIndex, side in enumerate(battle.sides):
+        assert trace.staying[sideIndex].shape == (trace.minutes + 1, len(side.groups))
+        assert trace.staying[sideIndex][0].tolist() == [group.originalStaying for group in side.groups]
+        assert trace.staying[sideIndex][-1].tolist() == [group.staying for group in side.groups]
+    saved = load_trace(path)
+    assert saved["losses"].tolist() == list(trace.losses) == list(battle.losses())
+    assert (saved["stayingA"] == trace.staying[0]).all() and (saved["pulseB"] == trace.pulse[1]).all()
+    with pytest.raises(ValueError):
+        build_battle("coronel").resolve(False, 'everything')
+
+
+def test_scenario_files_describe_the_historical_battles(tmp_path):
+    assert {"coronel", "coral_sea", "midway"} <= set(registry())
+    # The Coronel file is the battle of beall.py, built by hand
+    british = Side("British", [Group("Good Hope, Monmouth", 7.27, 3.21), Group("Glasgow", 0.42, 1.23)])
+    german = Side("German", [Group("Scharnhorst, Gneisenau", 4.32, 3.30), Group("Leipzig, Dresden", 4.33, 2.23)])
+    german.continuous_fire_event(0, 0, 0.028, 1, 28)
+    british.continuous_fire_event(1, 0, 0.028, 6, 15)
+    german.continuous_fire_event(1, 1, 0.012, 19, 2)
+    battle = Battle("Coronel 1914", british, german)
+    battle.resolve(False)
+    assert resolve_scenario("coronel")["losses"] == dict(zip(LOSSES, battle.losses()))
+    # Registered files are resolved with the others, in any number of processes
+    path = str(tmp_path / "copy.json")
+    with open(path, "w") as file:
+        json.dump(load_scenario("coronel"), file)
+    register_scenario("copy", path)
+    try:
+        keys = list(registry())
+        results, rmse = validate()
+        assert validate(workers=2) == (results, rmse)
+    finally:
+        del registry()["copy"]
+    assert results[keys.index("copy")]["losses"] == results[keys.index("coronel")]["losses"]
+    errors = [error for result in results for error in result["errors"].values()]
+    assert math.isclose(rmse, math.sqrt(sum(error ** 2 for error in errors) / len(errors)))
+
+
+def unrounded_losses(scenario):
+    ''' Returns the losses of a scenario, by name, as Battle.losses() does but not rounded.'''
+    battle = build_battle(scenario)
+    battle.resolve(False)
+    losses = ((1 - battle.sideA.get_status()) * 100, battle.sideA.continuous_fire_loss(),
+              battle.sideA.pulse_fire_loss(), (1 - battle.sideB.get_status()) * 100,
+              battle.sideB.continuous_fire_loss(), battle.sideB.pulse_fire_loss())
+    return dict(zip(LOSSES, losses))
+
+
+def test_sensitivities_match_finite_differences():
+    for key in ("coronel", "coral_sea", "midway"):
+        scenario = load_scenario(key)
+        result = sensitivities(scenario)
+        assert result.losses == pytest.approx(unrounded_losses(scenario), abs=1e-9)
+        for index, (name, path) in enumerate(parameters(scenario)):
+            value = _get(scenario, path)
+            step = 1e-6 * max(1, abs(value))
+            shifted = []
+            for sign in (1, -1):
+                changed = copy.deepcopy(scenario)
+                _set(changed, path, value + sign * step)
+                shifted.append(unrounded_losses(changed))
+            for loss in LOSSES:
+                difference = (shifted[0][loss] - shifted[1][loss]) / (2 * step)
+                assert math.isclose(result.gradients[loss][index], difference, rel_tol=1e-5, abs_tol=1e-5)
+
+
+def test_calibration_fits_only_identifiable_efficiencies():
+    calibration = Calibration()
+    residuals, jacobian = calibration.evaluate(calibration.start)
+    assert 0 < len(calibration.parameters) <= len(residuals)
+    assert np.linalg.matrix_rank(jacobian) == len(calibration.parameters)
+    result = calibration.fit()
+    assert result.rmse <= result.initialRmse
+    assert result.degrees > 0 and not result.exact
+    assert np.isfinite(result.sigma)
+    assert (np.isnan(result.std) == result.atBound).all()
+    # Fitting again from the same start resolves no battle twice
+    evaluations = calibration.evaluations
+    again = calibration.fit()
+    assert calibration.evaluations == evaluations
+    assert np.array_equal(again.values, result.values)
+
+
+def test_calibration_recovers_known_efficiencies():
+    # Historical losses made by the model itself: the Glasgow fire, which wipes nothing
+    # out, is recovered exactly, so sigma must be given
+    scenario = load_scenario("coronel")
+    name = "A.continuousEvents[0].efficiency"
+    scenario["historical"] = {loss: value for loss, value in unrounded_losses(scenario).items()
+                              if loss in ("sa", "sb")}
+    calibration = Calibration([scenario], ["Coronel 1914:" + name])
+    result = calibration.fit(start=[0.02])
+    assert result.start[0] == 0.02 and result.values[0] == pytest.approx(0.028, abs=1e-6)
+    assert result.exact and result.degrees == 1
+    assert math.isnan(result.sigma) and math.isnan(result.std[0])
+    assert "the fit is exact" in str(result)
+    given = calibration.fit(start=[0.02], sigma=5)
+    assert np.isfinite(given.std[0]) and given.std[0] > 0
+    # Two efficiencies of one battle, with one loss that depends on them: no degrees of freedom
+    scenario["historical"] = {"sb": scenario["historical"]["sb"] + 1}
+    calibration = Calibration([scenario], ["Coronel 1914:" + name, "Coronel 1914:B.continuousEvents[1].efficiency"])
+    result = calibration.fit()
+    assert result.degrees == 0
+    assert math.isnan(result.sigma)
+    with pytest.raises(ValueError):
+        Calibration([scenario], ["Coronel 1914:B.groups[0].staying.efficiency"])
@@ -0,0 +1,129 @@
+"""
+An import-time budget check for the models.
+
+Every model module is imported in a fresh interpreter, as a batch worker would import it,
+and the time taken by the import is compared with a budget. NumPy is imported first, as
+it is shared by the models and already loaded in a worker. A module also fails the check
+if importing it prints anything (a demo scenario running at import time) or loads
+matplotlib, which the models only import when plotting.
+
+Each module is imported once before it is timed, so that its bytecode is cached, as it
+is for a worker.
+
+Usage:
+    python importBudget.py [--budget 10] [--repeat 3] [--filter text]
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The model modules, relative to the repository
+MODULES = ("salvo/salvoEngine.py",
+           "salvo/deterministicSalvo.py",
+           "salvo/deterministicSalvoNoLeakers.py",
+           "salvo_montecarlo/salvo model monte carlo.py",
+           "salvo_montecarlo/batchSalvo.py",
+           "salvo_montecarlo/adaptiveMonteCarlo.py",
+           "salvo_montecarlo/varianceReduction.py",
+           "salvo_montecarlo/salvoSweep.py",
+           "salvo_montecarlo/salvoSurrogate.py",
+           "salvo_montecarlo/resultSink.py",
+           "stochastic_salvo/stochasticSalvo.py",
+           "lanchester/lanchesterSquare.py",
+           "lanchester/lanchesterLinear.py",
+           "lanchester_with_reinforcements/lanchesterLogic.py",
+           "lanchester_with_reinforcements/lanchesterBattle.py",
+           "chase/chase.py",
+           "suicide_bombing/sbombing.py",
+           "beall/beall.py",
+           "beall/beallEnsemble.py",
+           "beall/beallScenarios.py",
+           "beall/beallSensitivity.py",
+           "beall/beallCalibration.py",
+           "airWar/airForce.py",
+           "germantank/germantankproblem.py",
+           "okun/oblicalc.py")
+
+# Run in the fresh interpreter: imports the module at sys.argv[1] from its own directory
+PROBE = """
+import contextlib, importlib.util, io, json, os, sys, time
+import numpy
+path = sys.argv[1]
+sys.path.insert(0, os.path.dirname(path))
+spec = importlib.util.spec_from_file_location("model", path)
+module = importlib.util.module_from_spec(spec)
+output = io.StringIO()
+start = time.perf_counter()
+with contextlib.redirect_stdout(output):
+    spec.loader.exec_module(module)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "printed": len(output.getvalue()),
+                  "matplotlib": "matplotlib" in sys.modules}))
+"""
+
+
+def import_time(path, repeat = 3):
+    ''' Returns the best import time of a module over 'repeat' fresh interpreters, in
+    seconds, and whether any import printed something or loaded matplotlib.'''
+    best, printed, matplotlib = None, False, False
+    environment = dict(os.environ, MPLBACKEND="Agg")
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    # The first import writes the bytecode cache, and is not timed
+    for run in range(repeat + 1):
+        completed = subprocess.run([sys.executable, "-c", PROBE, path], capture_output=True,
+                                   text=True, env=environment, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if run == 0:
+            continue
+        best = result["seconds"] if best is None else min(best, result["seconds"])
+        printed = printed or result["printed"] > 0
+        matplotlib = matplotlib or result["matplotlib"]
+    return best, printed, matplotlib
+
+
+def check(budget = 0.01, repeat = 3, pattern = None):
+    ''' Imports every model module and returns the list of the modules failing the check.
+
+    Arguments:
+        * budget (float): the longest acceptable import time, in seconds.
+        * repeat (int): the number of fresh interpreters each module is imported in.
+        * pattern (str): only check the modules whose path contains this text.
+    '''
+    failures = []
+    for module in MODULES:
+        if pattern is not None and pattern not in module:
+            continue
+        seconds, printed, matplotlib = import_time(os.path.join(ROOT, module), repeat)
+        problems = []
+        if seconds > budget:
+            problems.append("over budget")
+        if printed:
+            problems.append("prints on import")
+        if matplotlib:
+            problems.append("imports matplotlib")
+        print("{:<50} {:>8.2f} ms  {}".format(module, seconds * 1000, ", ".join(problems)))
+        if problems:
+            failures.append(module)
+    return failures
+
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description="Model import-time budget check")
+    parser.add_argument("--budget", type=float, default=10, help="import budget, in milliseconds")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--filter", help="only check modules whose path contains this text")
+    options = parser.parse_args(arguments)
+
+    failures = check(options.budget / 1000, options.repeat, options.filter)
+    print("\n{} modules failing the {:g} ms budget".format(len(failures), options.budget))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+A benchmark suite for the salvo models.
+
+Times the core operations of the salvo models in salvo/ and salvo_montecarlo/ over a
+range of sizes, writes the timings as JSON, and compares them with a stored baseline,
+flagging every benchmark that got slower than the baseline by more than a threshold.
+
+Benchmarks:
+    * group_damage: Group.damage, salvos sinking a tenth of the group each, for fleet sizes.
+    * combat_power: Group.combat_power against an enemy group, for fleet sizes.
+    * battle_resolve: Battle.resolve of two equal groups, for fleet sizes.
+    * battle_resolve_lean: Battle.resolve(lean=True), for fleet sizes.
+    * monte_carlo: the Monte Carlo study of the Monte Carlo script, resolved by the batch
+    engine, for replicate counts.
+
+Every benchmark is run for each version of the model (leakers, no_leakers, montecarlo),
+except monte_carlo, which is run for both defence rules. The result key of a benchmark is
+"<benchmark>/<model>/<size>", and its value the best time of a few runs, in seconds.
+
+Usage:
+    python salvoBenchmarks.py [--quick] [--filter text] [--output results.json]
+                              [--baseline baseline.json] [--threshold 0.5] [--save-baseline]
+
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import time
+import types
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "salvo_montecarlo"))
+sys.path.insert(0, os.path.join(ROOT, "salvo"))
+
+from batchSalvo import BatchGroup, resolve_batch, NO_LEAKERS, LEAKERS
+
+# The versions of the model
+MODELS = {"leakers": os.path.join(ROOT, "salvo", "deterministicSalvo.py"),
+          "no_leakers": os.path.join(ROOT, "salvo", "deterministicSalvoNoLeakers.py"),
+          "montecarlo": os.path.join(ROOT, "salvo_montecarlo", "salvo model monte carlo.py")}
+
+FLEET_SIZES = (1, 10, 100, 1000, 10000, 100000)
+REPLICATES = (1, 10, 100, 1000, 10000, 100000, 1000000)
+QUICK_FLEET_SIZES = (1, 100, 10000)
+QUICK_REPLICATES = (1, 1000, 100000)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def load_model(path):
+    ''' Imports a salvo model script as a module. Its example scenario only runs as a
+    script, so importing it has no side effects.'''
+    name = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_time(function, repeat = 5):
+    ''' Returns the best time of 'repeat' runs of function(), in seconds. The function
+    returns another function, the part actually timed, so the setup is not timed.'''
+    times = []
+    for _ in range(repeat):
+        timed = function()
+        start = time.perf_counter()
+        timed()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _groups(model, units):
+    ''' Returns two equal groups of frigates, armed to penetrate each other's defences in
+    both versions of the model.'''
+    frigate = model.Ship("Frigate", 8, 4, 2)
+    standard = model.Missiles(1, 0.71, 0.75)
+    return (model.Group("BLUFOR", frigate, units, 1, 1, standard),
+            model.Group("REDFOR", frigate, units, 0.9, 1, standard))
+
+
+def group_damage(model, units):
+    def setup():
+        blu, red = _groups(model, units)
+        salvo = red.oob[0].sp * units / 10
+        def timed():
+            for _ in range(10):
+                blu.damage(salvo)
+        return timed
+    return setup
+
+
+def combat_power(model, units):
+    def setup():
+        blu, red = _groups(model, units)
+        def timed():
+            for _ in range(1000):
+                blu.combat_power(red)
+        return timed
+    return setup
+
+
+def battle_resolve(model, units):
+    def setup():
+        battle = model.Battle(*_groups(model, units))
+        def timed():
+            with contextlib.redirect_stdout(io.StringIO()):
+                battle.resolve()
+        return timed
+    return setup
+
+
+def battle_resolve_lean(model, units):
+    def setup():
+        battle = model.Battle(*_groups(model, units))
+        return lambda: battle.resolve(lean=True)
+    return setup
+
+
+def monte_carlo(rule, replicates):
+    def setup():
+        frigate = types.SimpleNamespace(op=4, dp=4, sp=2)
+        standard = types.SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+        scouting = np.random.default_rng(0).uniform(0, 1, replicates)
+        def timed():
+            blu = BatchGroup("BLUFOR", frigate, 5, replicates, scouting, 1, standard)
+            red = BatchGroup("REDFOR", frigate, 3, replicates, 1, 1, standard)
+            resolve_batch(blu, red, rule=rule)
+        return timed
+    return setup
+
+
+GROUP_BENCHMARKS = {"group_damage": group_damage, "combat_power": combat_power,
+                    "battle_resolve": battle_resolve, "battle_resolve_lean": battle_resolve_lean}
+
+
+def run(quick = False, pattern = None, repeat = 5):
+    ''' Runs the benchmarks and returns their results, as a dict with "meta" (the
+    environment) and "results" (benchmark key -> seconds).
+
+    Arguments:
+        * quick (bool): only run a few sizes of every benchmark.
+        * pattern (str): only run the benchmarks whose key contains this text.
+        * repeat (int): the number of runs of every benchmark.
+    '''
+    fleetSizes = QUICK_FLEET_SIZES if quick else FLEET_SIZES
+    replicateCounts = QUICK_REPLICATES if quick else REPLICATES
+    cases = []
+    for name, path in MODELS.items():
+        model = load_model(path)
+        for benchmark, function in GROUP_BENCHMARKS.items():
+            for units in fleetSizes:
+                cases.append(("{}/{}/{}".format(benchmark, name, units), function(model, units)))
+    for rule in (NO_LEAKERS, LEAKERS):
+        for replicates in replicateCounts:
+            cases.append(("monte_carlo/{}/{}".format(rule, replicates), monte_carlo(rule, replicates)))
+
+    results = {}
+    for key, setup in cases:
+        if pattern is not None and pattern not in key:
+            continue
+        results[key] = best_time(setup, repeat)
+        print("{:<45} {:>12.6f} s".format(key, results[key]))
+    meta = {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def compare(current, baseline, threshold = 0.5, min_time = 1e-4):
+    ''' Compares results with a baseline.
+
+    Arguments:
+        * current, baseline (dict): results, as returned by run().
+        * threshold (fraction): the slowdown above which a benchmark is a regression.
+        * min_time (float): benchmarks faster than this (in seconds) both now and in the
+        baseline are never flagged, as their timings are mostly noise.
+
+    Returns a list of (key, baseline seconds, current seconds, ratio) for every benchmark
+    in both, and a list of the keys of the regressions.
+    '''
+    rows, regressions = [], []
+    for key, seconds in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        reference = baseline["results"][key]
+        ratio = seconds / reference if reference > 0 else float("inf")
+        rows.append((key, reference, seconds, ratio))
+        if ratio > 1 + threshold and max(seconds, reference) >= min_time:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description="Salvo model benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="only run a few sizes")
+    parser.add_argument("--filter", help="only run benchmarks whose key contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every benchmark")
+    parser.add_argument("--output", help="file to write the results to (JSON)")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="slowdown over the baseline flagged as a regression")
+    parser.add_argument("--min-time", type=float, default=1e-4,
+                        help="benchmarks faster than this (s) are never flagged")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    options = parser.parse_args(arguments)
+
+    current = run(options.quick, options.filter, options.repeat)
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(current, file, indent=2)
+    if options.save_baseline:
+        with open(options.baseline, "w") as file:
+            json.dump(current, file, indent=2)
+        return 0
+    if not os.path.exists(options.baseline):
+        print("\nNo baseline at {}".format(options.baseline))
+        return 0
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    rows, regressions = compare(current, baseline, options.threshold, options.min_time)
+    print("\n{:<45} {:>12} {:>12} {:>8}".format("benchmark", "baseline", "current", "ratio"))
+    for key, reference, seconds, ratio in rows:
+        flag = "  REGRESSION" if key in regressions else ""
+        print("{:<45} {:>12.6f} {:>12.6f} {:>8.2f}{}".format(key, reference, seconds, ratio, flag))
+    print("\n{} regressions over {:.0%}".format(len(regressions), options.threshold))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
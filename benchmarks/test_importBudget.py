@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from importBudget import MODULES, check
+
+
+def test_model_modules_import_within_budget():
+    # Every model module imports in under 10 ms, prints nothing and does not load matplotlib
+    assert check(budget=0.01, repeat=3) == []
+
+
+def test_model_modules_exist():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert all(os.path.isfile(os.path.join(root, module)) for module in MODULES)
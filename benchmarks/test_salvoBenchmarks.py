@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from salvoBenchmarks import (BASELINE, FLEET_SIZES, GROUP_BENCHMARKS, MODELS, REPLICATES, compare,
+                             run)
+
+
+def test_compare_flags_only_real_slowdowns():
+    baseline = {"results": {"fast": 1e-6, "same": 1.0, "slower": 1.0, "gone": 1.0}}
+    current = {"results": {"fast": 1e-5, "same": 1.2, "slower": 2.0, "new": 1.0}}
+    rows, regressions = compare(current, baseline, threshold=0.5)
+    assert [row[0] for row in rows] == ["fast", "same", "slower"]
+    assert regressions == ["slower"]
+
+
+def test_baseline_covers_every_benchmark():
+    with open(BASELINE) as file:
+        baseline = json.load(file)
+    keys = ["{}/{}/{}".format(benchmark, name, units) for name in MODELS
+            for benchmark in GROUP_BENCHMARKS for units in FLEET_SIZES]
+    keys += ["monte_carlo/{}/{}".format(rule, replicates) for rule in ("no_leakers", "leakers")
+             for replicates in REPLICATES]
+    assert sorted(baseline["results"]) == sorted(keys)
+
+
+def test_run_times_the_selected_benchmarks():
+    results = run(quick=True, pattern="monte_carlo/leakers/", repeat=1)
+    assert sorted(results["results"]) == ["monte_carlo/leakers/1", "monte_carlo/leakers/1000",
+                                          "monte_carlo/leakers/100000"]
+    assert all(seconds > 0 for seconds in results["results"].values())
@@ -14,71 +14,75 @@ track of the equivalent ships remaining per side.
 
 import numpy
 
-import matplotlib.pyplot as plot
-
 from math import ceil
 
 # The length of the time step will not alter the end result.
 # Use only to determine the resolution of the graph.
 
-timeStart = 0.0
-timeEnd = 90.0
-timeStep = 0.01
-
-steps = int((timeEnd - timeStart) / timeStep)
-
-# Initialise numpy arrays covering each step of the simulation.
-# Two auxiliary arrays are used to store the equivalent number
-# of ships left in each fleet.
-
-blue = numpy.zeros(steps)
-blueShips = numpy.zeros(steps)
-red = numpy.zeros(steps)
-redShips = numpy.zeros(steps)
-time = numpy.zeros(steps)
-
-blue[0] = 8
-blueShips[0] = 8
-red[0] = 7
-redShips[0] = 7
-
-blueLethality = 0.2
-redLethality = 0.2
-
-blueStaying = 12
-redStaying = 12
-
-time[0] = timeStart
-
-for i in range(steps -1):
-    blue[i+1] = max(0, blue[i] - (timeStep * (red[i] * redLethality)) / blueStaying)
-    red[i+1] = max(0, red[i] - (timeStep * (blue[i] * blueLethality)) / redStaying)
-    blueShips[i+1] = max(0, ceil(blue[i] - (timeStep * (red[i] * redLethality)) / blueStaying))
-    redShips[i+1] = max(0, ceil(red[i] - (timeStep * (blue[i] * blueLethality)) / redStaying))
-    time[i+1] = time[i] + timeStep
-    
-# Remaining forces at the end of the simulation, for plot label purposes.
-    
-blueRemaining = float("{0:.2f}".format(blue[len(blue)-1]))
-redRemaining = float("{0:.2f}".format(red[len(red)-1]))
-print(blue[len(blue)-1])
-
-# Plot code.
-    
-plot.figure()
-plot.gca().yaxis.grid(True)
-plot.step(time, blue, '-b', where = 'post', label = 'Blue strength')
-plot.step(time, blueShips, '-c', where = 'post', label = 'Blue ships')
-plot.step(time, red, '-r', where = 'post', label = 'Red strength')
-plot.step(time, redShips, '-m', where = 'post', label = 'Red ships')
-plot.ylabel('Strength')
-plot.xlabel('Time')
-plot.legend()
-plot.annotate(blueRemaining,
-              xy=(timeEnd, blue[len(blue)-1]),
-              xytext=(-15,10),
-              textcoords='offset points')
-plot.annotate(redRemaining,
-              xy=(timeEnd, red[len(red)-1]),
-              xytext=(-15,10),
-              textcoords='offset points')
+def simulate(blueStart = 8, redStart = 7, blueLethality = 0.2, redLethality = 0.2,
+             blueStaying = 12, redStaying = 12, timeStart = 0.0, timeEnd = 90.0, timeStep = 0.01):
+    ''' Returns the NumPy arrays (time, blue, blueShips, red, redShips) of the
+    force strength and equivalent ships of both sides for each time pulse of
+    the simulation.'''
+    steps = int((timeEnd - timeStart) / timeStep)
+
+    # Initialise numpy arrays covering each step of the simulation.
+    # Two auxiliary arrays are used to store the equivalent number
+    # of ships left in each fleet.
+
+    blue = numpy.zeros(steps)
+    blueShips = numpy.zeros(steps)
+    red = numpy.zeros(steps)
+    redShips = numpy.zeros(steps)
+    time = numpy.zeros(steps)
+
+    blue[0] = blueStart
+    blueShips[0] = blueStart
+    red[0] = redStart
+    redShips[0] = redStart
+
+    time[0] = timeStart
+
+    for i in range(steps -1):
+        blue[i+1] = max(0, blue[i] - (timeStep * (red[i] * redLethality)) / blueStaying)
+        red[i+1] = max(0, red[i] - (timeStep * (blue[i] * blueLethality)) / redStaying)
+        blueShips[i+1] = max(0, ceil(blue[i] - (timeStep * (red[i] * redLethality)) / blueStaying))
+        redShips[i+1] = max(0, ceil(red[i] - (timeStep * (blue[i] * blueLethality)) / redStaying))
+        time[i+1] = time[i] + timeStep
+
+    return time, blue, blueShips, red, redShips
+
+def plot_battle(time, blue, blueShips, red, redShips):
+    ''' Plots the force strength and equivalent ships of both sides.
+    MatPlotLib is only imported when plotting.'''
+    import matplotlib.pyplot as plot
+
+    # Remaining forces at the end of the simulation, for plot label purposes.
+
+    blueRemaining = float("{0:.2f}".format(blue[len(blue)-1]))
+    redRemaining = float("{0:.2f}".format(red[len(red)-1]))
+
+    plot.figure()
+    plot.gca().yaxis.grid(True)
+    plot.step(time, blue, '-b', where = 'post', label = 'Blue strength')
+    plot.step(time, blueShips, '-c', where = 'post', label = 'Blue ships')
+    plot.step(time, red, '-r', where = 'post', label = 'Red strength')
+    plot.step(time, redShips, '-m', where = 'post', label = 'Red ships')
+    plot.ylabel('Strength')
+    plot.xlabel('Time')
+    plot.legend()
+    plot.annotate(blueRemaining,
+                  xy=(time[len(time)-1], blue[len(blue)-1]),
+                  xytext=(-15,10),
+                  textcoords='offset points')
+    plot.annotate(redRemaining,
+                  xy=(time[len(time)-1], red[len(red)-1]),
+                  xytext=(-15,10),
+                  textcoords='offset points')
+
+    plot.show()
+
+if __name__ == "__main__":
+    time, blue, blueShips, red, redShips = simulate(8, 7, 0.2, 0.2, 12, 12)
+    print(blue[len(blue)-1])
+    plot_battle(time, blue, blueShips, red, redShips)
@@ -55,4 +55,5 @@ def experiment(realtanks, samplesize):
     
     print("Error: {}%".format(percentageoff))
 
-experiment(1500, 20)
\ No newline at end of file
+if __name__ == "__main__":
+    experiment(1500, 20)
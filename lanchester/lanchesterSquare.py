@@ -13,59 +13,63 @@ array, and later plotted using MatPlotLib.
 
 import numpy
 
-import matplotlib.pyplot as plot
-
 # The length of the time step will not alter the end result.
 # Use only to determine the resolution of the graph.
 
-timeStart = 0.0
-timeEnd = 5.0
-timeStep = 0.01
-
-steps = int((timeEnd - timeStart) / timeStep)
-
-# Initialise numpy arrays covering each step of the simulation.
-
-blue = numpy.zeros(steps)
-red = numpy.zeros(steps)
-time = numpy.zeros(steps)
-
-# Iwo Jima sample values: blue (US) = 54000; red (Japanese) = 21500;
-# blueLethality = 0.0106; redLethality = 0.0544
-
-blue[0] = 42
-red[0] = 30
-
-blueLethality = 0.2
-redLethality = 0.2
-
-time[0] = timeStart
-
-for i in range(steps -1):
-    blue[i+1] = max(0, blue[i] - timeStep * (red[i] * redLethality))
-    red[i+1] = max(0, red[i] - timeStep * (blue[i] * blueLethality))
-    time[i+1] = time[i] + timeStep
-    
-# Remaining forces at the end of the simulation, for plot label purposes.
-    
-blueRemaining = int(blue[len(blue)-1])
-redRemaining = int(red[len(red)-1])
-
-# Plot code.
-    
-plot.figure()
-plot.step(time, blue, '-b', where = 'post', label = 'Blue army')
-plot.step(time, red, '-r', where = 'post', label = 'Red army')
-plot.ylabel('Strength')
-plot.xlabel('Time')
-plot.legend()
-plot.annotate(blueRemaining,
-              xy=(timeEnd, blue[len(blue)-1]),
-              xytext=(-15,10),
-              textcoords='offset points')
-plot.annotate(redRemaining,
-              xy=(timeEnd, red[len(red)-1]),
-              xytext=(-15,10),
-              textcoords='offset points')
-              
-plot.show()
\ No newline at end of file
+def simulate(blueStart = 42, redStart = 30, blueLethality = 0.2, redLethality = 0.2,
+             timeStart = 0.0, timeEnd = 5.0, timeStep = 0.01):
+    ''' Returns the NumPy arrays (time, blue, red) of the force strength of
+    both sides for each time pulse of the simulation.'''
+    steps = int((timeEnd - timeStart) / timeStep)
+
+    # Initialise numpy arrays covering each step of the simulation.
+
+    blue = numpy.zeros(steps)
+    red = numpy.zeros(steps)
+    time = numpy.zeros(steps)
+
+    blue[0] = blueStart
+    red[0] = redStart
+
+    time[0] = timeStart
+
+    for i in range(steps -1):
+        blue[i+1] = max(0, blue[i] - timeStep * (red[i] * redLethality))
+        red[i+1] = max(0, red[i] - timeStep * (blue[i] * blueLethality))
+        time[i+1] = time[i] + timeStep
+
+    return time, blue, red
+
+def plot_battle(time, blue, red):
+    ''' Plots the force strength of both sides. MatPlotLib is only imported
+    when plotting.'''
+    import matplotlib.pyplot as plot
+
+    # Remaining forces at the end of the simulation, for plot label purposes.
+
+    blueRemaining = int(blue[len(blue)-1])
+    redRemaining = int(red[len(red)-1])
+
+    plot.figure()
+    plot.step(time, blue, '-b', where = 'post', label = 'Blue army')
+    plot.step(time, red, '-r', where = 'post', label = 'Red army')
+    plot.ylabel('Strength')
+    plot.xlabel('Time')
+    plot.legend()
+    plot.annotate(blueRemaining,
+                  xy=(time[len(time)-1], blue[len(blue)-1]),
+                  xytext=(-15,10),
+                  textcoords='offset points')
+    plot.annotate(redRemaining,
+                  xy=(time[len(time)-1], red[len(red)-1]),
+                  xytext=(-15,10),
+                  textcoords='offset points')
+
+    plot.show()
+
+if __name__ == "__main__":
+    # Iwo Jima sample values: blue (US) = 54000; red (Japanese) = 21500;
+    # blueLethality = 0.0106; redLethality = 0.0544
+
+    time, blue, red = simulate(42, 30, 0.2, 0.2)
+    plot_battle(time, blue, red)
@@ -17,31 +17,32 @@
 from lanchesterLogic import *
 
 
-# Define both sides
-blue = Side('British Fleet', 13, 0.05)
-red = Side('Combined Fleet', 3, 0.05)
-
-# Set the replacement schedules for the three separate actions
-blue_replacements = [(4, 14)]
-red_replacements = [(4, 17), (19, 13)]
-
-# Set the battle up and plot it
-battle = Battle('Battle of Trafalgar', blue, red, 37, 0.01, blue_replacements, red_replacements)
-battle.resolve()
-battle.plot()
-
-"""
-# Trafalgar as a single exchange of fire
-
-blue = Side('British Fleet', 27, 0.05)
-red = Side('Combined Fleet', 33, 0.05)
-
-# Set the replacement schedules for the three separate actions
-blue_replacements = None
-red_replacements = None
-
-# Set the battle up and plot it
-battle = Battle('Hypothetical scenario 2', blue, red, 24, 0.01, blue_replacements, red_replacements)
-battle.resolve()
-battle.plot()
-"""
+if __name__ == "__main__":
+    # Define both sides
+    blue = Side('British Fleet', 13, 0.05)
+    red = Side('Combined Fleet', 3, 0.05)
+
+    # Set the replacement schedules for the three separate actions
+    blue_replacements = [(4, 14)]
+    red_replacements = [(4, 17), (19, 13)]
+
+    # Set the battle up and plot it
+    battle = Battle('Battle of Trafalgar', blue, red, 37, 0.01, blue_replacements, red_replacements)
+    battle.resolve()
+    battle.plot()
+
+    """
+    # Trafalgar as a single exchange of fire
+
+    blue = Side('British Fleet', 27, 0.05)
+    red = Side('Combined Fleet', 33, 0.05)
+
+    # Set the replacement schedules for the three separate actions
+    blue_replacements = None
+    red_replacements = None
+
+    # Set the battle up and plot it
+    battle = Battle('Hypothetical scenario 2', blue, red, 24, 0.01, blue_replacements, red_replacements)
+    battle.resolve()
+    battle.plot()
+    """
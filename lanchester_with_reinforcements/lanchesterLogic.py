@@ -10,7 +10,6 @@
 # ================================================
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 class Side:
@@ -80,6 +79,8 @@ class Battle:
 
     def plot(self):
         """Plot the battle results as a function of time"""
+        # matplotlib is only imported when plotting
+        import matplotlib.pyplot as plt
 
         fig, ax = plt.subplots()
         plt.title(self.name)
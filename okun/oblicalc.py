@@ -38,4 +38,5 @@ def oblicalc(target_angle, angle_of_fall, inclination, rotation=90):
 	
 	return obliquity
 
-print(oblicalc(83, 12, -60))
+if __name__ == "__main__":
+	print(oblicalc(83, 12, -60))
@@ -0,0 +1,1078 @@
+"""
+The salvo engine: the classes of the Deterministic Salvo Model created by Wayne P. Hughes Jr.
+
+The scripts in this directory and in salvo_montecarlo/ build their scenarios from these
+classes. The two versions of the model differ only in how a group's defences deal with
+incoming missiles, and are provided as defence rules:
+
+    * NO_LEAKERS: every SAM fired intercepts sam_to_hit missiles, and the missiles not
+    intercepted all hit.
+    * LEAKERS: the SAM intercept the missiles up to the defensive power, and a fraction
+    (1 - sam_to_hit) of the missiles engaged still gets through.
+
+A group defends itself with its own rule. Other rules can be added to RULES, as instances
+of a DefenceRule subclass.
+
+Importing this module has no side effects: it runs no battles and does not load
+matplotlib, which is only imported when a battle is plotted.
+
+"""
+
+from bisect import bisect_right
+from collections import OrderedDict
+import copy
+import math
+
+import numpy as np
+
+# Defence rules, matching the two versions of the model
+NO_LEAKERS = "no_leakers"
+LEAKERS = "leakers"
+
+class DefenceRule:
+    ''' How a group's defences deal with incoming missiles.
+    
+    Every method takes the raw striking power of the attackers, the defensive power of the
+    defending group (see defence_factor()) and the sam_to_hit of its missiles. The
+    combat_powers() method takes arrays of them, one entry per group or replicate.
+    
+    Attributes:
+        * name (str): the key of the rule in RULES.
+    '''
+    name = None
+    
+    def defence_factor(self, sam_to_hit):
+        ''' Returns the factor applied to the SAM salvo of a group in its defensive power,
+        given the sam_to_hit of its missiles (a value or an array).'''
+        raise NotImplementedError
+        
+    def combat_power(self, striking, defence, sam_to_hit):
+        ''' Returns the combat power of the attackers in excess of the defences.'''
+        raise NotImplementedError
+        
+    def combat_powers(self, striking, defence, sam_to_hit):
+        ''' Returns combat_power() for arrays of attackers and defenders.'''
+        raise NotImplementedError
+        
+    def combat_coefficients(self, striking, defence, sam_to_hit, overwhelm):
+        ''' Returns the coefficients (alpha, beta) of the combat power, for groups of
+        identical ships: combat power = alpha * attacker status - beta * defender status,
+        where 'striking' and 'defence' are given for one ship, for as long as the attackers
+        do (overwhelm = True) or do not overwhelm the defences.'''
+        raise NotImplementedError
+        
+    def __str__(self):
+        return self.name
+        
+class NoLeakersRule(DefenceRule):
+    ''' Every SAM intercepts sam_to_hit missiles, and all the others hit.'''
+    name = NO_LEAKERS
+    
+    def defence_factor(self, sam_to_hit):
+        return sam_to_hit
+        
+    def combat_power(self, striking, defence, sam_to_hit):
+        return max(0, (striking - defence))
+        
+    def combat_powers(self, striking, defence, sam_to_hit):
+        return np.maximum(striking - defence, 0)
+        
+    def combat_coefficients(self, striking, defence, sam_to_hit, overwhelm):
+        if overwhelm:
+            return striking, defence
+        return 0, 0
+        
+class LeakersRule(DefenceRule):
+    ''' The SAM engage the missiles up to the defensive power, and (1 - sam_to_hit) of
+    the missiles engaged leak through.'''
+    name = LEAKERS
+    
+    def defence_factor(self, sam_to_hit):
+        return 1
+        
+    def combat_power(self, striking, defence, sam_to_hit):
+        overwhelm = max(striking - defence, 0)
+        if overwhelm > 0:
+            return overwhelm + (1 - sam_to_hit) * defence
+        return (1 - sam_to_hit) * striking
+        
+    def combat_powers(self, striking, defence, sam_to_hit):
+        overwhelm = np.maximum(striking - defence, 0)
+        leakers = 1 - sam_to_hit
+        return np.where(overwhelm > 0, overwhelm + leakers * defence, leakers * striking)
+        
+    def combat_coefficients(self, striking, defence, sam_to_hit, overwhelm):
+        if overwhelm:
+            return striking, sam_to_hit * defence
+        return (1 - sam_to_hit) * striking, 0
+        
+RULES = {NO_LEAKERS: NoLeakersRule(), LEAKERS: LeakersRule()}
+
+def get_rule(rule):
+    ''' Returns a DefenceRule, given itself or its name in RULES.'''
+    if isinstance(rule, DefenceRule):
+        return rule
+    if rule not in RULES:
+        raise ValueError("Unknown defence rule {!r}, expected one of {}".format(rule, list(RULES)))
+    return RULES[rule]
+    
+class Ship:
+    ''' A ship carrying anti-ship cruise missiles.
+    
+    Attributes:
+        * type (str): the type of ship, for labeling purposes only.
+        * op (int): the number of anti-ship cruise missiles the ship can fire in one salvo.
+        * dp (int): the number of SAM the ship can fire in one salvo against incoming missiles.
+        * sp (float): initial staying power in missile hits.
+        * hp (float): hit points remaining.
+        * status (fraction): fraction of its staying power remaining. 1 is intact, 0 is OOA.
+        * group (Group): the group the ship belongs to, if any.
+    '''
+    
+    def __init__(self, type, op, dp, sp):
+        self.type = type
+        self.op = op
+        self.dp = dp
+        self.sp = sp
+        self.hp = sp
+        self.status = 1
+        self.group = None
+        
+    def damage(self, damage, notify = True):
+        ''' Lowers the ship's 'hp' attribute by the input amount.
+        
+        Args:
+            * damage (float): points of damage to subtract. HP cannot go below 0.
+            * notify (bool): whether to tell the ship's group (see Group.ship_damaged). Group.damage
+            updates the group itself, once for all the ships it damages.
+        '''
+        previousStatus = self.status
+        damage = min(damage, self.hp)
+        damage = max(damage, 0)
+        self.hp -= damage
+        self.status = self.hp / self.sp
+        if notify and self.group is not None:
+            self.group.ship_damaged(self, previousStatus)
+        
+    def ascm_fire(self):
+        ''' Returns cruise missile salvo size based on status.'''
+        return self.op * self.status
+        
+    def sam_fire(self):
+        ''' Returns SAM salvo size based on status.'''
+        return self.dp * self.status
+        
+    def __str__(self):
+        ''' String override. Returns ship type, status as percentage, OP, and DP.'''
+        shipStatus = round(self.status * 100, 2)
+        shipOp = round(self.ascm_fire(), 2)
+        shipDp = round(self.sam_fire(), 2)
+        shipString = "{} ({}%) OP: {} DP: {}\n".format(self.type, shipStatus, shipOp, shipDp)
+        return shipString
+        
+class Missiles:
+    ''' The specification of the missile systems carried by a group of ships.
+    
+    Attributes:
+        * launch_reliability (fraction): fraction of cruise missiles that launch successfully.
+        * ascm_to_hit (fraction): fraction of cruise missiles that hit, in the absence of defences.
+        * sam_to_hit (fraction): fraction of SAM that successfully intercept incoming missiles.
+    '''
+    def __init__(self, launch_reliability = 1, ascm_to_hit = 1, sam_to_hit = 1):
+        self.launch_reliability = launch_reliability
+        self.ascm_to_hit = ascm_to_hit
+        self.sam_to_hit = sam_to_hit
+        
+    def offensive_modifier(self):
+        ''' Returns the fraction of missiles that launch AND hit.'''
+        return self.launch_reliability * self.ascm_to_hit
+
+class Group:
+    ''' A group of ships.
+    
+    Attributes:
+        * side (str): the group's side identifier, for labelling purposes.
+        * ship (Ship): the ship type the group is composed of.
+        * units (int): the number of ships of type (ship) in the group.
+            * oob (list): a list of Ship objects representing the group.
+            * prefix (list): cumulative staying power of the ships in 'oob'.
+            * cursor (int): index of the first ship in 'oob' that is not out of action.
+            * ordered (bool): whether the ships behind the cursor are all intact, as
+            Group.damage leaves them. Damaging them directly (Ship.damage) breaks it.
+            * afloat (int): the number of ships in 'oob' that are not out of action.
+            * totalStatus (float): sum of the 'status' attributes of the ships.
+            * salvoSize (float): sum of the cruise missile salvos of the ships.
+            * defensiveSalvoSize (float): sum of the SAM salvos of the ships.
+        * scouting (fraction): fraction of enemy group that can be located and targeted.
+        * readiness (fraction): efficiency of the group's defences.
+        * missiles (Missiles): the missile systems used by the group.
+        * rule (DefenceRule): how the group's defences deal with incoming missiles. Given
+        by name or as a DefenceRule; defaults to the class attribute (NO_LEAKERS).
+    '''
+    rule = RULES[NO_LEAKERS]
+    
+    def __init__(self, side, ship, units, scouting = 1, readiness = 1, missiles = Missiles(), rule = None):
+        self.side = side
+        if rule is not None:
+            self.rule = get_rule(rule)
+        self.oob = [Ship(ship.type, ship.op, ship.dp, ship.sp) for i in range(units)]
+        # Cumulative staying power of the ships, and index of the first ship still afloat
+        self.prefix = [ship.sp * i for i in range(units + 1)]
+        self.cursor = 0
+        self.ordered = True
+        # Running aggregates, updated whenever a ship is damaged
+        for i in self.oob:
+            i.group = self
+        self.afloat = units
+        self.totalStatus = units
+        self.salvoSize = ship.op * units
+        self.defensiveSalvoSize = ship.dp * units
+        self.scouting = scouting
+        self.readiness = readiness
+        self.missiles = missiles
+        
+    def striking_power(self):
+        ''' Returns the raw striking power of the group.'''
+        strikingPower = self.salvoSize * self.scouting * self.missiles.offensive_modifier()
+        return strikingPower
+        
+    def defensive_power(self):
+        ''' Returns the raw defensive power of the group.'''
+        defensivePower = self.defensiveSalvoSize * self.readiness * self.rule.defence_factor(self.missiles.sam_to_hit)
+        return defensivePower
+        
+    def combat_power(self, enemy):
+        ''' Returns the combat power in excess of the enemy's defences.
+        
+        Arguments:
+            * enemy (Group): the target group.
+        '''
+        return enemy.rule.combat_power(self.striking_power(), enemy.defensive_power(),
+                                       enemy.missiles.sam_to_hit)
+        
+    def combat_coefficients(self, enemy, overwhelm):
+        ''' Returns the coefficients (alpha, beta) of the combat power of a group of identical
+        ships: combat_power(enemy) = alpha * self.total_status() - beta * enemy.total_status(),
+        for as long as the group does (overwhelm = True) or does not overwhelm the enemy's
+        defences.
+        
+        Arguments:
+            * enemy (Group): the target group.
+            * overwhelm (bool): whether the striking power exceeds the enemy's defences.
+        '''
+        striking = self.template().op * self.scouting * self.missiles.offensive_modifier()
+        defence = enemy.template().dp * enemy.readiness * enemy.rule.defence_factor(enemy.missiles.sam_to_hit)
+        return enemy.rule.combat_coefficients(striking, defence, enemy.missiles.sam_to_hit, overwhelm)
+        
+    def total_status(self):
+        ''' Returns the sum of the 'status' attributes of all ships in the group.'''
+        return self.totalStatus
+        
+    def template(self):
+        ''' Returns a Ship with the values shared by all the ships in the group, or None if
+        the ships are not identical.'''
+        if not self.oob:
+            return None
+        first = self.oob[0]
+        if any((i.op, i.dp, i.sp) != (first.op, first.dp, first.sp) for i in self.oob):
+            return None
+        return Ship(first.type, first.op, first.dp, first.sp)
+        
+    def set_status(self, totalStatus):
+        ''' Sets the total status of a group of identical ships, with the ships out of action
+        first, then one partially damaged ship, then the intact ones, as Group.damage leaves
+        them.
+        
+        Arguments:
+            * totalStatus (float): the new total status, from 0 to the number of units.
+        '''
+        units = len(self.oob)
+        intact = math.floor(totalStatus)
+        fraction = totalStatus - intact
+        self.cursor = units - intact - (1 if fraction > 0 else 0)
+        for index, i in enumerate(self.oob):
+            if index < self.cursor:
+                i.hp = 0
+            elif index == self.cursor and fraction > 0:
+                i.hp = fraction * i.sp
+            else:
+                i.hp = i.sp
+            i.status = i.hp / i.sp
+        self.afloat = units - self.cursor
+        self.ordered = True
+        self.totalStatus = totalStatus
+        self.salvoSize = self.oob[0].op * totalStatus if self.oob else 0
+        self.defensiveSalvoSize = self.oob[0].dp * totalStatus if self.oob else 0
+        
+    def lose_status(self, lost, op, dp, sunk = 0, status = 0):
+        ''' Updates the running aggregates of the group after its ships are damaged.
+        
+        Arguments:
+            * lost (float): the total 'status' lost by the ships.
+            * op, dp (int): the OP and DP of the ships damaged.
+            * sunk (int): the number of ships put out of action.
+            * status (fraction): the 'status' of the last ship damaged, if still afloat.
+        '''
+        self.afloat -= sunk
+        if self.afloat == 0:
+            # Clear any rounding residue, so that a destroyed group is exactly zero
+            self.totalStatus = self.salvoSize = self.defensiveSalvoSize = 0.0
+        elif self.afloat == 1 and status > 0:
+            # The last ship afloat: take the aggregates from its own status, as rounding
+            # residue in the running sums would be large next to a ship worn down to nothing
+            self.totalStatus = status
+            self.salvoSize = op * status
+            self.defensiveSalvoSize = dp * status
+        else:
+            self.totalStatus -= lost
+            self.salvoSize -= op * lost
+            self.defensiveSalvoSize -= dp * lost
+        
+    def ship_damaged(self, ship, previousStatus):
+        ''' Updates the group after one of its ships is damaged directly (Ship.damage): the
+        running aggregates, and the cursor, moved past the ships out of action. A ship
+        damaged behind the cursor breaks the order Group.damage relies on.
+        
+        Arguments:
+            * ship (Ship): the ship damaged.
+            * previousStatus (fraction): its status before the damage.
+        '''
+        self.lose_status(previousStatus - ship.status, ship.op, ship.dp,
+                         int(previousStatus > 0 and ship.status == 0), ship.status)
+        while self.cursor < len(self.oob) and self.oob[self.cursor].hp == 0:
+            self.cursor += 1
+        if ship.hp < ship.sp and self.oob.index(ship) > self.cursor:
+            self.ordered = False
+            
+    def damage(self, damage):
+        ''' Damages the group. Applied to all ships consecutively until damage reaches
+        zero, or no more targets are available. Ships already out of action are skipped
+        using 'cursor', and the ships reached by the damage are found with a binary
+        search over 'prefix', so the cost does not grow with the size of the group.
+        The running aggregates are updated once for the whole salvo. If ships were
+        damaged directly out of order, they are damaged one by one instead.
+        
+        Arguments:
+            * damage (float): the total amount damage to inflict upon the group.
+        ''' 
+        if damage <= 0 or self.cursor == len(self.oob):
+            return
+        if not self.ordered:
+            for i in self.oob[self.cursor:]:
+                if damage <= 0:
+                    break
+                applied = min(damage, i.hp)
+                damage -= applied
+                i.damage(applied)
+            return
+        first = self.oob[self.cursor]
+        previousCursor = self.cursor
+        lost = first.status
+        if damage <= first.hp:
+            first.damage(damage, False)
+            lost -= first.status
+        else:
+            # Sink the first ship, then find the last ship reached by the remaining damage
+            damage -= first.hp
+            first.damage(first.hp, False)
+            start = self.cursor + 1
+            reach = self.prefix[start] + damage
+            last = bisect_right(self.prefix, reach, lo = start) - 1
+            for i in self.oob[start:last]:
+                i.damage(i.hp, False)
+            # Ships behind the cursor are intact, so each sunk one loses a status of 1
+            lost += last - start
+            if last < len(self.oob):
+                self.oob[last].damage(reach - self.prefix[last], False)
+                lost += 1 - self.oob[last].status
+            self.cursor = last
+        if self.cursor < len(self.oob) and self.oob[self.cursor].hp == 0:
+            self.cursor += 1
+        status = self.oob[self.cursor].status if self.cursor < len(self.oob) else 0
+        self.lose_status(lost, first.op, first.dp, self.cursor - previousCursor, status)
+        
+    def __str__(self):
+        ''' String override. Returns the percentage of the original staying power remaining,
+        and the (equivalent) number of active ships.
+        '''
+        percentage = round((self.total_status() / len(self.oob)) * 100, 2)
+        activeShips = round(self.total_status(), 2)
+        groupString = "{}: {}% ({} active ships)".format(self.side, percentage, activeShips)
+        return groupString
+        
+class HomogeneousGroup(Group):
+    ''' A group of identical ships, stored without one Ship object per unit.
+    
+    Damage is applied to the ships in order, so the group is always made of a number of
+    ships out of action, one ship partially damaged, and the rest intact. Only the index
+    of the first ship afloat and its hit points are kept, so the memory used does not
+    depend on the size of the group. The results are the same as those of Group.
+    
+    Attributes:
+        * side (str): the group's side identifier, for labelling purposes.
+        * ship (Ship): the ship type the group is composed of. It is never damaged.
+        * units (int): the number of ships of type (ship) in the group.
+            * cursor (int): the number of ships out of action, and index of the first ship afloat.
+            * hp (float): hit points remaining of the first ship afloat.
+            * afloat, totalStatus, salvoSize, defensiveSalvoSize: as in Group.
+        * scouting (fraction): fraction of enemy group that can be located and targeted.
+        * readiness (fraction): efficiency of the group's defences.
+        * missiles (Missiles): the missile systems used by the group.
+        * rule (DefenceRule): as in Group.
+    '''
+    def __init__(self, side, ship, units, scouting = 1, readiness = 1, missiles = Missiles(), rule = None):
+        self.side = side
+        if rule is not None:
+            self.rule = get_rule(rule)
+        self.ship = ship
+        self.units = units
+        self.cursor = 0
+        self.hp = ship.sp
+        self.afloat = units
+        self.totalStatus = units
+        self.salvoSize = ship.op * units
+        self.defensiveSalvoSize = ship.dp * units
+        self.scouting = scouting
+        self.readiness = readiness
+        self.missiles = missiles
+        
+    def template(self):
+        ''' Returns the Ship the group is composed of.'''
+        return self.ship
+        
+    def set_status(self, totalStatus):
+        ''' Sets the total status of the group, with the ships out of action first, then
+        one partially damaged ship, then the intact ones.
+        
+        Arguments:
+            * totalStatus (float): the new total status, from 0 to the number of units.
+        '''
+        intact = math.floor(totalStatus)
+        fraction = totalStatus - intact
+        self.cursor = self.units - intact - (1 if fraction > 0 else 0)
+        self.hp = fraction * self.ship.sp if fraction > 0 else (self.ship.sp if self.cursor < self.units else 0)
+        self.afloat = self.units - self.cursor
+        self.totalStatus = totalStatus
+        self.salvoSize = self.ship.op * totalStatus
+        self.defensiveSalvoSize = self.ship.dp * totalStatus
+        
+    def ship_status(self, index):
+        ''' Returns the 'status' of the ship at position (index) in the group.'''
+        if index < self.cursor:
+            return 0
+        elif index == self.cursor:
+            return self.hp / self.ship.sp
+        return 1
+        
+    def damage(self, damage):
+        ''' Damages the group. Applied to all ships consecutively until damage reaches
+        zero, or no more targets are available, with the same arithmetic as Group.damage.
+        
+        Arguments:
+            * damage (float): the total amount damage to inflict upon the group.
+        '''
+        if damage <= 0 or self.cursor == self.units:
+            return
+        sp = self.ship.sp
+        previousCursor = self.cursor
+        lost = self.hp / sp
+        if damage <= self.hp:
+            self.hp -= damage
+            lost -= self.hp / sp
+        else:
+            # Sink the first ship, then find the last ship reached by the remaining damage:
+            # the last position whose cumulative staying power (sp * position) is covered
+            damage -= self.hp
+            start = self.cursor + 1
+            reach = sp * start + damage
+            last = min(max(int(reach // sp), start), self.units)
+            while last > start and sp * last > reach:
+                last -= 1
+            while last < self.units and sp * (last + 1) <= reach:
+                last += 1
+            lost += last - start
+            self.hp = 0
+            if last < self.units:
+                self.hp = sp - min(max(reach - sp * last, 0), sp)
+                lost += 1 - self.hp / sp
+            self.cursor = last
+        if self.cursor < self.units and self.hp == 0:
+            self.cursor += 1
+            self.hp = sp
+        status = self.hp / sp if self.cursor < self.units else 0
+        self.lose_status(lost, self.ship.op, self.ship.dp, self.cursor - previousCursor, status)
+        
+    def __str__(self):
+        ''' String override. Returns the percentage of the original staying power remaining,
+        and the (equivalent) number of active ships.
+        '''
+        percentage = round((self.total_status() / self.units) * 100, 2)
+        activeShips = round(self.total_status(), 2)
+        groupString = "{}: {}% ({} active ships)".format(self.side, percentage, activeShips)
+        return groupString
+        
+class OutcomeCache:
+    ''' A bounded cache of battle outcomes, shared by the battles resolved in lean mode.
+    
+    The future of a battle between groups of identical ships only depends on the ship
+    type, settings, defence rule and total status of each group, and on the pulses
+    remaining. These make up the key of a cache entry, with the statuses rounded to
+    'digits' significant digits, so battles reaching the same intermediate state share
+    its outcome.
+    
+    Attributes:
+        * capacity (int): the largest number of entries kept.
+        * policy (str): the entry evicted when the cache is full, the least recently used
+        ("lru") or the least frequently used ("lfu").
+        * digits (int): the significant digits the statuses are rounded to.
+        * hits (int): the number of lookups that found an entry.
+        * misses (int): the number of lookups that did not.
+        * evictions (int): the number of entries evicted.
+    '''
+    def __init__(self, capacity = 100000, policy = "lru", digits = 12):
+        if policy not in ("lru", "lfu"):
+            raise ValueError("Cache policy must be 'lru' or 'lfu'")
+        self.capacity = capacity
+        self.policy = policy
+        self.digits = digits
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Entries in order of last use (LRU), or by number of uses then last use (LFU)
+        self.entries = OrderedDict()
+        self.uses = {}
+        self.buckets = {}
+        self.leastUses = 0
+        
+    def key(self, battle):
+        ''' Returns the canonical key of the state of a battle, or None if one of its groups
+        is not made of identical ships.'''
+        groups = []
+        for group in (battle.blu, battle.red):
+            ship = group.template()
+            if ship is None:
+                return None
+            missiles = group.missiles
+            groups.append((group.side, group.rule.name, ship.op, ship.dp, ship.sp, group.scouting, group.readiness,
+                           missiles.launch_reliability, missiles.ascm_to_hit, missiles.sam_to_hit,
+                           float("{:.{}g}".format(group.total_status(), self.digits))))
+        remaining = battle.duration - battle.pulse if battle.duration != 0 else 0
+        return (groups[0], groups[1], remaining)
+        
+    def get(self, key):
+        ''' Returns the outcome stored under (key), or None.'''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._use(key)
+        return self.entries[key]
+        
+    def put(self, key, outcome):
+        ''' Stores an outcome under (key), evicting an entry if the cache is full.'''
+        if self.capacity <= 0:
+            return
+        if key in self.entries:
+            self.entries[key] = outcome
+            self._use(key)
+            return
+        if len(self.entries) >= self.capacity:
+            self._evict()
+        self.entries[key] = outcome
+        if self.policy == "lfu":
+            self.uses[key] = 1
+            self.buckets.setdefault(1, OrderedDict())[key] = None
+            self.leastUses = 1
+            
+    def _use(self, key):
+        ''' Records a use of the entry under (key).'''
+        if self.policy == "lru":
+            self.entries.move_to_end(key)
+            return
+        uses = self.uses[key]
+        bucket = self.buckets[uses]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[uses]
+            if self.leastUses == uses:
+                self.leastUses = uses + 1
+        self.uses[key] = uses + 1
+        self.buckets.setdefault(uses + 1, OrderedDict())[key] = None
+        
+    def _evict(self):
+        ''' Removes the entry chosen by the policy.'''
+        if self.policy == "lru":
+            self.entries.popitem(last=False)
+        else:
+            bucket = self.buckets[self.leastUses]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.leastUses]
+            del self.uses[key]
+            del self.entries[key]
+        self.evictions += 1
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def __str__(self):
+        ''' String override. Returns the size of the cache and its counters.'''
+        return "{} entries, {} hits, {} misses, {} evictions".format(len(self), self.hits, self.misses, self.evictions)
+        
+class Battle:
+    ''' A battle between two groups.
+    
+    Attributes:
+        * blu (Group): the BLUFOR group.
+        * red (Group): the REDFOR group.
+        * duration (int): the duration of the battle in pulses. If zero (default) the
+        battle goes on until one side is wiped out.
+        * verbose (bool): whether to print the state of the battle after every pulse.
+        * outcome (str): the winner of a battle resolved in lean mode ("BLUFOR", "REDFOR",
+        "Draw", "Stalemate" or "Undecided").
+        * reason (str): why a battle resolved in lean mode was stopped.
+        * time, bluPlot, redPlot (list): the pulses and the total status of both groups
+        after each of them, for plotting.
+    '''
+    def __init__(self, blu, red, duration = 0, verbose = True):
+        self.blu = blu
+        self.red = red
+        self.duration = duration
+        self.verbose = verbose
+        self.pulse = 0
+        self.outcome = None
+        self.reason = None
+        # Lists for plotting
+        self.bluPlot = [self.blu.total_status()]
+        self.redPlot = [self.red.total_status()]
+        self.time = [0]
+        
+    def add_to_plot(self):
+        ''' Records the pulse and the total status of both groups, for plotting.'''
+        self.bluPlot.append(self.blu.total_status())
+        self.redPlot.append(self.red.total_status())
+        self.time.append(self.pulse)
+        
+    def report(self):
+        ''' Prints the state of the battle, and the opening line before the first pulse.'''
+        if not self.verbose:
+            return
+        if self.pulse == 0:
+            print("\nBattle starts between {} and {}\n".format(self.blu.side, self.red.side))
+        print(self)
+        
+    def stalemate(self):
+        ''' Checks whether the battle has reached a stalemate. Only possible if SAM fire
+        is 100% effective for both sides (missile sam_to_hit = 1)'''
+        stalemate = self.blu.combat_power(self.red) == 0 and self.red.combat_power(self.blu) == 0
+        return stalemate
+        
+    def blu_surprise(self):
+        ''' Fires one BLUFOR salvo at REDFOR, without retaliation.'''
+        if self.pulse == 0:
+            self.report()
+        self.pulse += 1
+        self.red.damage(self.blu.combat_power(self.red))
+        self.report()
+        self.add_to_plot()
+        
+    def red_surprise(self):
+        ''' Fires one REDFOR salvo at BLUFOR, without retaliation.'''
+        if self.pulse == 0:
+            self.report()
+        self.pulse += 1
+        self.blu.damage(self.red.combat_power(self.blu))
+        self.report()
+        self.add_to_plot()
+        
+    def salvo(self):
+        ''' Both sides fire at each other simultaneously.'''
+        if self.pulse == 0:
+            self.report()
+        bluDamageSustained = self.red.combat_power(self.blu)
+        redDamageSustained = self.blu.combat_power(self.red)
+        self.blu.damage(bluDamageSustained)
+        self.red.damage(redDamageSustained)
+        self.pulse += 1
+        self.report()
+        self.add_to_plot()
+        
+    def lean_salvo(self):
+        ''' Both sides fire at each other simultaneously, with no output or plotting data.'''
+        bluDamageSustained = self.red.combat_power(self.blu)
+        redDamageSustained = self.blu.combat_power(self.red)
+        self.blu.damage(bluDamageSustained)
+        self.red.damage(redDamageSustained)
+        self.pulse += 1
+        
+    def decided(self):
+        ''' Returns the outcome of the battle and the reason, if the outcome can no longer
+        change, or None otherwise.
+        
+        Striking power never grows and defensive power only falls when a group is damaged,
+        so once a group cannot penetrate the enemy's defences it never will again. If its
+        enemy can still penetrate them, the enemy will destroy it without taking any more
+        damage. This shortcut only applies to battles fought until one side is wiped out.
+        '''
+        bluAfloat = self.blu.total_status() != 0
+        redAfloat = self.red.total_status() != 0
+        if not bluAfloat and not redAfloat:
+            return "Draw", "Both sides wiped out"
+        elif not redAfloat:
+            return "BLUFOR", "{} wiped out".format(self.red.side)
+        elif not bluAfloat:
+            return "REDFOR", "{} wiped out".format(self.blu.side)
+        bluPenetrates = self.blu.combat_power(self.red) > 0
+        redPenetrates = self.red.combat_power(self.blu) > 0
+        if not bluPenetrates and not redPenetrates:
+            return "Stalemate", "Neither fleet can penetrate enemy missile defence"
+        if self.duration == 0:
+            if not redPenetrates:
+                return "BLUFOR", "{} can no longer penetrate {} missile defence".format(self.red.side, self.blu.side)
+            elif not bluPenetrates:
+                return "REDFOR", "{} can no longer penetrate {} missile defence".format(self.blu.side, self.red.side)
+        return None
+        
+    def solve(self, max_pulses = None):
+        ''' Returns what resolve() would lead to, as (pulses, bluStatus, redStatus), without
+        damaging the groups or printing anything.
+        
+        For groups of identical ships the pulses follow a piecewise-linear map: as long as
+        each side keeps overwhelming the enemy's defences (or not), one pulse multiplies
+        (bluStatus, redStatus) by a fixed 2x2 matrix. When its eigenvalues are real and
+        positive, every breakpoint (a change of piece, or the destruction of a group) is
+        crossed at most once, so the pulses up to the next breakpoint are jumped over with
+        powers of the matrix, and only the pulse crossing it is stepped. Other groups are
+        resolved by stepping a copy of the battle.
+        
+        Arguments:
+            * max_pulses (int): safety limit for battles with no duration. None (default)
+            has no limit, like resolve().
+        '''
+        limit = self.duration if self.duration != 0 else (max_pulses or math.inf)
+        bluShip, redShip = self.blu.template(), self.red.template()
+        if bluShip is None or redShip is None:
+            battle = Battle(copy.deepcopy(self.blu), copy.deepcopy(self.red), self.duration)
+            while battle.pulse < limit:
+                battle.lean_salvo()
+                if self.duration == 0 and (battle.blu.total_status() == 0 or
+                                           battle.red.total_status() == 0 or battle.stalemate()):
+                    break
+            return battle.pulse, battle.blu.total_status(), battle.red.total_status()
+            
+        x, y = self.blu.total_status(), self.red.total_status()
+        if x == 0 or y == 0:
+            return self.duration, x, y
+        # Stand-in groups, set to any total status to evaluate the model's own formulas
+        blu = HomogeneousGroup(self.blu.side, bluShip, math.ceil(x), self.blu.scouting,
+                               self.blu.readiness, self.blu.missiles, self.blu.rule)
+        red = HomogeneousGroup(self.red.side, redShip, math.ceil(y), self.red.scouting,
+                               self.red.readiness, self.red.missiles, self.red.rule)
+        probe = Battle(blu, red)
+        
+        def piece(status):
+            blu.set_status(status[0])
+            red.set_status(status[1])
+            return (blu.striking_power() - red.defensive_power() > 0,
+                    red.striking_power() - blu.defensive_power() > 0)
+        
+        def advance(matrix, status):
+            return (matrix[0][0] * status[0] + matrix[0][1] * status[1],
+                    matrix[1][0] * status[0] + matrix[1][1] * status[1])
+        
+        def square(matrix):
+            return [[sum(matrix[i][k] * matrix[k][j] for k in range(2)) for j in range(2)]
+                    for i in range(2)]
+        
+        pulses = 0
+        while pulses < limit:
+            current = piece((x, y))
+            bluAlpha, bluBeta = blu.combat_coefficients(red, current[0])
+            redAlpha, redBeta = red.combat_coefficients(blu, current[1])
+            matrix = [[1 + redBeta / bluShip.sp, -redAlpha / bluShip.sp],
+                      [-bluAlpha / redShip.sp, 1 + bluBeta / redShip.sp]]
+            trace = matrix[0][0] + matrix[1][1]
+            determinant = matrix[0][0] * matrix[1][1] - matrix[0][1] * matrix[1][0]
+            room = limit - pulses - 1
+            if room > 0 and not probe.stalemate() and determinant > 0 and trace > 0 and trace ** 2 >= 4 * determinant:
+                # Jump to the last state before the next breakpoint
+                within = lambda status: status[0] > 0 and status[1] > 0 and piece(status) == current
+                powers = [matrix]
+                while len(powers) < 64 and 2 ** len(powers) <= room and within(advance(powers[-1], (x, y))):
+                    powers.append(square(powers[-1]))
+                jumped = 0
+                for k in reversed(range(len(powers))):
+                    if jumped + 2 ** k <= room:
+                        candidate = advance(powers[k], (x, y))
+                        if within(candidate):
+                            x, y = candidate
+                            jumped += 2 ** k
+                pulses += jumped
+            # Step across the breakpoint with the model's own formulas
+            piece((x, y))
+            probe.lean_salvo()
+            x, y = blu.total_status(), red.total_status()
+            pulses += 1
+            if x == 0 or y == 0 or probe.stalemate():
+                # Nothing changes after this, even if the battle has a set duration
+                break
+        if self.duration != 0:
+            pulses = self.duration
+        return pulses, x, y
+        
+    def resolve(self, lean = False, cache = None):
+        ''' The battle is resolved for the specified duration, or until one side is wiped out.
+        
+        Arguments:
+            * lean (bool): if True, nothing is printed or recorded for plotting, and the
+            battle stops as soon as its outcome is decided (see decided()). The outcome and
+            the reason for stopping are stored in 'outcome' and 'reason', and returned.
+            * cache (OutcomeCache): in lean mode, a cache of outcomes. A battle reaching a
+            state found in the cache jumps to its outcome, and every state the battle goes
+            through is stored with the outcome it leads to.
+        '''
+        if lean:
+            visited = []
+            decision = self.decided()
+            while decision is None:
+                if self.duration != 0 and self.pulse >= self.duration:
+                    decision = ("Undecided", "Duration of {} pulses reached".format(self.duration))
+                    break
+                key = cache.key(self) if cache is not None else None
+                if key is not None:
+                    cached = cache.get(key)
+                    if cached is not None:
+                        pulses, bluStatus, redStatus, decision = cached
+                        self.pulse += pulses
+                        self.blu.set_status(bluStatus)
+                        self.red.set_status(redStatus)
+                        break
+                    visited.append((key, self.pulse))
+                self.lean_salvo()
+                decision = self.decided()
+            for key, pulse in visited:
+                cache.put(key, (self.pulse - pulse, self.blu.total_status(), self.red.total_status(), decision))
+            self.outcome, self.reason = decision
+            return decision
+        if self.duration == 0:
+            while self.blu.total_status() != 0 and self.red.total_status() != 0:
+                self.salvo()
+                if self.stalemate():
+                    if self.verbose:
+                        print("\nStalemate! Neither fleet can penetrate enemy missile defence.")
+                    break
+        else:
+            for _ in range(self.duration):
+                self.salvo()
+                
+    def plot(self):
+        ''' Plots the total status of both groups after every pulse, as a bar chart.
+        matplotlib is only imported here.'''
+        import matplotlib.pyplot as plt
+        
+        x = np.array(self.time)
+        y = np.array(self.bluPlot)
+        z = np.array(self.redPlot)
+        
+        width = 0.2
+        
+        fig, ax = plt.subplots()
+        rects1 = ax.bar(x-0.1, y, width, color='tab:blue', zorder=3)
+        rects2 = ax.bar(x+0.1, z, width, color='tab:red', zorder=3)
+        
+        ax.set_ylabel('Aggregated status')
+        ax.set_xlabel('Pulse')
+        
+        ax.set_xticks(x)
+        
+        ax.legend((rects1[0],rects2[0]),(self.blu.side,self.red.side), loc=9)
+        
+        ax.grid(which='major', axis='y', linestyle=':', alpha=0.5, zorder=0)
+        ax.grid(which='minor', axis='y', linestyle=':', alpha=0.25, zorder=0)
+        
+        def autolabel(rects):
+            for rect in rects:
+                height = rect.get_height()
+                ax.text(rect.get_x() + rect.get_width()/2., height,
+                '{}'.format(round(height,2)),
+                ha='center', va='bottom')
+        
+        autolabel(rects1)
+        autolabel(rects2)
+        plt.show()
+        
+    def __str__(self):
+        ''' String override. Returns the pulse number, and the status of the opposing groups.'''
+        battleString = "\nPulse {}:\n{} | {}".format(self.pulse, str(self.blu), str(self.red))
+        return(battleString)
+    
+class TaskForce:
+    ''' A task force: several groups of ships fighting on the same side. Each group is made
+    of identical ships, but the groups may have different ship types, settings and missiles.
+    
+    The groups are held as arrays with one entry per group, so a pulse of a battle between
+    task forces is a few matrix operations, whatever the number of groups and ships.
+    
+    Attributes:
+        * side (str): the task force's side identifier, for labelling purposes.
+        * groups (list): the Group objects the task force is made of.
+        * op, dp, sp (array): the Ship values of each group.
+        * units (array): the number of ships of each group.
+        * scouting, readiness (array): the Group values of each group.
+        * launch_reliability, ascm_to_hit, sam_to_hit (array): the Missiles values of each group.
+        * defenceFactor (array): the factor of the SAM salvo of each group in its defensive
+        power, set by its defence rule.
+        * status (array): the total status of each group.
+        * rules (list): the distinct defence rules of the groups, as (rule, indices of the
+        groups defending with it).
+    '''
+    def __init__(self, side, groups):
+        self.side = side
+        self.groups = list(groups)
+        ships = [group.template() for group in self.groups]
+        if any(ship is None for ship in ships):
+            raise ValueError("Every group of a task force must be made of identical ships")
+        self.op = np.array([ship.op for ship in ships], dtype=float)
+        self.dp = np.array([ship.dp for ship in ships], dtype=float)
+        self.sp = np.array([ship.sp for ship in ships], dtype=float)
+        # A Group holds one Ship per unit, a HomogeneousGroup only their number
+        self.units = np.array([len(group.oob) if hasattr(group, "oob") else group.units for group in self.groups])
+        self.scouting = np.array([group.scouting for group in self.groups], dtype=float)
+        self.readiness = np.array([group.readiness for group in self.groups], dtype=float)
+        self.launch_reliability = np.array([group.missiles.launch_reliability for group in self.groups], dtype=float)
+        self.ascm_to_hit = np.array([group.missiles.ascm_to_hit for group in self.groups], dtype=float)
+        self.sam_to_hit = np.array([group.missiles.sam_to_hit for group in self.groups], dtype=float)
+        self.status = np.array([group.total_status() for group in self.groups], dtype=float)
+        self.defenceFactor = np.array([group.rule.defence_factor(group.missiles.sam_to_hit) for group in self.groups], dtype=float)
+        self.rules = []
+        for rule in dict.fromkeys(group.rule for group in self.groups):
+            self.rules.append((rule, np.array([i for i, group in enumerate(self.groups) if group.rule is rule])))
+        
+    def total_status(self):
+        ''' Returns the sum of the total status of all groups in the task force.'''
+        return self.status.sum()
+        
+    def striking_power(self):
+        ''' Returns the raw striking power of each group.'''
+        return self.op * self.status * self.scouting * self.launch_reliability * self.ascm_to_hit
+        
+    def defensive_power(self):
+        ''' Returns the raw defensive power of each group.'''
+        return self.dp * self.status * self.readiness * self.defenceFactor
+        
+    def damage(self, damage):
+        ''' Damages each group by the given amount. As damage is applied to the ships of a
+        group in order, each point of damage takes 1 / sp off its total status.
+        
+        Arguments:
+            * damage (array): the damage to inflict upon each group.
+        '''
+        self.status = np.maximum(self.status - damage / self.sp, 0)
+        
+    def update_groups(self):
+        ''' Sets the status of the Group objects to that of the task force.'''
+        for group, status in zip(self.groups, self.status):
+            group.set_status(status)
+            
+    def __str__(self):
+        ''' String override. Returns the status of every group.'''
+        groupStrings = ["{} {}: {} active ships".format(self.side, group.side, round(status, 2))
+                        for group, status in zip(self.groups, self.status)]
+        return ", ".join(groupStrings)
+        
+class TaskForceBattle:
+    ''' A battle between two task forces, in which every group fires at the enemy groups
+    according to a targeting matrix, and defends itself.
+    
+    Attributes:
+        * blu (TaskForce): the BLUFOR task force.
+        * red (TaskForce): the REDFOR task force.
+        * bluTargeting (array): fraction of the missiles of each BLUFOR group (row) fired at
+        each REDFOR group (column). Defaults to an even spread.
+        * redTargeting (array): the same, for REDFOR.
+        * duration (int): the duration of the battle in pulses. If zero (default) the
+        battle goes on until one side is wiped out.
+        * retarget (bool): if True (default), the missiles aimed at enemy groups wiped out
+        are spread over the other targets of each group, in the same proportions.
+        * verbose (bool): whether to print the state of the battle after every pulse.
+    '''
+    def __init__(self, blu, red, bluTargeting = None, redTargeting = None, duration = 0, retarget = True,
+                 verbose = True):
+        self.blu = blu
+        self.red = red
+        self.bluTargeting = self._targeting(bluTargeting, blu, red)
+        self.redTargeting = self._targeting(redTargeting, red, blu)
+        self.duration = duration
+        self.retarget = retarget
+        self.verbose = verbose
+        self.pulse = 0
+        
+    def _targeting(self, targeting, side, enemy):
+        ''' Returns a targeting matrix with rows summing to 1.'''
+        if targeting is None:
+            targeting = np.ones((len(side.groups), len(enemy.groups)))
+        targeting = np.asarray(targeting, dtype=float)
+        if targeting.shape != (len(side.groups), len(enemy.groups)):
+            raise ValueError("Targeting matrix must have one row per group and one column per enemy group")
+        return targeting / targeting.sum(axis=1, keepdims=True)
+        
+    def _fire(self, side, enemy, targeting):
+        ''' Returns the damage inflicted by one side on each enemy group.'''
+        if self.retarget:
+            targeting = targeting * (enemy.status > 0)
+            total = targeting.sum(axis=1, keepdims=True)
+            targeting = np.divide(targeting, total, out=np.zeros_like(targeting), where=total > 0)
+        incoming = side.striking_power() @ targeting
+        defence = enemy.defensive_power()
+        # Each enemy group defends itself with its own rule
+        damage = np.zeros(len(enemy.groups))
+        for rule, indices in enemy.rules:
+            damage[indices] = rule.combat_powers(incoming[indices], defence[indices], enemy.sam_to_hit[indices])
+        return damage
+        
+    def report(self):
+        ''' Prints the state of the battle, and the opening line before the first pulse.'''
+        if not self.verbose:
+            return
+        if self.pulse == 0:
+            print("\nBattle starts between {} and {}\n".format(self.blu.side, self.red.side))
+        print(self)
+        
+    def salvo(self):
+        ''' Both sides fire at each other simultaneously.'''
+        if self.pulse == 0:
+            self.report()
+        bluDamageSustained = self._fire(self.red, self.blu, self.redTargeting)
+        redDamageSustained = self._fire(self.blu, self.red, self.bluTargeting)
+        self.blu.damage(bluDamageSustained)
+        self.red.damage(redDamageSustained)
+        self.pulse += 1
+        self.report()
+            
+    def stalemate(self):
+        ''' Checks whether neither side can damage the other any more, with both still afloat.'''
+        if self.blu.total_status() == 0 or self.red.total_status() == 0:
+            return False
+        return (not self._fire(self.blu, self.red, self.bluTargeting).any() and
+                not self._fire(self.red, self.blu, self.redTargeting).any())
+        
+    def resolve(self):
+        ''' The battle is resolved for the specified duration, or until one side is wiped out,
+        and the status of the groups of both task forces is updated.'''
+        if self.duration == 0:
+            while self.blu.total_status() != 0 and self.red.total_status() != 0:
+                self.salvo()
+                if self.stalemate():
+                    if self.verbose:
+                        print("\nStalemate! Neither fleet can penetrate enemy missile defence.")
+                    break
+        else:
+            for _ in range(self.duration):
+                self.salvo()
+        self.blu.update_groups()
+        self.red.update_groups()
+        
+    def __str__(self):
+        ''' String override. Returns the pulse number, and the status of the opposing task forces.'''
+        battleString = "\nPulse {}:\n{} | {}".format(self.pulse, str(self.blu), str(self.red))
+        return(battleString)
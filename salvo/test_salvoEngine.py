@@ -0,0 +1,251 @@
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from salvoEngine import (Ship, Missiles, Group, HomogeneousGroup, Battle, OutcomeCache, TaskForce,
+                         TaskForceBattle, NO_LEAKERS, LEAKERS)
+
+
+def test_direct_ship_damage_keeps_group_in_sync():
+    # Ships damaged directly, in any order, between salvos of Group.damage: the group must
+    # match a ship-by-ship reference
+    rng = random.Random(1)
+    for trial in range(500):
+        units = rng.randint(1, 8)
+        sp = rng.choice([1, 1.5, 2, 3])
+        group = Group("BLUFOR", Ship("Frigate", 4, 3, sp), units)
+        hp = [sp] * units
+        for step in range(rng.randint(1, 12)):
+            if rng.random() < 0.4:
+                index = rng.randrange(units)
+                damage = rng.uniform(0, 2 * sp)
+                group.oob[index].damage(damage)
+                hp[index] -= min(damage, hp[index])
+            else:
+                damage = rng.uniform(0, 3 * sp)
+                group.damage(damage)
+                for index in range(units):
+                    applied = min(damage, hp[index])
+                    hp[index] -= applied
+                    damage -= applied
+            total = sum(value / sp for value in hp)
+            assert group.afloat == sum(value > 0 for value in hp)
+            assert math.isclose(group.total_status(), total, abs_tol=1e-9)
+            assert math.isclose(group.salvoSize, 4 * total, abs_tol=1e-9)
+            assert all(math.isclose(ship.hp, value, abs_tol=1e-9) for ship, value in zip(group.oob, hp))
+
+
+def test_group_damage_matches_ship_by_ship_allocation():
+    # Large groups and staying powers that are not whole: the prefix search must damage
+    # the same ships as applying the damage to one ship after the other
+    rng = random.Random(8)
+    for trial in range(200):
+        units = rng.randint(1, 300)
+        sp = rng.choice([0.1, 0.3, 1 / 3, 1.7, 2])
+        group = Group("BLUFOR", Ship("Frigate", 4, 3, sp), units)
+        hp = [sp] * units
+        for step in range(rng.randint(1, 6)):
+            damage = rng.uniform(0, units * sp / 3)
+            group.damage(damage)
+            for index in range(units):
+                applied = min(damage, hp[index])
+                hp[index] -= applied
+                damage -= applied
+            assert group.afloat == sum(value > 1e-9 for value in hp)
+            assert all(math.isclose(ship.hp, value, abs_tol=1e-9) for ship, value in zip(group.oob, hp))
+            assert math.isclose(group.total_status(), sum(value / sp for value in hp), abs_tol=1e-6)
+
+def test_homogeneous_group_matches_group():
+    # The same salvos leave both kinds of group with exactly the same aggregates
+    rng = random.Random(2)
+    for trial in range(500):
+        ship, units = Ship("Frigate", 4, 3, rng.choice([1, 1.5, 2, 3])), rng.randint(1, 10)
+        group = Group("BLUFOR", ship, units)
+        homogeneous = HomogeneousGroup("BLUFOR", ship, units)
+        for step in range(rng.randint(1, 8)):
+            damage = rng.uniform(0, 2.5 * ship.sp)
+            group.damage(damage)
+            homogeneous.damage(damage)
+            assert homogeneous.afloat == group.afloat
+            assert homogeneous.total_status() == group.total_status()
+            assert homogeneous.salvoSize == group.salvoSize
+            assert homogeneous.defensiveSalvoSize == group.defensiveSalvoSize
+            assert all(homogeneous.ship_status(i) == unit.status for i, unit in enumerate(group.oob))
+
+
+def random_scenario(rng, rule):
+    ''' Returns the arguments of two groups of a random battle, as (ship, units, scouting,
+    readiness, missiles, rule) for each side.'''
+    sides = []
+    for side in range(2):
+        ship = Ship("Frigate", rng.randint(1, 6), rng.randint(0, 6), rng.choice([1, 1.5, 2, 3]))
+        samToHit = 1 if rng.random() < 0.2 else rng.uniform(0.3, 1)
+        missiles = Missiles(rng.uniform(0.5, 1), rng.uniform(0.3, 1), samToHit)
+        sides.append((ship, rng.randint(1, 8), rng.uniform(0.2, 1), rng.uniform(0.2, 1), missiles, rule))
+    return sides
+
+
+def outcome(battle):
+    ''' Returns the outcome of a battle resolved in full, as Battle.decided() names it.'''
+    bluAfloat, redAfloat = battle.blu.total_status() != 0, battle.red.total_status() != 0
+    if not bluAfloat and not redAfloat:
+        return "Draw"
+    elif not redAfloat:
+        return "BLUFOR"
+    elif not bluAfloat:
+        return "REDFOR"
+    elif battle.stalemate():
+        return "Stalemate"
+    return "Undecided"
+
+
+def test_lean_resolve_reaches_the_same_outcome():
+    # Lean mode stops as soon as the outcome is decided, never later than the full battle,
+    # and with the same groups when it stops at the same pulse
+    rng = random.Random(3)
+    for trial in range(1000):
+        rule = rng.choice([NO_LEAKERS, LEAKERS])
+        duration = rng.choice([0, 0, 1, 3])
+        sides = random_scenario(rng, rule)
+        full = Battle(Group("BLUFOR", *sides[0]), Group("REDFOR", *sides[1]), duration, verbose=False)
+        full.resolve()
+        lean = Battle(Group("BLUFOR", *sides[0]), Group("REDFOR", *sides[1]), duration, verbose=False)
+        assert lean.resolve(lean=True)[0] == outcome(full)
+        assert lean.pulse <= full.pulse
+        if lean.pulse == full.pulse:
+            assert lean.blu.total_status() == full.blu.total_status()
+            assert lean.red.total_status() == full.red.total_status()
+
+
+def test_solve_matches_resolve():
+    # solve() jumps over the pulses between breakpoints, without touching the groups: it
+    # must end where stepping every pulse ends, up to rounding
+    rng = random.Random(4)
+    for trial in range(500):
+        rule = rng.choice([NO_LEAKERS, LEAKERS])
+        duration = rng.choice([0, 0, 2, 20])
+        sides = random_scenario(rng, rule)
+        scale = rng.choice([1, 10, 100])
+        sides = [(side[0], side[1] * scale) + side[2:] for side in sides]
+        battle = Battle(HomogeneousGroup("BLUFOR", *sides[0]), HomogeneousGroup("REDFOR", *sides[1]),
+                        duration, verbose=False)
+        pulses, bluStatus, redStatus = battle.solve()
+        assert battle.pulse == 0
+        assert battle.blu.total_status() == sides[0][1] and battle.red.total_status() == sides[1][1]
+        battle.resolve()
+        assert pulses == battle.pulse
+        assert math.isclose(bluStatus, battle.blu.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+        assert math.isclose(redStatus, battle.red.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+@pytest.mark.parametrize("capacity", [10, 100000])
+def test_cached_outcomes_match_uncached(policy, capacity):
+    # Battles drawn from a few scenarios reuse the cached outcomes, whatever is evicted
+    rng = random.Random(5)
+    scenarios = []
+    for i in range(20):
+        rule = rng.choice([NO_LEAKERS, LEAKERS])
+        scenarios.append((random_scenario(rng, rule), rng.choice([0, 0, 3])))
+    cache = OutcomeCache(capacity, policy)
+    for trial in range(300):
+        sides, duration = rng.choice(scenarios)
+        battles = [Battle(HomogeneousGroup("BLUFOR", *sides[0]), HomogeneousGroup("REDFOR", *sides[1]),
+                          duration, verbose=False) for i in range(2)]
+        assert battles[0].resolve(lean=True, cache=cache) == battles[1].resolve(lean=True)
+        assert battles[0].pulse == battles[1].pulse
+        assert math.isclose(battles[0].blu.total_status(), battles[1].blu.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+        assert math.isclose(battles[0].red.total_status(), battles[1].red.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+        assert len(cache) <= capacity
+    assert cache.hits > 0
+    assert (cache.evictions > 0) == (capacity == 10)
+
+
+def test_task_force_battles_match_battles():
+    # Groups firing only at their own opponent fight the same battles as Battle does
+    rng = random.Random(6)
+    for trial in range(200):
+        rule = rng.choice([NO_LEAKERS, LEAKERS])
+        duration = rng.choice([1, 2, 5])
+        pairs = [random_scenario(rng, rule) for i in range(3)]
+        blu = TaskForce("BLUFOR", [HomogeneousGroup("BLUFOR", *sides[0]) for sides in pairs])
+        red = TaskForce("REDFOR", [Group("REDFOR", *sides[1]) for sides in pairs])
+        taskForceBattle = TaskForceBattle(blu, red, np.eye(3), np.eye(3), duration, retarget=False, verbose=False)
+        taskForceBattle.resolve()
+        for i, sides in enumerate(pairs):
+            battle = Battle(Group("BLUFOR", *sides[0]), Group("REDFOR", *sides[1]), duration, verbose=False)
+            battle.resolve()
+            assert math.isclose(blu.status[i], battle.blu.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+            assert math.isclose(red.status[i], battle.red.total_status(), rel_tol=1e-9, abs_tol=1e-9)
+            assert math.isclose(blu.groups[i].total_status(), blu.status[i], rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_task_force_counts_units_by_group_type():
+    frigate = Ship("Frigate", 4, 3, 2)
+    groups = [Group("A", frigate, 3), HomogeneousGroup("B", frigate, 5), HomogeneousGroup("C", frigate, 0)]
+    assert TaskForce("BLUFOR", groups).units.tolist() == [3, 5, 0]
+
+
+def original_battle(sides, rule, duration):
+    ''' Resolves a battle as the scripts did before the engine, summing the ships of each
+    group on every pulse. Returns (pulses, bluStatus, redStatus).'''
+    hp = [[ship.sp] * units for ship, units, *rest in sides]
+
+    def powers(i):
+        ship, units, scouting, readiness, missiles = sides[i][:5]
+        status = sum(value / ship.sp for value in hp[i])
+        striking = ship.op * status * scouting * missiles.launch_reliability * missiles.ascm_to_hit
+        defensive = ship.dp * status * readiness
+        if rule == NO_LEAKERS:
+            defensive *= missiles.sam_to_hit
+        return striking, defensive, missiles.sam_to_hit
+
+    def combat_power(attacker, target):
+        striking, defensive, samToHit = powers(attacker)[0], powers(target)[1], powers(target)[2]
+        if rule == NO_LEAKERS:
+            return max(0, striking - defensive)
+        overwhelm = max(striking - defensive, 0)
+        if overwhelm > 0:
+            return overwhelm + (1 - samToHit) * defensive
+        return (1 - samToHit) * striking
+
+    def damage(i, damage):
+        for j, value in enumerate(hp[i]):
+            applied = min(damage, value)
+            hp[i][j] -= applied
+            damage -= applied
+
+    def status(i):
+        return sum(value / sides[i][0].sp for value in hp[i])
+
+    pulses = 0
+    while (duration == 0 and status(0) != 0 and status(1) != 0) or pulses < duration:
+        bluDamage, redDamage = combat_power(1, 0), combat_power(0, 1)
+        damage(0, bluDamage)
+        damage(1, redDamage)
+        pulses += 1
+        if duration == 0 and combat_power(0, 1) == 0 and combat_power(1, 0) == 0:
+            break
+    return pulses, status(0), status(1)
+
+
+def test_engine_matches_the_original_model():
+    # The engine keeps running aggregates instead of summing the ships, and shares the
+    # defence rules between the two versions of the model: the battles must not change
+    rng = random.Random(7)
+    for trial in range(500):
+        rule = rng.choice([NO_LEAKERS, LEAKERS])
+        duration = rng.choice([0, 0, 1, 3])
+        sides = random_scenario(rng, rule)
+        battle = Battle(Group("BLUFOR", *sides[0]), Group("REDFOR", *sides[1]), duration, verbose=False)
+        battle.resolve()
+        pulses, bluStatus, redStatus = original_battle(sides, rule, duration)
+        assert battle.pulse == pulses
+        assert math.isclose(battle.blu.total_status(), bluStatus, rel_tol=1e-9, abs_tol=1e-9)
+        assert math.isclose(battle.red.total_status(), redStatus, rel_tol=1e-9, abs_tol=1e-9)
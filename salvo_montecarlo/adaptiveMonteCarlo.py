@@ -0,0 +1,150 @@
+"""
+An adaptive-precision Monte Carlo runner for salvo studies.
+
+Instead of a fixed number of iterations, replicates are resolved in batches and running
+estimates of the outcome probabilities and of the mean number of pulses are kept, with
+their confidence intervals. The study stops as soon as every interval is narrower than
+the target half-width, so easy scenarios need few replicates and hard ones get as many
+as they need (up to a limit).
+
+A study is given as a batch function, batch(rng, size), which resolves 'size' replicates
+drawing its random values from the numpy.random.Generator 'rng', and returns a structured
+array with at least the "winner" and "pulses" fields of batchSalvo.RESULT_DTYPE. Any other
+fields (such as the random inputs) are kept or streamed along with them.
+
+"""
+
+import math
+
+import numpy as np
+
+from batchSalvo import WINNER_LABELS
+
+
+def normal_quantile(confidence):
+    ''' Returns the standard normal quantile of a two-sided interval at the given
+    confidence level. The statistics module is only imported here, as it is slow to import.'''
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+class RunningEstimate:
+    ''' Running estimates of the outcome probabilities and mean pulses of a Monte Carlo study.
+
+    Probability intervals are Wilson score intervals, which stay sensible for probabilities
+    near 0 or 1. The mean pulses interval is the normal interval of the sample mean.
+
+    Attributes:
+        * confidence (fraction): the confidence level of the intervals.
+        * z (float): the matching standard normal quantile.
+        * count (int): the number of replicates seen so far.
+        * counts (array): the number of replicates of every outcome, by winner code.
+        * pulsesMean (float): the running mean of the pulses.
+        * pulsesM2 (float): the running sum of squared deviations of the pulses.
+    '''
+    def __init__(self, confidence = 0.95):
+        self.confidence = confidence
+        self.z = normal_quantile(confidence)
+        self.count = 0
+        self.counts = np.zeros(len(WINNER_LABELS), dtype=np.int64)
+        self.pulsesMean = 0.0
+        self.pulsesM2 = 0.0
+
+    def update(self, results):
+        ''' Adds a batch of results to the estimates.'''
+        size = len(results)
+        if size == 0:
+            return
+        self.counts += np.bincount(results["winner"], minlength=len(WINNER_LABELS))
+        # Chan et al. pairwise update of the mean and sum of squared deviations
+        pulses = results["pulses"].astype(np.float64)
+        batchMean = pulses.mean()
+        batchM2 = ((pulses - batchMean) ** 2).sum()
+        total = self.count + size
+        delta = batchMean - self.pulsesMean
+        self.pulsesMean += delta * size / total
+        self.pulsesM2 += batchM2 + delta ** 2 * self.count * size / total
+        self.count = total
+
+    def probability(self, code):
+        ''' Returns the estimated probability of an outcome, by winner code.'''
+        return self.counts[code] / self.count if self.count else math.nan
+
+    def probability_interval(self, code):
+        ''' Returns the (low, high) Wilson interval of the probability of an outcome.'''
+        if self.count == 0:
+            return (0.0, 1.0)
+        n, z = self.count, self.z
+        p = self.counts[code] / n
+        centre = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        halfWidth = z / (1 + z ** 2 / n) * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+        return (max(centre - halfWidth, 0.0), min(centre + halfWidth, 1.0))
+
+    def probability_half_width(self):
+        ''' Returns the largest half-width of the outcome probability intervals.'''
+        return max((high - low) / 2 for low, high in map(self.probability_interval, WINNER_LABELS))
+
+    def mean_pulses(self):
+        ''' Returns the estimated mean number of pulses.'''
+        return self.pulsesMean if self.count else math.nan
+
+    def pulses_half_width(self):
+        ''' Returns the half-width of the mean pulses interval.'''
+        if self.count < 2:
+            return math.inf
+        return self.z * math.sqrt(self.pulsesM2 / (self.count - 1) / self.count)
+
+    def __str__(self):
+        lines = ["{} replicates, {:.0%} confidence".format(self.count, self.confidence)]
+        for code, label in WINNER_LABELS.items():
+            low, high = self.probability_interval(code)
+            lines.append("{:<10} {:.4f}  [{:.4f}, {:.4f}]".format(label, self.probability(code), low, high))
+        lines.append("Mean pulses {:.3f} +/- {:.3f}".format(self.mean_pulses(), self.pulses_half_width()))
+        return "\n".join(lines)
+
+
+def run_adaptive(batch, half_width = 0.01, pulses_half_width = None, confidence = 0.95,
+                 batch_size = 1000, min_replicates = 0, max_replicates = 1000000, seed = None,
+                 sink = None, keep = False, estimate = None):
+    ''' Resolves batches of replicates until the estimates reach the target precision.
+
+    Arguments:
+        * batch (function): batch(rng, size) -> structured array of results, see above.
+        * half_width (float): target half-width of every outcome probability interval.
+        * pulses_half_width (float): target half-width of the mean pulses interval. If None,
+        the mean pulses are estimated but do not decide when to stop.
+        * confidence (fraction): the confidence level of the intervals.
+        * batch_size (int): the number of replicates resolved at a time.
+        * min_replicates (int): the study never stops before this many replicates.
+        * max_replicates (int): the study stops after this many replicates, even if the
+        target precision has not been reached. Only whole batches are resolved, so it is
+        rounded down to a multiple of batch_size (or batch_size is cut down to it).
+        * seed (int or numpy.random.Generator): the seed of the random draws.
+        * sink (ResultSink): if given, every batch of results is streamed to it.
+        * keep (bool): if True, every batch of results is kept and returned.
+        * estimate (RunningEstimate): the estimate to update, such as a BatchMeansEstimate
+        of varianceReduction.py. Defaults to a new RunningEstimate.
+
+    Returns (estimate, results): the RunningEstimate, with an extra 'converged' attribute
+    telling whether the target precision was reached, and the results of every replicate
+    (or None if keep is False).
+    '''
+    rng = np.random.default_rng(seed)
+    if estimate is None:
+        estimate = RunningEstimate(confidence)
+    batches = []
+    estimate.converged = False
+    # Every batch has the same size, as batch means estimates require
+    batch_size = min(batch_size, max_replicates)
+    while estimate.count + batch_size <= max_replicates:
+        results = batch(rng, batch_size)
+        estimate.update(results)
+        if sink is not None:
+            sink.append(results)
+        if keep:
+            batches.append(results)
+        if estimate.count >= min_replicates and estimate.probability_half_width() <= half_width and \
+                (pulses_half_width is None or estimate.pulses_half_width() <= pulses_half_width):
+            estimate.converged = True
+            break
+    return estimate, (np.concatenate(batches) if keep and batches else None)
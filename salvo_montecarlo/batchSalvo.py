@@ -0,0 +1,249 @@
+"""
+A vectorised batch engine for the Deterministic Salvo Model created by Wayne P. Hughes Jr.
+
+Instead of building one Group and one Battle per Monte Carlo iteration, every replicate
+of a study is resolved at once, and every pulse is applied to all the replicates that are
+still fighting. As in HomogeneousGroup, the state of a group is reduced to the index of
+its first ship afloat and that ship's hit points, held in NumPy arrays of shape
+(replicates,) along with the group aggregates. Memory does not depend on fleet size.
+
+For any single replicate the results are the same as those of Battle.resolve in
+'salvo model monte carlo.py' (no leakers) or in salvo/deterministicSalvo.py (leakers):
+damage is allocated to the ships, and the running aggregates are updated, with the same
+arithmetic as Group.damage, so the pulse counts and final statuses match exactly. Battle.resolve
+has no pulse limit, whereas resolve_batch stops the battles still going on after max_pulses
+pulses (1000 by default, None for no limit), so the equivalence only holds up to that
+limit: such replicates are reported as UNDECIDED, and flagged in the "limited" field.
+
+The defence rules are those of the salvo engine (salvo/salvoEngine.py), which computes
+the combat power of a batch with the same rule methods as the task forces.
+
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "salvo"))
+
+from salvoEngine import NO_LEAKERS, LEAKERS, get_rule
+
+# Winner codes
+UNDECIDED = 0   # the duration (or pulse limit) ran out with both sides still active
+BLUFOR = 1      # REDFOR was wiped out
+REDFOR = 2      # BLUFOR was wiped out
+DRAW = 3        # both sides were wiped out in the same pulse
+STALEMATE = 4   # neither side can penetrate the enemy missile defence
+
+WINNER_LABELS = {UNDECIDED: "Undecided", BLUFOR: "BLUFOR", REDFOR: "REDFOR",
+                 DRAW: "Draw", STALEMATE: "Stalemate"}
+
+# Structure of the result array returned by resolve_batch()
+RESULT_DTYPE = np.dtype([("pulses", np.int32),
+                         ("blu_status", np.float64),
+                         ("red_status", np.float64),
+                         ("winner", np.int8),
+                         ("limited", np.bool_)])
+
+
+class BatchGroup:
+    ''' The same group of ships, replicated across a batch of independent battles.
+
+    Every attribute of the group may change from one replicate to the next, except the
+    number of ships.
+
+    Attributes:
+        * side (str): the group's side identifier, for labelling purposes.
+        * units (int): the number of ships in the group.
+        * replicates (int): the number of replicates in the batch.
+        * op, dp, sp (array): the Ship values for each replicate.
+        * scouting (array): fraction of enemy group that can be located and targeted.
+        * readiness (array): efficiency of the group's defences.
+        * launch_reliability, ascm_to_hit, sam_to_hit (array): the Missiles values.
+        * cursor (array): index of the first ship not out of action in each replicate.
+        * hp (array): hit points remaining of that ship in each replicate.
+        * totalStatus, salvoSize, defensiveSalvoSize (array): the running aggregates
+        of Group, for each replicate.
+    '''
+    def __init__(self, side, ship, units, replicates, scouting = 1, readiness = 1, missiles = None):
+        ''' Arguments:
+            * ship (Ship): the ship type. Its op, dp and sp may be scalars or arrays with
+            one value per replicate.
+            * missiles (Missiles): the missile systems used by the group. Its attributes
+            may also be scalars or arrays. Defaults to perfect missiles.
+        '''
+        self.side = side
+        self.units = units
+        self.replicates = replicates
+        self.op = self._expand(ship.op)
+        self.dp = self._expand(ship.dp)
+        self.sp = self._expand(ship.sp)
+        self.scouting = self._expand(scouting)
+        self.readiness = self._expand(readiness)
+        self.launch_reliability = self._expand(getattr(missiles, "launch_reliability", 1))
+        self.ascm_to_hit = self._expand(getattr(missiles, "ascm_to_hit", 1))
+        self.sam_to_hit = self._expand(getattr(missiles, "sam_to_hit", 1))
+        self.cursor = np.zeros(replicates, dtype=np.int64)
+        self.hp = self.sp.copy()
+        self.totalStatus = np.full(replicates, float(units))
+        self.salvoSize = self.op * units
+        self.defensiveSalvoSize = self.dp * units
+
+    def _expand(self, value):
+        ''' Broadcasts a scalar or per-replicate value to an array of length 'replicates'.'''
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (self.replicates,)).copy()
+
+    def total_status(self, rows = slice(None)):
+        ''' Returns the sum of the ship statuses of the selected replicates.'''
+        return self.totalStatus[rows]
+
+    def striking_power(self, rows = slice(None)):
+        ''' Returns the raw striking power of the selected replicates.'''
+        offensiveModifier = self.launch_reliability[rows] * self.ascm_to_hit[rows]
+        return self.salvoSize[rows] * self.scouting[rows] * offensiveModifier
+
+    def defensive_power(self, rows = slice(None), rule = NO_LEAKERS):
+        ''' Returns the raw defensive power of the selected replicates.'''
+        defensivePower = self.defensiveSalvoSize[rows] * self.readiness[rows]
+        return defensivePower * get_rule(rule).defence_factor(self.sam_to_hit[rows])
+
+    def combat_power(self, enemy, rows = slice(None), rule = NO_LEAKERS):
+        ''' Returns the combat power in excess of the enemy's defences.
+
+        Arguments:
+            * enemy (BatchGroup): the target group, with the same number of replicates.
+            * rows: the replicates to compute.
+            * rule (str): NO_LEAKERS, LEAKERS or any rule of salvoEngine.RULES, by name or
+            as a DefenceRule.
+        '''
+        rule = get_rule(rule)
+        strikingPower = self.striking_power(rows)
+        enemyDefence = enemy.defensive_power(rows, rule)
+        return rule.combat_powers(strikingPower, enemyDefence, enemy.sam_to_hit[rows])
+
+    def damage(self, damage, rows):
+        ''' Damages the selected replicates, with the same arithmetic as HomogeneousGroup.damage:
+        the first ship afloat absorbs what it can, and the rest of the damage sinks every
+        ship whose cumulative staying power (sp * position) it covers.
+
+        Arguments:
+            * damage (array): the damage to inflict upon each selected replicate.
+            * rows (array): the indices of the selected replicates.
+        '''
+        damage = np.asarray(damage, dtype=np.float64)
+        hit = (damage > 0) & (self.cursor[rows] < self.units)
+        rows, damage = rows[hit], damage[hit]
+        if rows.size == 0:
+            return
+        sp = self.sp[rows]
+        cursor = self.cursor[rows]
+        first = self.hp[rows]
+        lost = first / sp
+        sunk = damage > first
+        hp = np.where(sunk, 0, first - damage)
+        lost = np.where(sunk, lost, lost - hp / sp)
+
+        # Replicates where the damage goes past the first ship
+        over = np.flatnonzero(sunk)
+        if over.size > 0:
+            spOver = sp[over]
+            start = cursor[over] + 1
+            reach = spOver * start + (damage[over] - first[over])
+            last = np.clip(np.floor_divide(reach, spOver).astype(np.int64), start, self.units)
+            while True:
+                behind = (last > start) & (spOver * last > reach)
+                if not behind.any():
+                    break
+                last[behind] -= 1
+            while True:
+                ahead = (last < self.units) & (spOver * (last + 1) <= reach)
+                if not ahead.any():
+                    break
+                last[ahead] += 1
+            lost[over] += last - start
+            leftover = np.minimum(np.maximum(reach - spOver * last, 0), spOver)
+            partial = last < self.units
+            hp[over] = np.where(partial, spOver - leftover, 0)
+            lost[over] += np.where(partial, 1 - hp[over] / spOver, 0)
+            cursor[over] = last
+
+        # Move the cursor past a first ship that has just been taken out of action
+        outOfAction = (cursor < self.units) & (hp == 0)
+        cursor[outOfAction] += 1
+        hp[outOfAction] = sp[outOfAction]
+        self.cursor[rows] = cursor
+        self.hp[rows] = hp
+
+        # As in Group.lose_status, a destroyed group is set to exactly zero, and a group down
+        # to its last ship takes the aggregates from that ship's status
+        destroyed = cursor == self.units
+        lastShip = cursor == self.units - 1
+        status = hp / sp
+        for aggregate, weight in ((self.totalStatus, 1), (self.salvoSize, self.op[rows]),
+                                  (self.defensiveSalvoSize, self.dp[rows])):
+            aggregate[rows] = np.where(destroyed, 0, np.where(lastShip, weight * status,
+                                                              aggregate[rows] - weight * lost))
+
+
+def resolve_batch(blu, red, duration = 0, rule = NO_LEAKERS, max_pulses = 1000):
+    ''' Resolves every replicate of a batch of battles, as Battle.resolve does for one.
+
+    Arguments:
+        * blu (BatchGroup): the BLUFOR groups.
+        * red (BatchGroup): the REDFOR groups.
+        * duration (int): the duration of the battles in pulses. If zero (default) each
+        battle goes on until one side is wiped out or a stalemate is reached.
+        * rule (str): NO_LEAKERS (as in the Monte Carlo script), LEAKERS, or another rule
+        of salvoEngine.RULES.
+        * max_pulses (int): safety limit for battles with no duration. Battles still
+        going on after this many pulses are reported as UNDECIDED, with "limited" set.
+        None for no limit, as in Battle.resolve.
+
+    Returns a structured array (RESULT_DTYPE) with one entry per replicate: pulses to
+    termination, surviving total status of each side, the winner code, and whether the
+    battle was stopped by max_pulses.
+    '''
+    rule = get_rule(rule)
+    if blu.replicates != red.replicates:
+        raise ValueError("Both groups must have the same number of replicates")
+    replicates = blu.replicates
+    pulses = np.zeros(replicates, dtype=np.int32)
+    stalemate = np.zeros(replicates, dtype=bool)
+    limit = duration if duration > 0 else (max_pulses or np.inf)
+    if duration > 0:
+        active = np.arange(replicates)
+    else:
+        active = np.flatnonzero((blu.total_status() != 0) & (red.total_status() != 0))
+
+    pulse = 0
+    while active.size > 0 and pulse < limit:
+        pulse += 1
+        bluDamageSustained = red.combat_power(blu, active, rule)
+        redDamageSustained = blu.combat_power(red, active, rule)
+        blu.damage(bluDamageSustained, active)
+        red.damage(redDamageSustained, active)
+        pulses[active] += 1
+        if duration == 0:
+            bluAlive = blu.total_status(active) != 0
+            redAlive = red.total_status(active) != 0
+            fighting = bluAlive & redAlive
+            # The stalemate check only applies to battles that would otherwise go on
+            checked = active[fighting]
+            stuck = ((blu.combat_power(red, checked, rule) == 0) &
+                     (red.combat_power(blu, checked, rule) == 0))
+            stalemate[checked[stuck]] = True
+            active = checked[~stuck]
+
+    results = np.zeros(replicates, dtype=RESULT_DTYPE)
+    results["pulses"] = pulses
+    results["blu_status"] = blu.total_status()
+    results["red_status"] = red.total_status()
+    bluAlive = results["blu_status"] != 0
+    redAlive = results["red_status"] != 0
+    results["winner"] = np.select(
+        [bluAlive & ~redAlive, redAlive & ~bluAlive, ~bluAlive & ~redAlive, stalemate],
+        [BLUFOR, REDFOR, DRAW, STALEMATE], UNDECIDED)
+    if duration == 0:
+        results["limited"][active] = True
+    return results
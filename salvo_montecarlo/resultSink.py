@@ -0,0 +1,134 @@
+"""
+A streaming columnar store for the results of Monte Carlo salvo runs.
+
+Results are buffered into fixed-size typed column chunks, and every full chunk is
+appended to one raw binary file per column. A small JSON manifest records the columns,
+their types and the number of rows written so far, and is replaced after every flush,
+so a run that stops half-way can still be read up to its last flush. Memory use depends
+only on the chunk size, however long the run.
+
+The columns are read back with read_results(), which memory-maps them as NumPy arrays,
+so even very large runs can be analysed without loading them into memory.
+
+Layout of a results directory:
+    manifest.json       {"columns": {name: dtype}, "rows": n}
+    <name>.bin          the values of column <name>, one after the other
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+def _manifest_path(path):
+    return os.path.join(path, MANIFEST)
+
+
+def _column_path(path, name):
+    return os.path.join(path, "{}.bin".format(name))
+
+
+class ResultSink:
+    ''' Appends rows of results to a columnar results directory.
+
+    Attributes:
+        * path (str): the results directory. Created if it does not exist; if it already
+        holds results with the same columns, new rows are appended to them.
+        * dtype (numpy.dtype): a structured type with one field per column.
+        * chunk_size (int): the number of rows buffered before they are written out.
+        * rows (int): the number of rows written to disk so far.
+    '''
+    def __init__(self, path, dtype, chunk_size = 65536):
+        self.path = path
+        # Store every column little-endian, so the files are portable
+        dtype = np.dtype(dtype)
+        self.dtype = np.dtype([(name, dtype[name].newbyteorder("<")) for name in dtype.names])
+        self.chunk_size = chunk_size
+        self.rows = 0
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(_manifest_path(path)):
+            with open(_manifest_path(path)) as manifest:
+                existing = json.load(manifest)
+            columns = {name: self.dtype[name].str for name in self.dtype.names}
+            if existing["columns"] != columns:
+                raise ValueError("{} holds results with different columns".format(path))
+            self.rows = existing["rows"]
+        self.buffer = np.empty(chunk_size, dtype=self.dtype)
+        self.filled = 0
+        self.files = {}
+        for name in self.dtype.names:
+            self.files[name] = open(_column_path(path, name), "r+b" if self.rows else "wb")
+            # Drop anything written after the last flush recorded in the manifest
+            self.files[name].truncate(self.rows * self.dtype[name].itemsize)
+            self.files[name].seek(0, os.SEEK_END)
+        self._write_manifest()
+
+    def append(self, records):
+        ''' Appends rows of results.
+
+        Arguments:
+            * records (array or dict): a structured array, or a dict of column name ->
+            array of values. Every column of the sink must be present.
+        '''
+        count = len(records) if isinstance(records, np.ndarray) else len(next(iter(records.values())))
+        written = 0
+        while written < count:
+            space = min(self.chunk_size - self.filled, count - written)
+            for name in self.dtype.names:
+                self.buffer[name][self.filled:self.filled + space] = records[name][written:written + space]
+            self.filled += space
+            written += space
+            if self.filled == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        ''' Writes the buffered rows to disk.'''
+        if self.filled == 0:
+            return
+        for name in self.dtype.names:
+            self.buffer[name][:self.filled].tofile(self.files[name])
+            self.files[name].flush()
+        self.rows += self.filled
+        self.filled = 0
+        self._write_manifest()
+
+    def close(self):
+        ''' Writes any buffered rows and closes the column files.'''
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+    def _write_manifest(self):
+        ''' Replaces the manifest, recording the rows written so far.'''
+        manifest = {"columns": {name: self.dtype[name].str for name in self.dtype.names},
+                    "rows": self.rows}
+        temporary = _manifest_path(self.path) + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(manifest, file)
+        os.replace(temporary, _manifest_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def read_results(path):
+    ''' Returns the columns of a results directory as a dict of column name -> read-only
+    array, memory-mapped from disk.'''
+    with open(_manifest_path(path)) as file:
+        manifest = json.load(file)
+    rows = manifest["rows"]
+    columns = {}
+    for name, dtype in manifest["columns"].items():
+        if rows == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+        else:
+            columns[name] = np.memmap(_column_path(path, name), dtype=dtype, mode="r", shape=(rows,))
+    return columns
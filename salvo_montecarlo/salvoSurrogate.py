@@ -0,0 +1,277 @@
+"""
+A surrogate model of the Deterministic Salvo Model over its parameter space.
+
+The surrogate is a Gaussian process fitted to the battles already resolved, with a
+squared exponential kernel over the parameters that vary (scaled to their bounds). The
+length scale and the noise (which stands for the steps of the model, such as a ship put
+out of action, that a smooth kernel cannot follow) are chosen by marginal likelihood, and
+the amplitude of every response is fitted to its training values. The predicted
+variances are then scaled up if the leave-one-out residuals of the training set are
+larger than the fit says they should be.
+
+A query is answered from the surrogate when the confidence interval of every predicted
+response is within the error tolerance; otherwise the battle is resolved by the real
+model (the batch engine, which gives the same results as Battle.resolve), and added to
+the training set. A random share of the points answered by the surrogate is resolved by
+the real model as well, as a spot check: if any of them misses the tolerance, they are
+added to the training set, the surrogate is refitted, and the rest of the query is
+predicted again.
+
+The training set can be saved to disk, and is reloaded when a surrogate with the same
+settings is created with the same path, so it grows across sessions.
+
+Parameter names take the form "<side>.<value>", as in salvoSweep.py.
+
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+from adaptiveMonteCarlo import normal_quantile
+from batchSalvo import NO_LEAKERS
+from salvoSweep import resolve_points, _check_names, SIDES, PARAMETERS
+
+# Length scales tried when fitting, in units of the parameter bounds
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+
+# Noise variances tried when fitting, relative to the amplitude of the responses
+NOISES = (1e-8, 1e-6, 1e-4, 1e-3, 1e-2, 1e-1)
+
+
+class Surrogate:
+    ''' A Gaussian process surrogate of the salvo model, with fallback to the real model.
+
+    Attributes:
+        * base (dict): the parameters of both sides that do not vary, see
+        salvoSweep.group_parameters().
+        * bounds (dict): parameter name -> (low, high) of the parameters that vary.
+        * responses (tuple): the fields of batchSalvo.RESULT_DTYPE predicted.
+        * tolerance (float): the largest half-width of the confidence interval of a
+        response for the surrogate to answer a query.
+        * confidence (fraction): the confidence level of that interval.
+        * rule, duration, max_pulses: the settings of the real model, see run_sweep().
+        * path (str): the file the training set is saved to, if any. It is saved
+        whenever a query resolves battles with the real model.
+        * spot_check (fraction): the share of the points answered by the surrogate that
+        is resolved by the real model as well, to check them.
+        * seed (int or numpy.random.Generator): the seed of the choice of spot checks.
+        * inputs (array): the training parameters, one row per battle.
+        * outputs (array): the training responses, one row per battle.
+        * hits (int): the number of queries answered by the surrogate.
+        * misses (int): the number of queries answered by the real model, spot checks
+        included.
+        * checks (int): the number of spot checks.
+        * refits (int): the number of spot checks that missed the tolerance, each of
+        which refitted the surrogate.
+    '''
+    def __init__(self, base, bounds, responses = ("blu_status", "red_status"), tolerance = 0.05,
+                 confidence = 0.95, rule = NO_LEAKERS, duration = 0, max_pulses = 1000, path = None,
+                 spot_check = 0.05, seed = None):
+        _check_names(base)
+        _check_names(bounds)
+        self.base = {name: float(value) for name, value in base.items()}
+        self.bounds = {name: (float(low), float(high)) for name, (low, high) in bounds.items()}
+        self.responses = tuple(responses)
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.z = normal_quantile(confidence)
+        self.rule = rule
+        self.duration = duration
+        self.max_pulses = max_pulses
+        self.path = path
+        self.spot_check = spot_check
+        self.rng = np.random.default_rng(seed)
+        self.inputs = np.zeros((0, len(self.bounds)))
+        self.outputs = np.zeros((0, len(self.responses)))
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+        self.refits = 0
+        self.fit = None
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def _settings(self):
+        ''' Returns the settings a saved training set must match to be reused.'''
+        return {"base": self.base, "bounds": self.bounds, "responses": list(self.responses),
+                "rule": self.rule, "duration": self.duration, "max_pulses": self.max_pulses}
+
+    def _scaled(self, inputs):
+        ''' Scales the parameters to their bounds.'''
+        low = np.array([low for low, high in self.bounds.values()])
+        high = np.array([high for low, high in self.bounds.values()])
+        return (inputs - low) / np.where(high > low, high - low, 1)
+
+    def _points(self, points):
+        ''' Returns the query points as an array, one row per point.'''
+        _check_names(points)
+        if set(points) != set(self.bounds):
+            raise ValueError("Query points must give exactly the parameters {}".format(list(self.bounds)))
+        return np.stack([np.atleast_1d(np.asarray(points[name], dtype=np.float64))
+                         for name in self.bounds], axis=1)
+
+    def evaluate(self, inputs):
+        ''' Resolves the battles at the given parameters with the real model, adds them to
+        the training set and returns their responses.'''
+        values = {name: np.full(len(inputs), value) for name, value in self.base.items()}
+        for i, name in enumerate(self.bounds):
+            values[name] = inputs[:, i]
+        missing = ["{}.{}".format(side, value) for side in SIDES for value in PARAMETERS
+                   if "{}.{}".format(side, value) not in values]
+        if missing:
+            raise ValueError("Missing base parameters: {}".format(", ".join(missing)))
+        results = resolve_points(values, self.rule, self.duration, self.max_pulses)
+        outputs = np.stack([results[name].astype(np.float64) for name in self.responses], axis=1)
+        self.inputs = np.concatenate([self.inputs, inputs])
+        self.outputs = np.concatenate([self.outputs, outputs])
+        self.fit = None
+        return outputs
+
+    def train(self, points):
+        ''' Resolves the battles at the given points (dict of parameter name -> array) with
+        the real model and adds them to the training set.'''
+        self.evaluate(self._points(points))
+
+    def _fit(self):
+        ''' Fits the Gaussian process to the training set: the length scale and noise with
+        the largest marginal likelihood, and the most likely amplitude of every response.
+        The amplitudes are then scaled up so that the leave-one-out residuals fall within
+        their confidence intervals as often as the confidence level says.'''
+        x = self._scaled(self.inputs)
+        count = len(x)
+        mean = self.outputs.mean(axis=0)
+        scale = self.outputs.std(axis=0)
+        scale[scale == 0] = 1
+        y = (self.outputs - mean) / scale
+        distances = ((x[:, None, :] - x[None, :, :]) ** 2).sum(axis=2)
+        best = None
+        for lengthScale in LENGTH_SCALES:
+            correlation = np.exp(-distances / (2 * lengthScale ** 2))
+            for noise in NOISES:
+                try:
+                    factor = np.linalg.cholesky(correlation + noise * np.eye(count))
+                except np.linalg.LinAlgError:
+                    continue
+                weights = np.linalg.solve(factor.T, np.linalg.solve(factor, y))
+                amplitude = (y * weights).sum(axis=0) / count
+                # Log marginal likelihood, up to a constant, with the amplitudes profiled out.
+                # Responses that do not vary have no amplitude, and no say in the fit.
+                varying = amplitude > 0
+                likelihood = (-count / 2 * np.log(amplitude[varying]).sum() -
+                              varying.sum() * np.log(np.diag(factor)).sum())
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, lengthScale, noise, factor, weights, amplitude)
+        likelihood, lengthScale, noise, factor, weights, amplitude = best
+        # Closed-form leave-one-out residuals, standardised by their predicted variances
+        inverse = np.linalg.inv(factor)
+        precision = (inverse ** 2).sum(axis=0)
+        varying = amplitude > 0
+        standardised = np.abs(weights[:, varying]) / np.sqrt(precision[:, None] * amplitude[varying])
+        amplitude[varying] *= np.maximum(np.quantile(standardised, self.confidence, axis=0) / self.z, 1) ** 2
+        self.fit = (x, mean, scale, lengthScale, noise, factor, weights, amplitude)
+
+    def predict(self, inputs):
+        ''' Returns the surrogate prediction (mean, standard deviation) of the responses at
+        the given parameters, one row per point.'''
+        if len(self.inputs) == 0:
+            shape = (len(inputs), len(self.responses))
+            return np.full(shape, math.nan), np.full(shape, math.inf)
+        if self.fit is None:
+            self._fit()
+        x, mean, scale, lengthScale, noise, factor, weights, amplitude = self.fit
+        distances = ((self._scaled(inputs)[:, None, :] - x[None, :, :]) ** 2).sum(axis=2)
+        covariance = np.exp(-distances / (2 * lengthScale ** 2))
+        solved = np.linalg.solve(factor, covariance.T)
+        # The noise is part of the error of a prediction: it stands for steps of the model
+        variance = np.maximum(1 + noise - (solved ** 2).sum(axis=0), 0)
+        prediction = mean + (covariance @ weights) * scale
+        deviation = np.sqrt(variance[:, None] * amplitude) * scale
+        return prediction, deviation
+
+    def _precise(self, deviation):
+        ''' Returns whether the confidence interval of every response is within the
+        tolerance, for every point.'''
+        return np.all(self.z * deviation <= self.tolerance, axis=1)
+
+    def query(self, points):
+        ''' Answers a query, from the surrogate where it is precise enough and from the real
+        model elsewhere.
+
+        Arguments:
+            * points (dict): parameter name -> value or array of values, for every
+            parameter in 'bounds'.
+
+        Returns (values, exact): a dict of response name -> array of values, and a boolean
+        array telling which points were resolved by the real model.
+        '''
+        inputs = self._points(points)
+        prediction, deviation = self.predict(inputs)
+        answered = self._precise(deviation)
+        resolved = np.zeros(len(inputs), dtype=bool)
+        while self.spot_check > 0 and answered.any():
+            candidates = np.flatnonzero(answered)
+            checked = self.rng.choice(candidates, math.ceil(self.spot_check * candidates.size), replace=False)
+            outputs = self.evaluate(inputs[checked])
+            missed = np.any(np.abs(outputs - prediction[checked]) > self.tolerance, axis=1)
+            prediction[checked] = outputs
+            answered[checked] = False
+            resolved[checked] = True
+            self.checks += checked.size
+            if not missed.any():
+                break
+            # Refit with the points checked, and predict the rest of the query again
+            self.refits += 1
+            rest = np.flatnonzero(answered)
+            prediction[rest], deviation[rest] = self.predict(inputs[rest])
+            answered[rest] = self._precise(deviation[rest])
+        pending = ~answered & ~resolved
+        if pending.any():
+            prediction[pending] = self.evaluate(inputs[pending])
+        exact = ~answered
+        self.misses += int(exact.sum())
+        self.hits += int(answered.sum())
+        if self.path is not None and exact.any():
+            self.save()
+        return {name: prediction[:, i] for i, name in enumerate(self.responses)}, exact
+
+    def save(self):
+        ''' Saves the training set to 'path'.'''
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, inputs=self.inputs, outputs=self.outputs,
+                     settings=np.array(json.dumps(self._settings())))
+        os.replace(temporary, self.path)
+
+    def load(self):
+        ''' Loads the training set saved to 'path'.'''
+        with np.load(self.path) as saved:
+            if json.loads(str(saved["settings"])) != json.loads(json.dumps(self._settings())):
+                raise ValueError("{} holds a training set with different settings".format(self.path))
+            self.inputs = saved["inputs"]
+            self.outputs = saved["outputs"]
+        self.fit = None
+
+
+if __name__ == "__main__":
+    # Example: the Monte Carlo scenario (Cares, page 23, Scenario VI), with the surrogate
+    # answering queries over BLUFOR scouting and REDFOR readiness. The statuses at the end
+    # of the battle are step functions of these (REDFOR is wiped out or not), which the
+    # surrogate leaves to the real model, so the statuses after the first pulse are used
+    from types import SimpleNamespace
+    from salvoSweep import group_parameters, latin_hypercube
+
+    frigate = SimpleNamespace(op=4, dp=4, sp=2)
+    standard = SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+    base = group_parameters("blu", frigate, 5, 1, 1, standard)
+    base.update(group_parameters("red", frigate, 3, 1, 1, standard))
+    bounds = {"blu.scouting": (0, 1), "red.readiness": (0.5, 1)}
+    for name in bounds:
+        del base[name]
+    surrogate = Surrogate(base, bounds, tolerance=0.1, duration=1)
+    surrogate.train(latin_hypercube(bounds, 200, seed=1))
+    values, exact = surrogate.query(latin_hypercube(bounds, 1000, seed=2))
+    print("Answered by the surrogate: {}, by the model: {} ({} spot checks, {} refits)".format(
+        surrogate.hits, surrogate.misses, surrogate.checks, surrogate.refits))
@@ -0,0 +1,233 @@
+"""
+A parameter sweep runner for the Deterministic Salvo Model.
+
+A sweep evaluates a grid of scenarios (Cartesian or Latin hypercube) over the Ship,
+Group and Missiles values of both sides. Every point of the grid can be replicated,
+with some of its values drawn at random for each replicate, and is summarised as the
+fraction of battles won by each side and the average pulses and surviving status.
+
+The grid is cut into chunks of points, which are resolved by the batch engine in a pool
+of worker processes. Random values are drawn from a numpy.random.Generator seeded for
+each point (not for each worker) from the sweep seed and the index of the point, so the
+results of a sweep with a given seed are bit-identical whatever the number of workers.
+
+Parameter names take the form "<side>.<value>", where side is "blu" or "red" and value
+is one of PARAMETERS.
+
+"""
+
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+from batchSalvo import (BatchGroup, resolve_batch, RESULT_DTYPE, NO_LEAKERS, UNDECIDED,
+                        BLUFOR, REDFOR, DRAW, STALEMATE)
+
+SIDES = ("blu", "red")
+PARAMETERS = ("units", "op", "dp", "sp", "scouting", "readiness",
+              "launch_reliability", "ascm_to_hit", "sam_to_hit")
+
+# Summary values computed for every point of the sweep
+SUMMARY_FIELDS = ("p_blufor", "p_redfor", "p_draw", "p_stalemate", "p_undecided",
+                  "mean_pulses", "mean_blu_status", "mean_red_status")
+
+
+def group_parameters(side, ship, units, scouting = 1, readiness = 1, missiles = None):
+    ''' Returns the base parameters of one side of a sweep, taken from the same arguments
+    used to create a Group.
+
+    Arguments:
+        * side (str): "blu" or "red".
+        * ship (Ship), units (int), scouting, readiness, missiles (Missiles): as in Group.
+    '''
+    if side not in SIDES:
+        raise ValueError("Side must be one of {}".format(SIDES))
+    values = {"units": units, "op": ship.op, "dp": ship.dp, "sp": ship.sp,
+              "scouting": scouting, "readiness": readiness,
+              "launch_reliability": getattr(missiles, "launch_reliability", 1),
+              "ascm_to_hit": getattr(missiles, "ascm_to_hit", 1),
+              "sam_to_hit": getattr(missiles, "sam_to_hit", 1)}
+    return {"{}.{}".format(side, name): value for name, value in values.items()}
+
+
+def _check_names(names):
+    ''' Raises ValueError if any of the names is not a valid sweep parameter.'''
+    for name in names:
+        side, _, value = name.partition(".")
+        if side not in SIDES or value not in PARAMETERS:
+            raise ValueError("Unknown sweep parameter: {}".format(name))
+
+
+def cartesian_grid(axes):
+    ''' Returns the Cartesian product of the given axes.
+
+    Arguments:
+        * axes (dict): parameter name -> list of values.
+
+    Returns a dict of parameter name -> array of values, one entry per grid point.
+    '''
+    _check_names(axes)
+    names = list(axes)
+    points = list(itertools.product(*(axes[name] for name in names)))
+    return {name: np.array([point[i] for point in points], dtype=np.float64)
+            for i, name in enumerate(names)}
+
+
+def latin_hypercube(ranges, samples, seed = 0):
+    ''' Returns a Latin hypercube sample of the given parameter ranges.
+
+    Every range is cut into 'samples' strata of equal width, and each stratum is sampled
+    exactly once, in a random order independent for every parameter.
+
+    Arguments:
+        * ranges (dict): parameter name -> (low, high).
+        * samples (int): the number of points.
+        * seed (int): the seed of the sample.
+
+    Returns a dict of parameter name -> array of values, one entry per grid point.
+    '''
+    _check_names(ranges)
+    rng = np.random.default_rng(seed)
+    grid = {}
+    for name, (low, high) in ranges.items():
+        strata = (rng.permutation(samples) + rng.uniform(0, 1, samples)) / samples
+        grid[name] = low + strata * (high - low)
+    return grid
+
+
+def _draw(rng, distribution, size):
+    ''' Draws 'size' values from a distribution given as (method, *arguments), where
+    method is the name of a numpy.random.Generator method, such as ("uniform", 0, 1).'''
+    method, *arguments = distribution
+    return getattr(rng, method)(*arguments, size=size)
+
+
+def resolve_points(values, rule = NO_LEAKERS, duration = 0, max_pulses = 1000):
+    ''' Resolves one battle for every row of a set of parameter values.
+
+    Arguments:
+        * values (dict): parameter name -> array of values, one entry per battle. Every
+        parameter of both sides must be present.
+        * rule, duration, max_pulses: as in run_sweep().
+
+    Returns a structured array (batchSalvo.RESULT_DTYPE) with one entry per battle.
+    Battles with exactly the same parameters are only resolved once, as the model is
+    deterministic, which pays off for discrete grids and replicates with no random values.
+    '''
+    names = ["{}.{}".format(side, value) for side in SIDES for value in PARAMETERS]
+    table = np.stack([np.asarray(values[name], dtype=np.float64) for name in names], axis=1)
+    table, battles = np.unique(table, axis=0, return_inverse=True)
+    values = {name: table[:, i] for i, name in enumerate(names)}
+    rows = len(table)
+    results = np.zeros(rows, dtype=RESULT_DTYPE)
+    sizes = np.stack([values["blu.units"], values["red.units"]], axis=1).astype(np.int64)
+    for bluUnits, redUnits in np.unique(sizes, axis=0):
+        selected = np.flatnonzero((sizes[:, 0] == bluUnits) & (sizes[:, 1] == redUnits))
+        groups = []
+        for side, units in zip(SIDES, (bluUnits, redUnits)):
+            p = {value: values["{}.{}".format(side, value)][selected] for value in PARAMETERS}
+            ship = SimpleNamespace(op=p["op"], dp=p["dp"], sp=p["sp"])
+            missiles = SimpleNamespace(launch_reliability=p["launch_reliability"],
+                                       ascm_to_hit=p["ascm_to_hit"], sam_to_hit=p["sam_to_hit"])
+            groups.append(BatchGroup(side.upper(), ship, int(units), selected.size,
+                                     p["scouting"], p["readiness"], missiles))
+        results[selected] = resolve_batch(groups[0], groups[1], duration, rule, max_pulses)
+    return results[battles.ravel()]
+
+
+def _resolve_chunk(task):
+    ''' Resolves a chunk of sweep points. Runs in a worker process.'''
+    base, points, indices, random, replicates, rule, duration, seed, max_pulses = task
+    count = len(indices)
+    rows = count * replicates
+    values = {}
+    for name, value in base.items():
+        values[name] = np.full(rows, value, dtype=np.float64)
+    for name, column in points.items():
+        values[name] = np.repeat(column, replicates)
+    # One random stream for each point, keyed on its index in the sweep
+    for position, index in enumerate(indices):
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(int(index),)))
+        block = slice(position * replicates, (position + 1) * replicates)
+        for name in sorted(random):
+            values[name][block] = _draw(rng, random[name], replicates)
+
+    results = resolve_points(values, rule, duration, max_pulses).reshape(count, replicates)
+    winner = results["winner"]
+    return np.stack([(winner == BLUFOR).mean(axis=1), (winner == REDFOR).mean(axis=1),
+                     (winner == DRAW).mean(axis=1), (winner == STALEMATE).mean(axis=1),
+                     (winner == UNDECIDED).mean(axis=1), results["pulses"].mean(axis=1),
+                     results["blu_status"].mean(axis=1), results["red_status"].mean(axis=1)],
+                    axis=1)
+
+
+def run_sweep(base, points, replicates = 1, random = None, rule = NO_LEAKERS, duration = 0,
+              seed = 0, workers = 1, chunk_size = 64, max_pulses = 1000):
+    ''' Resolves every point of a sweep and returns its summary.
+
+    Arguments:
+        * base (dict): the base parameters of both sides, see group_parameters().
+        * points (dict): parameter name -> array of values, see cartesian_grid() and
+        latin_hypercube(). Overrides the base parameters.
+        * replicates (int): the number of battles resolved for every point.
+        * random (dict): parameter name -> distribution drawn for every replicate, as
+        (Generator method, *arguments). Overrides the base and point parameters.
+        * rule (str): NO_LEAKERS or LEAKERS, see batchSalvo.
+        * duration (int): the duration of the battles in pulses, or 0 to fight to the end.
+        * seed (int): the seed of the random streams.
+        * workers (int): the number of worker processes. 1 resolves in this process.
+        * chunk_size (int): the number of points resolved together by a worker.
+        * max_pulses (int): safety limit for battles with no duration.
+
+    Returns a structured array with one entry per point: the point parameters followed by
+    the SUMMARY_FIELDS.
+    '''
+    random = dict(random or {})
+    _check_names(base)
+    _check_names(points)
+    _check_names(random)
+    missing = ["{}.{}".format(side, value) for side in SIDES for value in PARAMETERS
+               if "{}.{}".format(side, value) not in base]
+    if missing:
+        raise ValueError("Missing base parameters: {}".format(", ".join(missing)))
+    points = {name: np.asarray(column, dtype=np.float64) for name, column in points.items()}
+    total = len(next(iter(points.values()))) if points else 1
+
+    tasks = []
+    for start in range(0, total, chunk_size):
+        indices = np.arange(start, min(start + chunk_size, total))
+        chunk = {name: column[indices] for name, column in points.items()}
+        tasks.append((base, chunk, indices, random, replicates, rule, duration, seed, max_pulses))
+
+    if workers > 1:
+        # Only imported when needed, as it is slow to import
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(_resolve_chunk, tasks))
+    else:
+        summaries = [_resolve_chunk(task) for task in tasks]
+    summary = np.concatenate(summaries)
+
+    dtype = [(name, np.float64) for name in points] + [(name, np.float64) for name in SUMMARY_FIELDS]
+    sweep = np.zeros(total, dtype=dtype)
+    for name, column in points.items():
+        sweep[name] = column
+    for i, name in enumerate(SUMMARY_FIELDS):
+        sweep[name] = summary[:, i]
+    return sweep
+
+
+if __name__ == "__main__":
+    # Example: the Monte Carlo scenario (Cares, page 23, Scenario VI) swept over the size
+    # of the REDFOR group and its readiness, with random BLUFOR scouting in every battle.
+    frigate = SimpleNamespace(op=4, dp=4, sp=2)
+    standard = SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+    base = group_parameters("blu", frigate, 5, 1, 1, standard)
+    base.update(group_parameters("red", frigate, 3, 1, 1, standard))
+    grid = cartesian_grid({"red.units": [2, 3, 4, 5, 6], "red.readiness": [0.5, 0.75, 1]})
+    sweep = run_sweep(base, grid, replicates=1000, random={"blu.scouting": ("uniform", 0, 1)},
+                      seed=2022, workers=4)
+    print(", ".join(sweep.dtype.names))
+    for point in sweep:
+        print(", ".join("{:.3f}".format(value) for value in point))
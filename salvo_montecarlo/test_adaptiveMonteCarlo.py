@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from adaptiveMonteCarlo import RunningEstimate, run_adaptive
+from batchSalvo import RESULT_DTYPE, WINNER_LABELS, BLUFOR, REDFOR
+
+
+def coin_study(p):
+    ''' Returns a batch function whose battles are won by BLUFOR with probability p, after
+    a random number of pulses.'''
+    def batch(rng, size):
+        results = np.zeros(size, dtype=RESULT_DTYPE)
+        results["winner"] = np.where(rng.random(size) < p, BLUFOR, REDFOR)
+        results["pulses"] = rng.integers(1, 10, size)
+        return results
+    return batch
+
+
+def test_running_estimate_matches_the_whole_sample():
+    # Batches of any size give the statistics of all the replicates at once
+    rng = np.random.default_rng(1)
+    results = coin_study(0.3)(rng, 1000)
+    estimate = RunningEstimate()
+    for start, stop in [(0, 1), (1, 250), (250, 251), (251, 1000)]:
+        estimate.update(results[start:stop])
+    assert estimate.count == 1000
+    assert estimate.counts.tolist() == np.bincount(results["winner"], minlength=len(WINNER_LABELS)).tolist()
+    assert np.isclose(estimate.mean_pulses(), results["pulses"].mean())
+    assert np.isclose(estimate.pulsesM2 / 999, results["pulses"].var(ddof=1))
+
+
+def test_adaptive_run_stops_at_the_target_precision():
+    estimate, results = run_adaptive(coin_study(0.3), half_width=0.02, pulses_half_width=0.2,
+                                     batch_size=500, seed=2, keep=True)
+    assert estimate.converged
+    assert estimate.probability_half_width() <= 0.02 and estimate.pulses_half_width() <= 0.2
+    assert estimate.count % 500 == 0 and len(results) == estimate.count
+    low, high = estimate.probability_interval(BLUFOR)
+    assert low <= 0.3 <= high
+    # One batch less would not have been enough
+    previous = RunningEstimate()
+    previous.update(results[:-500])
+    assert previous.probability_half_width() > 0.02 or previous.pulses_half_width() > 0.2
+    again, _ = run_adaptive(coin_study(0.3), half_width=0.02, pulses_half_width=0.2, batch_size=500, seed=2)
+    assert again.count == estimate.count and again.counts.tolist() == estimate.counts.tolist()
+
+
+def test_adaptive_run_resolves_whole_batches_up_to_the_limit():
+    estimate, results = run_adaptive(coin_study(0.5), half_width=0.001, batch_size=300,
+                                     max_replicates=1000, seed=3, keep=True)
+    assert not estimate.converged
+    assert estimate.count == 900 and len(results) == 900
@@ -0,0 +1,81 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batchSalvo import (BatchGroup, resolve_batch, UNDECIDED, BLUFOR, REDFOR, DRAW,
+                        STALEMATE)
+from salvoEngine import Ship, Missiles, Group, Battle, NO_LEAKERS, LEAKERS
+
+
+def random_side(rng, replicates):
+    ''' Returns the values of one side for every replicate, as keyword arguments.'''
+    return {"op": rng.integers(1, 7, replicates).astype(float),
+            "dp": rng.integers(0, 7, replicates).astype(float),
+            "sp": rng.choice([1, 1.5, 2, 3], replicates),
+            "scouting": rng.uniform(0.2, 1, replicates),
+            "readiness": rng.uniform(0.2, 1, replicates),
+            "launch_reliability": rng.uniform(0.5, 1, replicates),
+            "ascm_to_hit": rng.uniform(0.3, 1, replicates),
+            "sam_to_hit": np.where(rng.random(replicates) < 0.2, 1, rng.uniform(0.3, 1, replicates))}
+
+
+def batch_group(side, units, values):
+    ship = SimpleNamespace(op=values["op"], dp=values["dp"], sp=values["sp"])
+    missiles = SimpleNamespace(launch_reliability=values["launch_reliability"],
+                               ascm_to_hit=values["ascm_to_hit"], sam_to_hit=values["sam_to_hit"])
+    return BatchGroup(side, ship, units, len(values["op"]), values["scouting"],
+                      values["readiness"], missiles)
+
+
+def group(side, units, values, i, rule):
+    ship = Ship("Frigate", values["op"][i], values["dp"][i], values["sp"][i])
+    missiles = Missiles(values["launch_reliability"][i], values["ascm_to_hit"][i],
+                        values["sam_to_hit"][i])
+    return Group(side, ship, units, values["scouting"][i], values["readiness"][i], missiles, rule)
+
+
+@pytest.mark.parametrize("rule", [NO_LEAKERS, LEAKERS])
+@pytest.mark.parametrize("duration", [0, 2])
+def test_batch_matches_battle_resolve(rule, duration):
+    # Every replicate of a batch ends exactly as Battle.resolve ends the same battle
+    rng = np.random.default_rng(1)
+    replicates = 300
+    for bluUnits, redUnits in [(1, 1), (2, 3), (5, 3), (8, 6)]:
+        blu, red = random_side(rng, replicates), random_side(rng, replicates)
+        results = resolve_batch(batch_group("BLUFOR", bluUnits, blu),
+                                batch_group("REDFOR", redUnits, red), duration, rule, None)
+        for i in range(replicates):
+            battle = Battle(group("BLUFOR", bluUnits, blu, i, rule),
+                            group("REDFOR", redUnits, red, i, rule), duration, verbose=False)
+            battle.resolve()
+            bluStatus, redStatus = battle.blu.total_status(), battle.red.total_status()
+            assert results["pulses"][i] == battle.pulse
+            assert results["blu_status"][i] == bluStatus
+            assert results["red_status"][i] == redStatus
+            if bluStatus != 0 and redStatus == 0:
+                winner = BLUFOR
+            elif redStatus != 0 and bluStatus == 0:
+                winner = REDFOR
+            elif bluStatus == 0 and redStatus == 0:
+                winner = DRAW
+            elif duration == 0 and battle.stalemate():
+                winner = STALEMATE
+            else:
+                winner = UNDECIDED
+            assert results["winner"][i] == winner
+            assert not results["limited"][i]
+
+
+def test_pulse_limit_flags_limited_replicates():
+    # Neither side can destroy the other in 3 pulses: the battles are stopped and flagged
+    frigate = SimpleNamespace(op=1, dp=0, sp=100)
+    results = resolve_batch(BatchGroup("BLUFOR", frigate, 2, 4), BatchGroup("REDFOR", frigate, 2, 4),
+                            max_pulses=3)
+    assert (results["pulses"] == 3).all()
+    assert (results["winner"] == UNDECIDED).all()
+    assert results["limited"].all()
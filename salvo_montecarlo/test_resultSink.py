@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batchSalvo import RESULT_DTYPE
+from resultSink import ResultSink, read_results
+
+
+def records(start, count):
+    ''' Returns 'count' rows of results, numbered from 'start'.'''
+    rows = np.zeros(count, dtype=RESULT_DTYPE)
+    rows["pulses"] = np.arange(start, start + count)
+    rows["blu_status"] = np.arange(start, start + count) / 7
+    rows["winner"] = np.arange(start, start + count) % 5
+    rows["limited"] = np.arange(start, start + count) % 3 == 0
+    return rows
+
+
+def test_rows_are_read_back_across_chunks_and_runs(tmp_path):
+    path = str(tmp_path / "results")
+    with ResultSink(path, RESULT_DTYPE, chunk_size=7) as sink:
+        for start in range(0, 50, 10):
+            sink.append(records(start, 10))
+    # A second run appends to the same directory, from a dict of columns
+    more = records(50, 12)
+    with ResultSink(path, RESULT_DTYPE, chunk_size=5) as sink:
+        sink.append({name: more[name] for name in RESULT_DTYPE.names})
+    columns = read_results(path)
+    expected = records(0, 62)
+    for name in RESULT_DTYPE.names:
+        assert np.array_equal(columns[name], expected[name])
+
+
+def test_unflushed_rows_are_dropped(tmp_path):
+    # Rows still in the buffer when a run stops are not recorded, and are overwritten
+    path = str(tmp_path / "results")
+    sink = ResultSink(path, RESULT_DTYPE, chunk_size=4)
+    sink.append(records(0, 6))
+    sink.files[RESULT_DTYPE.names[0]].write(b"partial")
+    # The run stops: the files are closed with no flush of the sink
+    for file in sink.files.values():
+        file.close()
+    assert len(read_results(path)["pulses"]) == 4
+    with ResultSink(path, RESULT_DTYPE, chunk_size=4) as resumed:
+        resumed.append(records(4, 3))
+    assert np.array_equal(read_results(path)["pulses"], np.arange(7))
+
+
+def test_different_columns_are_rejected(tmp_path):
+    path = str(tmp_path / "results")
+    with ResultSink(path, RESULT_DTYPE) as sink:
+        sink.append(records(0, 3))
+    with pytest.raises(ValueError):
+        ResultSink(path, [("pulses", np.int64)])
@@ -0,0 +1,68 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from salvoSurrogate import Surrogate
+from salvoSweep import group_parameters, latin_hypercube, resolve_points
+
+BOUNDS = {"blu.scouting": (0, 1), "red.readiness": (0.5, 1)}
+
+
+def scenario_base():
+    ''' Returns the base parameters of the Monte Carlo scenario, without those in BOUNDS.'''
+    frigate = SimpleNamespace(op=4, dp=4, sp=2)
+    standard = SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+    base = group_parameters("blu", frigate, 5, 1, 1, standard)
+    base.update(group_parameters("red", frigate, 3, 1, 1, standard))
+    for name in BOUNDS:
+        del base[name]
+    return base
+
+
+def resolve(base, points, duration):
+    ''' Resolves the battles at the given points with the real model.'''
+    count = len(next(iter(points.values())))
+    values = {name: np.full(count, value) for name, value in base.items()}
+    values.update(points)
+    return resolve_points(values, duration=duration)
+
+
+def test_answered_queries_within_tolerance():
+    base = scenario_base()
+    surrogate = Surrogate(base, BOUNDS, tolerance=0.1, duration=1, seed=0)
+    surrogate.train(latin_hypercube(BOUNDS, 200, seed=1))
+    points = latin_hypercube(BOUNDS, 500, seed=2)
+    values, exact = surrogate.query(points)
+    truth = resolve(base, points, 1)
+    answered = ~exact
+    assert answered.sum() > len(exact) / 2
+    errors = np.max([np.abs(values[name] - truth[name]) for name in surrogate.responses], axis=0)
+    assert np.all(errors[exact] == 0)
+    assert np.mean(errors[answered] <= surrogate.tolerance) >= surrogate.confidence
+
+
+def test_step_responses_left_to_the_model():
+    # The statuses at the end of the battle are step functions of the parameters
+    base = scenario_base()
+    surrogate = Surrogate(base, BOUNDS, tolerance=0.1, seed=0)
+    surrogate.train(latin_hypercube(BOUNDS, 100, seed=1))
+    points = latin_hypercube(BOUNDS, 200, seed=2)
+    values, exact = surrogate.query(points)
+    truth = resolve(base, points, 0)
+    errors = np.max([np.abs(values[name] - truth[name]) for name in surrogate.responses], axis=0)
+    assert np.mean(errors <= surrogate.tolerance) >= surrogate.confidence
+
+
+def test_query_saves_evaluations(tmp_path):
+    path = str(tmp_path / "surrogate.npz")
+    base = scenario_base()
+    surrogate = Surrogate(base, BOUNDS, duration=1, path=path)
+    values, exact = surrogate.query(latin_hypercube(BOUNDS, 10, seed=1))
+    assert exact.all()
+    reloaded = Surrogate(base, BOUNDS, duration=1, path=path)
+    assert np.array_equal(reloaded.inputs, surrogate.inputs)
+    assert np.array_equal(reloaded.outputs, surrogate.outputs)
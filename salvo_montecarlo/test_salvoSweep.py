@@ -0,0 +1,52 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from salvoSweep import cartesian_grid, group_parameters, latin_hypercube, resolve_points, run_sweep
+
+
+def scenario_base():
+    ''' Returns the base parameters of the Monte Carlo scenario.'''
+    frigate = SimpleNamespace(op=4, dp=4, sp=2)
+    standard = SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+    base = group_parameters("blu", frigate, 5, 1, 1, standard)
+    base.update(group_parameters("red", frigate, 3, 1, 1, standard))
+    return base
+
+
+def test_sweep_is_bit_identical_whatever_the_workers():
+    # Random values are drawn per point, so neither the workers nor the chunks change them
+    base = scenario_base()
+    grid = cartesian_grid({"red.units": [2, 3, 4, 5], "red.readiness": [0.5, 0.75, 1]})
+    random = {"blu.scouting": ("uniform", 0, 1)}
+    reference = run_sweep(base, grid, replicates=200, random=random, seed=7, workers=1)
+    for workers, chunkSize in [(1, 1), (1, 5), (2, 1), (3, 4)]:
+        sweep = run_sweep(base, grid, replicates=200, random=random, seed=7, workers=workers,
+                          chunk_size=chunkSize)
+        assert sweep.tobytes() == reference.tobytes()
+    other = run_sweep(base, grid, replicates=200, random=random, seed=8)
+    assert other.tobytes() != reference.tobytes()
+
+
+def test_duplicate_points_are_resolved_once_with_the_same_results():
+    # resolve_points deduplicates identical battles: the results must not depend on it
+    base = scenario_base()
+    points = latin_hypercube({"blu.scouting": (0, 1), "red.readiness": (0.5, 1)}, 20, seed=3)
+    values = {name: np.full(20, value, dtype=np.float64) for name, value in base.items()}
+    values.update(points)
+    single = resolve_points(values)
+    doubled = resolve_points({name: np.tile(column, 2) for name, column in values.items()})
+    assert doubled[:20].tobytes() == single.tobytes()
+    assert doubled[20:].tobytes() == single.tobytes()
+    backwards = resolve_points({name: column[::-1] for name, column in values.items()})
+    assert backwards[::-1].tobytes() == single.tobytes()
+
+
+def test_unknown_parameters_are_rejected():
+    with pytest.raises(ValueError):
+        run_sweep(scenario_base(), {"blu.speed": np.array([1.0])})
@@ -0,0 +1,86 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batchSalvo import BatchGroup, resolve_batch, RESULT_DTYPE, WINNER_LABELS, BLUFOR, STALEMATE
+from varianceReduction import SAMPLERS, BatchMeansEstimate, compare, run_reduced
+
+
+def scouting_study(sampler, bluUnits = 5):
+    ''' Returns the batch function of the Monte Carlo scenario, with the BLUFOR scouting
+    drawn by a sampler and kept as the "scouting" field.'''
+    frigate = SimpleNamespace(op=4, dp=4, sp=2)
+    standard = SimpleNamespace(launch_reliability=1, ascm_to_hit=0.71, sam_to_hit=0.75)
+
+    def batch(rng, size):
+        scouting = sampler(rng, size)[:, 0]
+        results = resolve_batch(BatchGroup("BLUFOR", frigate, bluUnits, size, scouting, 1, standard),
+                                BatchGroup("REDFOR", frigate, 3, size, 1, 1, standard))
+        columns = np.zeros(size, dtype=[("scouting", np.float64)] + RESULT_DTYPE.descr)
+        columns["scouting"] = scouting
+        for name in RESULT_DTYPE.names:
+            columns[name] = results[name]
+        return columns
+    return batch
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLERS))
+def test_samplers_draw_uniform_variates(name):
+    rng = np.random.default_rng(1)
+    variates = SAMPLERS[name](rng, 100, 3)
+    assert variates.shape == (100, 3)
+    assert ((variates >= 0) & (variates < 1)).all()
+    # Every stratum of the stratified dimensions is sampled once
+    strata = {"stratified": [0], "lhs": [0, 1, 2]}.get(name, [])
+    for dim in strata:
+        assert sorted(np.floor(variates[:, dim] * 100).astype(int)) == list(range(100))
+    if name == "antithetic":
+        assert np.allclose(variates[:50] + variates[50:], 1)
+
+
+def test_batch_means_without_controls_are_the_plain_estimates():
+    batch = scouting_study(SAMPLERS["plain"])
+    rng = np.random.default_rng(2)
+    estimate = BatchMeansEstimate()
+    results = [batch(rng, 100) for _ in range(20)]
+    for result in results:
+        estimate.update(result)
+    everything = np.concatenate(results)
+    for code in WINNER_LABELS:
+        assert np.isclose(estimate.probability(code), np.mean(everything["winner"] == code))
+    assert np.isclose(estimate.mean_pulses(), everything["pulses"].mean())
+    with pytest.raises(ValueError):
+        estimate.update(batch(rng, 50))
+
+
+def test_reduced_runs_agree_with_plain_runs_and_gain_precision():
+    # Stratified scouting with a control variate against a long plain run
+    reference = BatchMeansEstimate()
+    plainBatch = scouting_study(SAMPLERS["plain"])
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        reference.update(plainBatch(rng, 1000))
+    estimate, _ = run_reduced(scouting_study(SAMPLERS["stratified"]), {"scouting": 0.5},
+                              half_width=0.005, batch_size=100, seed=4)
+    assert estimate.converged
+    for code in (BLUFOR, STALEMATE):
+        referenceLow, referenceHigh = reference.probability_interval(code)
+        low, high = estimate.probability_interval(code)
+        assert low <= referenceHigh and referenceLow <= high
+        assert estimate.ess_gain()[code] > 1
+
+
+def test_common_random_numbers():
+    # The same configuration twice differs by exactly nothing; a different one is
+    # estimated more precisely than with independent runs
+    same, other = scouting_study(SAMPLERS["plain"]), scouting_study(SAMPLERS["plain"], bluUnits=4)
+    estimates, differences = compare([same, same, other], 2000, batch_size=100, seed=5)
+    assert np.array_equal(np.array(estimates[0].responses), np.array(estimates[1].responses))
+    assert all(differences[0].probability(code) == 0 for code in WINNER_LABELS)
+    assert differences[1].probability(BLUFOR) < 0
+    assert differences[1].ess_gain()[BLUFOR] > 1
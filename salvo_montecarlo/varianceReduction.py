@@ -0,0 +1,245 @@
+"""
+Variance reduction for Monte Carlo salvo studies.
+
+* **Input sampling**: the random inputs of a study are drawn as uniform variates by one of
+the SAMPLERS (plain, antithetic, stratified or Latin hypercube) and mapped to the input
+distributions by the study, e.g. low + u * (high - low).
+* **Control variates**: any field of the results whose mean is known exactly (such as a
+random input, or the outcome of the deterministic model for the same inputs when studying
+the stochastic model) can be used to correct the estimates.
+* **Common random numbers**: compare() resolves several configurations of a study with the
+same random numbers, so that the differences between them are estimated precisely.
+
+Antithetic pairs and strata make the replicates of a batch dependent, so the estimates
+are built from the means of independent batches of equal size (batch means). Their
+precision is reported as an effective sample size: the number of plain, independent
+replicates that would give the same precision.
+
+"""
+
+import math
+
+import numpy as np
+
+from adaptiveMonteCarlo import RunningEstimate, run_adaptive
+from batchSalvo import WINNER_LABELS
+
+
+def plain(rng, size, dims = 1):
+    ''' Returns (size, dims) independent uniform variates.'''
+    return rng.uniform(0, 1, (size, dims))
+
+
+def antithetic(rng, size, dims = 1):
+    ''' Returns (size, dims) uniform variates in antithetic pairs (u, 1 - u).'''
+    half = rng.uniform(0, 1, ((size + 1) // 2, dims))
+    return np.concatenate([half, 1 - half])[:size]
+
+
+def latin_hypercube(rng, size, dims = 1):
+    ''' Returns (size, dims) uniform variates, with each of the 'size' strata of every
+    dimension sampled once, in an independent random order for every dimension.'''
+    strata = np.stack([rng.permutation(size) for _ in range(dims)], axis=1)
+    return (strata + rng.uniform(0, 1, (size, dims))) / size
+
+
+def stratified(rng, size, dims = 1):
+    ''' Returns (size, dims) uniform variates stratified on the first dimension only: each
+    of its 'size' strata is sampled once, in order. The other dimensions are plain.'''
+    variates = rng.uniform(0, 1, (size, dims))
+    variates[:, 0] = (np.arange(size) + variates[:, 0]) / size
+    return variates
+
+
+SAMPLERS = {"plain": plain, "antithetic": antithetic, "stratified": stratified,
+            "lhs": latin_hypercube}
+
+
+class BatchMeansEstimate(RunningEstimate):
+    ''' Estimates of the outcome probabilities and mean pulses built from batch means,
+    optionally corrected with control variates.
+
+    The batches must be independent and of equal size. The replicates within a batch may
+    be dependent (antithetic, stratified or Latin hypercube inputs).
+
+    Attributes:
+        * controls (dict): field name -> known mean of the control variates.
+        * responses (list): the batch means of the responses (one indicator per winner
+        code, then the pulses), one array per batch.
+        * controlMeans (list): the batch means of the control fields, one array per batch.
+        * batchSize (int): the size of every batch, set by the first one.
+    '''
+    def __init__(self, confidence = 0.95, controls = None):
+        RunningEstimate.__init__(self, confidence)
+        self.controls = dict(controls or {})
+        self.responses = []
+        self.controlMeans = []
+        self.batchSize = None
+
+    def update(self, results):
+        ''' Adds a batch of results to the estimates.'''
+        if len(results) == 0:
+            return
+        if self.batchSize is None:
+            self.batchSize = len(results)
+        elif len(results) != self.batchSize:
+            raise ValueError("Batch of {} replicates, expected {}".format(len(results), self.batchSize))
+        RunningEstimate.update(self, results)
+        winner = results["winner"]
+        self.responses.append(np.array([np.mean(winner == code) for code in WINNER_LABELS] +
+                                       [results["pulses"].mean()]))
+        self.controlMeans.append(np.array([results[name].mean() for name in self.controls]))
+
+    def _estimates(self):
+        ''' Returns the estimates of all the responses and the variances of the estimates.'''
+        batches, controls = len(self.responses), len(self.controls)
+        if batches < controls + 3:
+            responses = np.array(self.responses) if batches else np.full((1, len(WINNER_LABELS) + 1), math.nan)
+            return responses.mean(axis=0), np.full(responses.shape[1], math.inf)
+        responses = np.array(self.responses)
+        residuals = responses - responses.mean(axis=0)
+        estimates = responses.mean(axis=0)
+        if controls:
+            controlMeans = np.array(self.controlMeans)
+            deviations = controlMeans - controlMeans.mean(axis=0)
+            beta = np.linalg.lstsq(deviations, residuals, rcond=None)[0]
+            known = np.array(list(self.controls.values()))
+            estimates = estimates - (controlMeans.mean(axis=0) - known) @ beta
+            residuals = residuals - deviations @ beta
+        variances = (residuals ** 2).sum(axis=0) / (batches - 1 - controls) / batches
+        return estimates, variances
+
+    def probability(self, code):
+        ''' Returns the estimated probability of an outcome, by winner code.'''
+        return self._estimates()[0][code]
+
+    def probability_interval(self, code):
+        ''' Returns the (low, high) normal interval of the probability of an outcome.'''
+        estimates, variances = self._estimates()
+        if math.isinf(variances[code]):
+            return (0.0, 1.0)
+        halfWidth = self.z * math.sqrt(variances[code])
+        return (max(estimates[code] - halfWidth, 0.0), min(estimates[code] + halfWidth, 1.0))
+
+    def mean_pulses(self):
+        ''' Returns the estimated mean number of pulses.'''
+        return self._estimates()[0][-1]
+
+    def pulses_half_width(self):
+        ''' Returns the half-width of the mean pulses interval.'''
+        return self.z * math.sqrt(self._estimates()[1][-1])
+
+    def effective_sample_size(self):
+        ''' Returns the effective sample size of every response (one per winner code, then
+        the pulses): the number of plain replicates that would give the same variance.'''
+        plainVariances = np.array([(self.counts[code] / self.count) * (1 - self.counts[code] / self.count)
+                                   for code in WINNER_LABELS] +
+                                  [self.pulsesM2 / max(self.count - 1, 1)])
+        variances = self._estimates()[1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(plainVariances == 0, self.count, plainVariances / variances)
+
+    def ess_gain(self):
+        ''' Returns the effective sample size of every response, relative to the number of
+        replicates resolved.'''
+        return self.effective_sample_size() / self.count
+
+    def __str__(self):
+        lines = [RunningEstimate.__str__(self), "Effective sample size gain:"]
+        gains = self.ess_gain()
+        for code, label in WINNER_LABELS.items():
+            lines.append("{:<10} {:.2f}".format(label, gains[code]))
+        lines.append("{:<10} {:.2f}".format("Pulses", gains[-1]))
+        return "\n".join(lines)
+
+
+def compare(batches, replicates, batch_size = 100, seed = None, controls = None, confidence = 0.95):
+    ''' Resolves several configurations of a study with common random numbers.
+
+    Every batch of every configuration is resolved with a generator seeded from the same
+    seed, so as long as the batch functions draw their inputs in the same way, the
+    configurations see the same random inputs and their differences are estimated with
+    much less variance than with independent runs.
+
+    Arguments:
+        * batches (list): the batch functions of the configurations, see run_adaptive().
+        * replicates (int): the number of replicates of every configuration, rounded down
+        to a whole number of batches.
+        * batch_size (int): the number of replicates in a batch.
+        * seed (int): the seed of the random numbers.
+        * controls (dict): field name -> known mean of the control variates, if any.
+        * confidence (fraction): the confidence level of the intervals.
+
+    Returns (estimates, differences): one BatchMeansEstimate per configuration, and for
+    every configuration after the first a BatchMeansEstimate of its differences to the
+    first (difference of the winner indicators, and of the pulses), whose ess_gain()
+    is relative to independent runs of both configurations.
+    '''
+    # Every batch has the same size, as batch means estimates require
+    batch_size = min(batch_size, replicates)
+    seeds = np.random.SeedSequence(seed).spawn(replicates // batch_size)
+    estimates = [BatchMeansEstimate(confidence, controls) for _ in batches]
+    differences = [_DifferenceEstimate(confidence) for _ in batches[1:]]
+    for batchSeed in seeds:
+        results = [batch(np.random.default_rng(batchSeed), batch_size) for batch in batches]
+        for estimate, result in zip(estimates, results):
+            estimate.update(result)
+        for difference, result in zip(differences, results[1:]):
+            difference.update_pair(results[0], result)
+    return estimates, differences
+
+
+class _DifferenceEstimate(BatchMeansEstimate):
+    ''' Batch means of the differences between two configurations resolved with common
+    random numbers. The effective sample size is relative to independent runs.'''
+    def __init__(self, confidence = 0.95):
+        BatchMeansEstimate.__init__(self, confidence)
+        self.independentVariances = np.zeros(len(WINNER_LABELS) + 1)
+
+    def update_pair(self, first, second):
+        ''' Adds the results of a batch of both configurations.'''
+        self.count += len(first)
+        pairs = [(first["winner"] == code, second["winner"] == code) for code in WINNER_LABELS]
+        pairs.append((first["pulses"].astype(np.float64), second["pulses"].astype(np.float64)))
+        self.responses.append(np.array([b.mean() - a.mean() for a, b in pairs]))
+        self.controlMeans.append(np.zeros(0))
+        # Variance of the difference of two independent replicates, accumulated by batch
+        self.independentVariances += np.array([a.var() + b.var() for a, b in pairs]) * len(first)
+
+    def probability_interval(self, code):
+        ''' Returns the (low, high) normal interval of the difference of the probabilities.'''
+        estimates, variances = self._estimates()
+        halfWidth = self.z * math.sqrt(variances[code])
+        return (estimates[code] - halfWidth, estimates[code] + halfWidth)
+
+    def effective_sample_size(self):
+        ''' Returns the number of independent pairs that would give the same variance.'''
+        plainVariances = self.independentVariances / max(self.count, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(plainVariances == 0, self.count, plainVariances / self._estimates()[1])
+
+    def __str__(self):
+        estimates, variances = self._estimates()
+        lines = ["Difference over {} replicates, {:.0%} confidence".format(self.count, self.confidence)]
+        labels = list(WINNER_LABELS.values()) + ["Pulses"]
+        for label, estimate, variance, gain in zip(labels, estimates, variances, self.ess_gain()):
+            lines.append("{:<10} {:+.4f} +/- {:.4f}  gain {:.2f}".format(
+                label, estimate, self.z * math.sqrt(variance), gain))
+        return "\n".join(lines)
+
+
+def run_reduced(batch, controls = None, half_width = 0.01, pulses_half_width = None,
+                confidence = 0.95, batch_size = 1000, min_batches = 10, **options):
+    ''' Runs an adaptive study (see run_adaptive) with batch means estimates, corrected
+    with control variates if any. The batch function should draw its inputs with one of
+    the SAMPLERS. Returns (estimate, results) as run_adaptive does.
+
+    Arguments:
+        * controls (dict): field name -> known mean of the control variates.
+        * min_batches (int): the study never stops before this many batches.
+        * other arguments as in run_adaptive().
+    '''
+    estimate = BatchMeansEstimate(confidence, controls)
+    options.setdefault("min_replicates", min_batches * batch_size)
+    return run_adaptive(batch, half_width, pulses_half_width, confidence, batch_size,
+                        estimate=estimate, **options)
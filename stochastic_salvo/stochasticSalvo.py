@@ -0,0 +1,361 @@
+"""
+A Python implementation of the stochastic version of Wayne P. Hughes' Salvo Combat Model,
+after Michael J. Armstrong (2005), "A Stochastic Salvo Model for Naval Surface Combat",
+Operations Research 53(5).
+
+The ships and missiles are those of the salvo engine (salvo/salvoEngine.py), and the
+groups take the same arguments as its groups, but every quantity in a pulse is a random
+variable:
+
+* **Firing**: each ship in action locates and targets the enemy with probability
+'scouting', and then fires its 'op' cruise missiles. Each missile launches successfully
+with probability 'launch_reliability', and is on target with probability 'ascm_to_hit'.
+* **Defence**: each defending ship in action is ready with probability 'readiness', and
+then fires its 'dp' SAM, each of which destroys an incoming missile with probability
+'sam_to_hit'. The defenders cannot tell the missiles that are on target from those that
+are not, so the missiles destroyed are drawn from all the missiles launched
+(hypergeometric draw).
+* **Damage**: every missile on target that survives the defence is a hit. Hits are applied
+to the ships in order, and a ship is put out of action once it has taken 'sp' hits.
+
+Unlike the deterministic model, damaged ships keep firing full salvos until they are put
+out of action. Many battles are sampled at once: every draw is a vectorised binomial or
+hypergeometric variate over all the replicates still fighting.
+
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "salvo"))
+
+from salvoEngine import Ship, Missiles
+
+# Winner codes, as in salvo_montecarlo/batchSalvo.py
+UNDECIDED = 0   # the duration (or pulse limit) ran out with both sides still in action
+BLUFOR = 1      # REDFOR was put out of action
+REDFOR = 2      # BLUFOR was put out of action
+DRAW = 3        # both sides were put out of action in the same pulse
+STALEMATE = 4   # neither side can ever hit the other
+
+WINNER_LABELS = {UNDECIDED: "Undecided", BLUFOR: "BLUFOR", REDFOR: "REDFOR",
+                 DRAW: "Draw", STALEMATE: "Stalemate"}
+
+# Structure of the result array returned by simulate()
+RESULT_DTYPE = np.dtype([("pulses", np.int32),
+                         ("blu_ships", np.int32),
+                         ("red_ships", np.int32),
+                         ("blu_hits", np.float64),
+                         ("red_hits", np.float64),
+                         ("winner", np.int8)])
+
+
+class StochasticGroup:
+    ''' A group of identical ships, whose fire is drawn at random.
+
+    The ships, missiles, scouting and readiness have the same meaning as in the salvo
+    engine (salvo/salvoEngine.py), but are read as probabilities: see above. The state of
+    the group in the battles sampled is not kept in the group, but in the hits taken by
+    every replicate, from which the ships in action follow. The group is not a
+    HomogeneousGroup: the deterministic damage and combat power of the engine do not apply
+    to it.
+
+    Attributes:
+        * side (str): the group's side identifier, for labelling purposes.
+        * ship (Ship): the ship type the group is composed of. It is never damaged.
+        * units (int): the number of ships of type (ship) in the group.
+        * scouting (fraction): probability that a ship locates and targets the enemy.
+        * readiness (fraction): probability that a ship's defences are ready.
+        * missiles (Missiles): the missile systems used by the group.
+    '''
+    def __init__(self, side, ship, units, scouting = 1, readiness = 1, missiles = Missiles()):
+        self.side = side
+        self.ship = ship
+        self.units = units
+        self.scouting = scouting
+        self.readiness = readiness
+        self.missiles = missiles
+
+    def in_action(self, hits):
+        ''' Returns the number of ships still in action after taking (hits) in total.'''
+        return np.maximum(self.units - np.floor(hits / self.ship.sp).astype(np.int64), 0)
+
+    def can_hit(self, ships, enemy, enemyShips):
+        ''' Returns whether (ships) of this group could hit (enemyShips) of the enemy group
+        in a pulse with non-zero probability. The enemy defences are only certain to stop
+        every missile if they are always ready and never miss.'''
+        offence = (self.ship.op * self.scouting * self.missiles.launch_reliability *
+                   self.missiles.ascm_to_hit > 0)
+        certainDefence = enemy.readiness == 1 and enemy.missiles.sam_to_hit == 1
+        overwhelm = self.ship.op * ships > enemy.ship.dp * enemyShips
+        return (ships > 0) & offence & (overwhelm | (not certainDefence))
+
+    def fire(self, rng, ships, enemy, enemyShips):
+        ''' Draws the hits scored on the enemy group in one pulse, for every replicate.
+
+        Arguments:
+            * rng (numpy.random.Generator): the random number generator.
+            * ships (array): the ships of this group in action, per replicate.
+            * enemy (StochasticGroup): the target group.
+            * enemyShips (array): the ships of the enemy group in action, per replicate.
+        '''
+        firing = rng.binomial(ships, self.scouting)
+        launched = rng.binomial(firing * self.ship.op, self.missiles.launch_reliability)
+        onTarget = rng.binomial(launched, self.missiles.ascm_to_hit)
+        ready = rng.binomial(enemyShips, enemy.readiness)
+        kills = rng.binomial(ready * enemy.ship.dp, enemy.missiles.sam_to_hit)
+        engaged = np.minimum(kills, launched)
+        # Missiles destroyed are drawn at random from all those launched
+        destroyed = rng.hypergeometric(onTarget, launched - onTarget, engaged)
+        return onTarget - destroyed
+
+    def hits_distribution(self, ships, enemy, enemyShips):
+        ''' Returns the exact probability distribution of the hits scored on the enemy group
+        in one pulse (array, index = hits), for one number of ships on each side.
+
+        As the defenders cannot tell the missiles on target from the others, the missiles
+        that survive the defence are a random subset of those launched, each of which is on
+        target with probability 'ascm_to_hit'. The hits are therefore binomial, given the
+        number of missiles surviving, which is itself built from binomial kernels.
+
+        Arguments:
+            * ships (int): the ships of this group in action.
+            * enemy (StochasticGroup): the target group.
+            * enemyShips (int): the ships of the enemy group in action.
+        '''
+        op, dp = int(self.ship.op), int(enemy.ship.dp)
+        # Missiles launched: sum over the ships firing of Binomial(firing * op, launch_reliability)
+        firing = _binomial_table(ships, self.scouting)[ships]
+        launched = firing @ _binomial_table(ships * op, self.missiles.launch_reliability)[np.arange(ships + 1) * op]
+        # Missiles destroyed by the SAM of the ready enemy ships
+        ready = _binomial_table(enemyShips, enemy.readiness)[enemyShips]
+        kills = ready @ _binomial_table(enemyShips * dp, enemy.missiles.sam_to_hit)[np.arange(enemyShips + 1) * dp]
+        # Missiles surviving: max(launched - kills, 0)
+        difference = np.convolve(launched, kills[::-1])
+        surviving = difference[len(kills) - 1:].copy()
+        surviving[0] = difference[:len(kills)].sum()
+        return surviving @ _binomial_table(ships * op, self.missiles.ascm_to_hit)
+
+
+def simulate(blu, red, replicates, duration = 0, seed = None, max_pulses = 1000):
+    ''' Samples a batch of independent battles between two groups.
+
+    Arguments:
+        * blu (StochasticGroup): the BLUFOR group.
+        * red (StochasticGroup): the REDFOR group.
+        * replicates (int): the number of battles sampled.
+        * duration (int): the duration of the battles in pulses. If zero (default) each
+        battle goes on until one side is out of action or a stalemate is reached.
+        * seed (int or numpy.random.Generator): the seed of the random draws.
+        * max_pulses (int): safety limit for battles with no duration.
+
+    Returns a structured array (RESULT_DTYPE) with one entry per battle: pulses fought,
+    ships in action and hits taken by each side, and the winner code.
+    '''
+    rng = np.random.default_rng(seed)
+    for group in (blu, red):
+        if int(group.ship.op) != group.ship.op or int(group.ship.dp) != group.ship.dp:
+            raise ValueError("Missile salvos (op, dp) must be whole numbers")
+    bluHits = np.zeros(replicates)
+    redHits = np.zeros(replicates)
+    pulses = np.zeros(replicates, dtype=np.int32)
+    stalemate = np.zeros(replicates, dtype=bool)
+    active = np.arange(replicates)
+    limit = duration if duration > 0 else max_pulses
+
+    for _ in range(limit):
+        if active.size == 0:
+            break
+        bluShips = blu.in_action(bluHits[active])
+        redShips = red.in_action(redHits[active])
+        if duration == 0:
+            fighting = (bluShips > 0) & (redShips > 0)
+            stuck = fighting & ~blu.can_hit(bluShips, red, redShips) & ~red.can_hit(redShips, blu, bluShips)
+            stalemate[active[stuck]] = True
+            keep = fighting & ~stuck
+            active, bluShips, redShips = active[keep], bluShips[keep], redShips[keep]
+            if active.size == 0:
+                break
+        # Both sides fire simultaneously, with the ships in action at the start of the pulse
+        redHits[active] += blu.fire(rng, bluShips, red, redShips)
+        bluHits[active] += red.fire(rng, redShips, blu, bluShips)
+        pulses[active] += 1
+
+    results = np.zeros(replicates, dtype=RESULT_DTYPE)
+    results["pulses"] = pulses
+    results["blu_ships"] = blu.in_action(bluHits)
+    results["red_ships"] = red.in_action(redHits)
+    results["blu_hits"] = bluHits
+    results["red_hits"] = redHits
+    bluAlive = results["blu_ships"] > 0
+    redAlive = results["red_ships"] > 0
+    results["winner"] = np.select(
+        [bluAlive & ~redAlive, redAlive & ~bluAlive, ~bluAlive & ~redAlive, stalemate],
+        [BLUFOR, REDFOR, DRAW, STALEMATE], UNDECIDED)
+    return results
+
+
+def outcome_distribution(results):
+    ''' Summarises a batch of sampled battles.
+
+    Returns a dict with the probability of every outcome (by label), the mean number of
+    pulses, and the distribution of pulses fought (array, index = pulses).
+    '''
+    summary = {label: np.mean(results["winner"] == code) for code, label in WINNER_LABELS.items()}
+    summary["mean_pulses"] = results["pulses"].mean()
+    summary["pulses"] = np.bincount(results["pulses"]) / len(results)
+    return summary
+
+
+def _binomial_table(n, p):
+    ''' Returns an (n + 1) x (n + 1) array whose row k is the distribution of Binomial(k, p),
+    built by repeated convolution with the Bernoulli kernel [1 - p, p].'''
+    table = np.zeros((n + 1, n + 1))
+    table[0, 0] = 1
+    for k in range(1, n + 1):
+        table[k, :k + 1] = table[k - 1, :k + 1] * (1 - p)
+        table[k, 1:k + 1] += table[k - 1, :k] * p
+    return table
+
+
+def _hit_blocks(group):
+    ''' Returns the largest number of hits worth tracking for a group (beyond which it is out
+    of action) and the ranges of hits (ships in action, start, stop) in which the number of
+    ships in action does not change.'''
+    maxHits = int(np.ceil(group.units * group.ship.sp))
+    while group.in_action(maxHits) > 0:
+        maxHits += 1
+    while maxHits > 0 and group.in_action(maxHits - 1) == 0:
+        maxHits -= 1
+    ships = group.in_action(np.arange(maxHits + 1))
+    starts = np.flatnonzero(np.diff(ships, prepend=-1))
+    stops = np.append(starts[1:], maxHits + 1)
+    return maxHits, [(int(ships[start]), int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+
+def _transition(kernel, start, stop, maxHits):
+    ''' Returns the matrix of transition probabilities from the hits in [start, stop) to the
+    hits after one pulse (0 to maxHits), for a given distribution of the hits scored. Hits
+    beyond maxHits are all added to maxHits.'''
+    matrix = np.zeros((stop - start, maxHits + 1))
+    for row, hits in enumerate(range(start, stop)):
+        room = maxHits - hits
+        matrix[row, hits:hits + min(len(kernel), room + 1)] = kernel[:room + 1]
+        matrix[row, maxHits] += kernel[room + 1:].sum()
+    return matrix
+
+
+def exact_distribution(blu, red, duration = 0, max_pulses = 1000, tolerance = 0):
+    ''' Computes the exact outcome distribution of a battle, without sampling.
+
+    The joint probability distribution of the hits taken by both sides (from which the
+    ships in action follow) is propagated pulse by pulse. The states are cut into blocks
+    of equal ships in action, and only the blocks holding some probability are propagated,
+    each through the transition matrices built from the hit distributions of both sides.
+
+    Arguments:
+        * blu (StochasticGroup): the BLUFOR group.
+        * red (StochasticGroup): the REDFOR group.
+        * duration (int): the duration of the battle in pulses. If zero (default) the
+        battle goes on until one side is out of action or a stalemate is reached.
+        * max_pulses (int): safety limit for battles with no duration.
+        * tolerance (float): stop early once the probability of the battle going on is
+        no more than this. What is left is reported as "Undecided".
+
+    Returns a dict with the same entries as outcome_distribution(), plus "ships": the joint
+    distribution of the ships in action at the end (array, index = BLUFOR ships, REDFOR ships).
+    '''
+    for group in (blu, red):
+        if int(group.ship.op) != group.ship.op or int(group.ship.dp) != group.ship.dp:
+            raise ValueError("Missile salvos (op, dp) must be whole numbers")
+    bluMax, bluBlocks = _hit_blocks(blu)
+    redMax, redBlocks = _hit_blocks(red)
+    state = np.zeros((bluMax + 1, redMax + 1))
+    state[0, 0] = 1
+    outcomes = dict.fromkeys(WINNER_LABELS, 0.0)
+    pulses = []
+    ships = np.zeros((blu.units + 1, red.units + 1))
+    transitions = {}
+
+    def settle(final):
+        ''' Removes the mass of the battles that are over, and returns the mass removed.'''
+        settled = 0.0
+        for bluShips, bluStart, bluStop in bluBlocks:
+            for redShips, redStart, redStop in redBlocks:
+                block = state[bluStart:bluStop, redStart:redStop]
+                mass = block.sum()
+                if mass == 0:
+                    continue
+                if bluShips == 0 or redShips == 0:
+                    code = DRAW if bluShips == redShips else (BLUFOR if bluShips else REDFOR)
+                elif final:
+                    code = UNDECIDED
+                elif duration == 0 and not (blu.can_hit(bluShips, red, redShips) or
+                                            red.can_hit(redShips, blu, bluShips)):
+                    code = STALEMATE
+                else:
+                    continue
+                outcomes[code] += mass
+                ships[bluShips, redShips] += mass
+                settled += mass
+                block[...] = 0
+        return settled
+
+    limit = duration if duration > 0 else max_pulses
+    for pulse in range(limit + 1):
+        if duration == 0 or pulse == limit:
+            pulses.append(settle(pulse == limit))
+        else:
+            pulses.append(0.0)
+        if pulse == limit or (duration == 0 and state.sum() <= tolerance):
+            break
+        # Both sides fire simultaneously, with the ships in action at the start of the pulse
+        following = np.zeros_like(state)
+        for bluShips, bluStart, bluStop in bluBlocks:
+            for redShips, redStart, redStop in redBlocks:
+                block = state[bluStart:bluStop, redStart:redStop]
+                if not block.any():
+                    continue
+                key = (bluShips, redShips)
+                if key not in transitions:
+                    transitions[key] = (
+                        _transition(red.hits_distribution(redShips, blu, bluShips), bluStart, bluStop, bluMax),
+                        _transition(blu.hits_distribution(bluShips, red, redShips), redStart, redStop, redMax))
+                bluTransition, redTransition = transitions[key]
+                following += bluTransition.T @ block @ redTransition
+        state = following
+    if state.any():
+        remaining = settle(True)
+        pulses[-1] += remaining
+
+    summary = {label: outcomes[code] for code, label in WINNER_LABELS.items()}
+    summary["pulses"] = np.array(pulses)
+    summary["mean_pulses"] = summary["pulses"] @ np.arange(len(pulses))
+    summary["ships"] = ships
+    return summary
+
+
+if __name__ == "__main__":
+    # Scenario taken from Tiah, Yao Ming (2007), excursion A3, as in deterministicSalvo.py
+    frigate = Ship("Frigate", 8, 6, 1.5)
+    corvette = Ship("Corvette", 4, 2, 1)
+    standard = Missiles(0.9, 0.7, 0.68)
+    blufor = StochasticGroup("BLUFOR", frigate, 4, 0.6, 1, standard)
+    redfor = StochasticGroup("REDFOR", corvette, 12, 0.6, 1, standard)
+
+    results = simulate(blufor, redfor, 1000000, seed=2005)
+    summary = outcome_distribution(results)
+    for label in WINNER_LABELS.values():
+        print("{:<10} {:.4f}".format(label, summary[label]))
+    print("Mean pulses: {:.3f}".format(summary["mean_pulses"]))
+    for pulse, probability in enumerate(summary["pulses"]):
+        print("{:>3} pulses: {:.4f}".format(pulse, probability))
+
+    # The same battle, computed exactly
+    exact = exact_distribution(blufor, redfor, tolerance=1e-12)
+    print("Exact:")
+    for label in WINNER_LABELS.values():
+        print("{:<10} {:.4f}".format(label, exact[label]))
+    print("Mean pulses: {:.3f}".format(exact["mean_pulses"]))
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stochasticSalvo import (Ship, Missiles, StochasticGroup, simulate, outcome_distribution,
+                             exact_distribution, WINNER_LABELS, BLUFOR, REDFOR, DRAW, STALEMATE,
+                             UNDECIDED)
+
+
+def test_group_has_no_deterministic_model():
+    # The damage and combat power of the deterministic groups do not apply
+    group = StochasticGroup("BLUFOR", Ship("Frigate", 4, 4, 2), 3)
+    assert not hasattr(group, "damage") and not hasattr(group, "combat_power")
+
+
+def test_simulate_is_reproducible_and_consistent():
+    frigate = Ship("Frigate", 4, 2, 2)
+    standard = Missiles(0.9, 0.7, 0.6)
+    blufor = StochasticGroup("BLUFOR", frigate, 3, 0.8, 0.9, standard)
+    redfor = StochasticGroup("REDFOR", frigate, 4, 0.8, 0.9, standard)
+    results = simulate(blufor, redfor, 5000, seed=1)
+    assert simulate(blufor, redfor, 5000, seed=1).tobytes() == results.tobytes()
+    assert (results["blu_ships"] == blufor.in_action(results["blu_hits"])).all()
+    winners = {BLUFOR: (results["blu_ships"] > 0) & (results["red_ships"] == 0),
+               REDFOR: (results["blu_ships"] == 0) & (results["red_ships"] > 0),
+               DRAW: (results["blu_ships"] == 0) & (results["red_ships"] == 0)}
+    for code, expected in winners.items():
+        assert ((results["winner"] == code) == expected).all()
+    # With a set duration, every battle still going on is undecided after that many pulses
+    short = simulate(blufor, redfor, 5000, duration=1, seed=1)
+    assert (short["pulses"] == 1).all()
+    assert ((short["winner"] == UNDECIDED) == ((short["blu_ships"] > 0) & (short["red_ships"] > 0))).all()
+
+
+def test_stalemate_when_defences_never_fail():
+    # Always ready SAM that never miss, and outnumber the missiles: no hit is possible
+    ship = Ship("Frigate", 2, 4, 1)
+    perfect = Missiles(1, 1, 1)
+    blufor = StochasticGroup("BLUFOR", ship, 2, 1, 1, perfect)
+    redfor = StochasticGroup("REDFOR", ship, 2, 1, 1, perfect)
+    results = simulate(blufor, redfor, 100, seed=0)
+    assert (results["winner"] == STALEMATE).all()
+    assert (results["pulses"] == 0).all()
+    assert exact_distribution(blufor, redfor)["Stalemate"] == 1
+
+
+def test_hits_distribution_matches_sampled_fire():
+    frigate, corvette = Ship("Frigate", 3, 2, 1.5), Ship("Corvette", 2, 1, 1)
+    standard = Missiles(0.9, 0.7, 0.6)
+    blufor = StochasticGroup("BLUFOR", frigate, 4, 0.6, 0.8, standard)
+    redfor = StochasticGroup("REDFOR", corvette, 5, 0.7, 0.9, standard)
+    rng = np.random.default_rng(2)
+    samples = 200000
+    for ships, enemyShips in [(1, 5), (3, 2), (4, 5)]:
+        exact = blufor.hits_distribution(ships, redfor, enemyShips)
+        assert np.isclose(exact.sum(), 1)
+        hits = blufor.fire(rng, np.full(samples, ships), redfor, np.full(samples, enemyShips))
+        sampled = np.bincount(hits, minlength=len(exact)) / samples
+        assert len(sampled) == len(exact)
+        # Within 5 standard errors of the sampled frequencies
+        assert (np.abs(sampled - exact) <= 5 * np.sqrt(exact * (1 - exact) / samples) + 1e-9).all()
+
+
+def test_exact_distribution_matches_simulation():
+    frigate, corvette = Ship("Frigate", 8, 6, 1.5), Ship("Corvette", 4, 2, 1)
+    standard = Missiles(0.9, 0.7, 0.68)
+    blufor = StochasticGroup("BLUFOR", frigate, 2, 0.6, 1, standard)
+    redfor = StochasticGroup("REDFOR", corvette, 5, 0.6, 1, standard)
+    samples = 200000
+    for duration in (0, 2):
+        exact = exact_distribution(blufor, redfor, duration, tolerance=1e-12)
+        summary = outcome_distribution(simulate(blufor, redfor, samples, duration, seed=3))
+        for label in WINNER_LABELS.values():
+            p = exact[label]
+            assert abs(summary[label] - p) <= 5 * np.sqrt(p * (1 - p) / samples) + 1e-9
+        assert np.isclose(sum(exact[label] for label in WINNER_LABELS.values()), 1)
+        assert np.isclose(exact["ships"].sum(), 1)
+        assert abs(summary["mean_pulses"] - exact["mean_pulses"]) < 0.01
@@ -1,6 +1,5 @@
 #!/usr/bin/python
 
-import matplotlib.pyplot as plt
 import random
 import math
 
@@ -151,6 +150,8 @@ class Area:
 		
 	def plot(self):
 		"""The area goes plot itself."""
+		# matplotlib is only imported when plotting.
+		import matplotlib.pyplot as plt
 		# Find the (x, y) coordinates of all intact Targets.
 		x = [target.x for target in self.targets if not target.is_hit()]
 		y = [target.y for target in self.targets if not target.is_hit()]
@@ -214,10 +215,11 @@ class Area:
 
 
 
-area = Area(200, 200, 1, 1)
-area.populate(300)
-area.explosion(200)
-print(area.get_kills())
+if __name__ == "__main__":
+	area = Area(200, 200, 1, 1)
+	area.populate(300)
+	area.explosion(200)
+	print(area.get_kills())
 
-area.plot()
-print(area.overkill)
\ No newline at end of file
+	area.plot()
+	print(area.overkill)